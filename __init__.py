@@ -1,5 +1,7 @@
 from .version import version as __version__
 from .core import get_activation, predict, process_file
+from .core import save_f0_binary, load_f0_binary
+from .core import get_activations, predict_batch
 import warnings
 warnings.filterwarnings("ignore")  
 import os
@@ -0,0 +1,87 @@
+"""Benchmark batched `core.get_activation` against materializing every frame at once.
+
+Reports frames per second and the peak memory allocated by NumPy while
+computing the activations of a long synthetic signal, for several batch sizes.
+With tensorflow installed the CREPE model of the given capacity is used;
+otherwise a small stand-in model (a random projection of each frame) replaces
+it, which is enough to compare memory use and check that the activations agree.
+
+Usage::
+
+    python benchmarks/bench_crepe_activation.py [--minutes 10] [--capacity tiny]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core import build_and_load_model, get_activation  # noqa: E402
+
+
+class ProjectionModel(object):
+    """Stand-in for the keras model: a fixed random projection of each frame."""
+
+    def __init__(self, seed=0):
+        self.weights = np.random.default_rng(seed).normal(size=(1024, 360)).astype(np.float32) / 32
+
+    def predict(self, frames, verbose=0):
+        return 1 / (1 + np.exp(-frames @ self.weights))
+
+
+def get_activation_unbatched(audio, model, step_size=10):
+    """Reference implementation: all the frames are copied and normalized up front."""
+    audio = np.pad(audio.astype(np.float32), 512, mode='constant', constant_values=0)
+    hop_length = int(16000 * step_size / 1000)
+    n_frames = 1 + int((len(audio) - 1024) / hop_length)
+    frames = as_strided(audio, shape=(1024, n_frames), strides=(audio.itemsize, hop_length * audio.itemsize))
+    frames = frames.transpose().copy()
+    frames -= np.mean(frames, axis=1)[:, np.newaxis]
+    frames /= np.clip(np.std(frames, axis=1)[:, np.newaxis], 1e-8, None)
+    return model.predict(frames, verbose=0)
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=10.)
+    parser.add_argument('--capacity', default='tiny', choices=['tiny', 'small', 'medium', 'large', 'full'])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[256, 1024, 4096])
+    args = parser.parse_args()
+
+    try:
+        model = build_and_load_model(args.capacity)
+        print(f"CREPE {args.capacity}")
+    except ImportError:
+        model = ProjectionModel()
+        print("tensorflow is not installed, using a stand-in model")
+
+    audio = np.random.default_rng(0).normal(0, 0.1, int(args.minutes * 60 * 16000)).astype(np.float32)
+    num_frames = len(audio) // 160 + 1
+    print(f"{num_frames} frames, output {num_frames * 360 * 4 / 2 ** 20:.0f} MiB")
+
+    reference, elapsed, peak = measure(lambda: get_activation_unbatched(audio, model))
+    print(f"{'unbatched':>12}: {num_frames / elapsed:9.0f} frames/s, peak {peak / 2 ** 20:7.0f} MiB")
+    for batch_size in args.batch_sizes:
+        activation, elapsed, peak = measure(lambda: get_activation(audio, 16000, model=model, verbose=0,
+                                                                   batch_size=batch_size))
+        print(f"{'batch ' + str(batch_size):>12}: {num_frames / elapsed:9.0f} frames/s, peak {peak / 2 ** 20:7.0f} MiB"
+              f"  (max abs diff {np.max(np.abs(activation - reference)):.1e})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark multi-file CREPE batching (`core.predict_batch`) against one `predict` call per file.
+
+Runs both on a set of short synthetic clips (like the single-note samples
+transcribed with the note guessed from the file name), counts the model calls
+and checks that the results agree. With tensorflow installed the CREPE model of
+the given capacity is used. Otherwise a stand-in model replaces it, with a fixed
+`--dispatch-ms` cost per call to stand for the keras predict overhead.
+
+Usage::
+
+    python benchmarks/bench_crepe_batch.py [--files 500] [--capacity tiny]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core import build_and_load_model, predict, predict_batch  # noqa: E402
+from bench_crepe_activation import ProjectionModel  # noqa: E402
+
+
+class CountingModel(object):
+    """Wrap a model to count the predict calls, optionally adding a fixed cost per call."""
+
+    def __init__(self, model, dispatch_ms=0.):
+        self.model = model
+        self.dispatch_ms = dispatch_ms
+        self.calls = 0
+
+    def predict(self, frames, verbose=0):
+        self.calls += 1
+        time.sleep(self.dispatch_ms / 1000)
+        return self.model.predict(frames, verbose=verbose)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--capacity', default='tiny', choices=['tiny', 'small', 'medium', 'large', 'full'])
+    parser.add_argument('--batch-size', type=int, default=2048)
+    parser.add_argument('--sr', type=int, default=16000, help='sample rate of the clips (other rates add resampling)')
+    parser.add_argument('--dispatch-ms', type=float, default=20., help='per-call cost of the stand-in model')
+    args = parser.parse_args()
+
+    try:
+        model = build_and_load_model(args.capacity)
+        dispatch_ms = 0.
+        print(f"CREPE {args.capacity}")
+    except ImportError:
+        model = ProjectionModel()
+        dispatch_ms = args.dispatch_ms
+        print(f"tensorflow is not installed, using a stand-in model with {dispatch_ms} ms per call")
+
+    rng = np.random.default_rng(0)
+    sr = args.sr
+    audios = [(np.sin(2 * np.pi * rng.uniform(100, 1000) * np.arange(int(sr * rng.uniform(1, 3))) / sr)
+               .astype(np.float32), sr) for _ in range(args.files)]
+
+    per_file = CountingModel(model, dispatch_ms)
+    start = time.perf_counter()
+    reference = [predict(audio, sr, viterbi=True, verbose=0, model=per_file) for audio, sr in audios]
+    per_file_time = time.perf_counter() - start
+
+    batched = CountingModel(model, dispatch_ms)
+    start = time.perf_counter()
+    results = predict_batch(audios, viterbi=True, verbose=0, model=batched, batch_size=args.batch_size)
+    batched_time = time.perf_counter() - start
+
+    num_frames = sum(len(r[0]) for r in reference)
+    print(f"{args.files} files, {num_frames} frames")
+    print(f"{'per file':>10}: {per_file_time:7.2f} s, {per_file.calls:5d} model calls")
+    print(f"{'batched':>10}: {batched_time:7.2f} s, {batched.calls:5d} model calls")
+    max_error = max(np.max(np.abs(r[3] - b[3])) for r, b in zip(reference, results))
+    print(f"max activation difference: {max_error:.1e}")
+
+
+if __name__ == '__main__':
+    main()
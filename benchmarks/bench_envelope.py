@@ -0,0 +1,109 @@
+"""Benchmark the block-wise amplitude envelope against the whole-signal one.
+
+Compares `envelope.amplitude_envelope` with the previous computation of
+`load_audio` (Hilbert transform of the whole signal, rescaling, Butterworth
+filter at the audio rate, then decimation to 100 Hz) on synthetic notes, for
+several durations and for lengths that are prime numbers of samples (the worst
+case for a single FFT), and on a tone with sharp amplitude steps. Reports time,
+peak memory allocated by NumPy and the largest difference between both
+envelopes, over all frames (first and last frames included), and fails if it
+exceeds the documented tolerance.
+
+Usage::
+
+    python benchmarks/bench_envelope.py [--durations 10 60 300] [--sr 44100 48000 22050]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from scipy.signal import butter, filtfilt, hilbert
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'crepe_notes'))
+
+from envelope import amplitude_envelope  # noqa: E402
+
+# largest difference from the whole-signal envelope (scaled to [0, 1]) documented in envelope.py
+TOLERANCE = 5e-3
+
+
+def reference_envelope(y, sr):
+    """The envelope as `load_audio` computed it before."""
+    amp_envelope = np.abs(hilbert(y))
+    scaled_amp_envelope = np.interp(amp_envelope, (amp_envelope.min(), amp_envelope.max()), (0, 1))
+    b, a = butter(4, 50, 'low', fs=sr)
+    return filtfilt(b, a, scaled_amp_envelope)[::(sr // 100)]
+
+
+def synthetic_notes(num_samples, sr, seed=0):
+    """Decaying tones of random pitch and length over a little noise."""
+    rng = np.random.default_rng(seed)
+    envelope = np.zeros(num_samples)
+    freqs = np.zeros(num_samples)
+    pos = 0
+    while pos < num_samples:
+        length = int(rng.uniform(0.05, 0.5) * sr)
+        decay = np.exp(-np.arange(length) / sr * rng.uniform(2, 10)) * rng.uniform(0.1, 1)
+        envelope[pos:pos + length] = decay[:num_samples - pos]
+        freqs[pos:pos + length] = rng.uniform(100, 1000)
+        pos += length
+    y = envelope * np.sin(2 * np.pi * np.cumsum(freqs) / sr) + 0.001 * rng.standard_normal(num_samples)
+    return y.astype(np.float32)
+
+
+def amplitude_steps(num_samples, sr, seed=0):
+    """A 440 Hz tone whose amplitude jumps to a random level every 200 ms."""
+    rng = np.random.default_rng(seed)
+    levels = np.repeat(rng.uniform(0, 1, num_samples // (sr // 5) + 1), sr // 5)[:num_samples]
+    return (levels * np.sin(2 * np.pi * 440 * np.arange(num_samples) / sr)).astype(np.float32)
+
+
+def previous_prime(n):
+    def is_prime(k):
+        return k > 1 and all(k % d for d in range(2, int(k ** 0.5) + 1))
+    while not is_prime(n):
+        n -= 1
+    return n
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--durations', type=float, nargs='+', default=[10, 60, 300], help='durations in seconds')
+    parser.add_argument('--sr', type=int, nargs='+', default=[44100, 48000, 22050], help='sample rates')
+    args = parser.parse_args()
+    largest = 0
+
+    print(f"{'sr':>6} {'samples':>10} {'':>6} {'signal':<6} {'previous':>19} {'block-wise':>19} "
+          f"{'max diff':>9} {'at edges':>9}")
+    for sr in args.sr:
+        for duration in args.durations:
+            num_samples = int(duration * sr)
+            for num, label in ((num_samples, ''), (previous_prime(num_samples), 'prime')):
+                for name, signal in (('notes', synthetic_notes), ('steps', amplitude_steps)):
+                    y = signal(num, sr)
+                    reference, ref_time, ref_peak = measure(lambda: reference_envelope(y, sr))
+                    envelope, time_, peak = measure(lambda: amplitude_envelope(y, sr))
+                    diff = np.abs(reference - envelope)
+                    largest = max(largest, diff.max())
+                    edges = max(diff[:3].max(), diff[-3:].max())
+                    print(f"{sr:>6} {num:>10} {label:>6} {name:<6} {ref_time:7.2f} s {ref_peak / 2 ** 20:6.0f} MiB "
+                          f"{time_:7.2f} s {peak / 2 ** 20:6.0f} MiB {diff.max():9.1e} {edges:9.1e}")
+    print(f"largest difference: {largest:.1e} (tolerance {TOLERANCE:.0e})")
+    return 0 if largest <= TOLERANCE else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
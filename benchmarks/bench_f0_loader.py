@@ -0,0 +1,67 @@
+"""Benchmark loading f0 files: CSV with np.genfromtxt against binary .f0.npy.
+
+Writes a folder of synthetic pitch tracks in both formats (the CSV as written
+by `save_f0`) and times loading all of them the way `parse_f0` does.
+
+Usage::
+
+    python benchmarks/bench_f0_loader.py [--files 200] [--seconds 180]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core import save_f0_binary, load_f0_binary  # noqa: E402
+
+
+def load_csv(path):
+    data = np.genfromtxt(path, delimiter=',', names=True)
+    return np.nan_to_num(data['frequency']), np.nan_to_num(data['confidence'])
+
+
+def load_npy(path):
+    _, frequency, confidence = load_f0_binary(path)
+    return np.nan_to_num(frequency), np.nan_to_num(confidence)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=180., help='length of each pitch track')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    num_frames = int(args.seconds * 100)
+    with tempfile.TemporaryDirectory() as tmp:
+        sizes = {'csv': 0, 'npy': 0}
+        for i in range(args.files):
+            frequency = rng.uniform(50, 1000, num_frames)
+            confidence = rng.random(num_frames).astype(np.float32)
+            csv_path = os.path.join(tmp, f'{i}.f0.csv')
+            np.savetxt(csv_path, np.stack([np.linspace(0, 0.01 * num_frames, num_frames), frequency, confidence], axis=1),
+                       fmt='%10.7f', delimiter=',', header='time,frequency,confidence', comments='')
+            save_f0_binary(os.path.join(tmp, f'{i}.f0.npy'), np.arange(num_frames) * 0.01, frequency, confidence)
+            sizes['csv'] += os.path.getsize(csv_path)
+            sizes['npy'] += os.path.getsize(os.path.join(tmp, f'{i}.f0.npy'))
+
+        print(f"{args.files} files of {num_frames} frames")
+        results = {}
+        for name, loader in (('csv', load_csv), ('npy', load_npy)):
+            start = time.perf_counter()
+            results[name] = [loader(os.path.join(tmp, f'{i}.f0.{name}')) for i in range(args.files)]
+            elapsed = time.perf_counter() - start
+            print(f"{name:>4}: {elapsed:8.3f} s, {args.files * num_frames / elapsed / 1e6:8.2f} Mframes/s, "
+                  f"{sizes[name] / 2 ** 20:8.1f} MiB")
+
+        max_error = max(np.max(np.abs(c[0] - n[0])) for c, n in zip(results['csv'], results['npy']))
+        print(f"max frequency difference (CSV rounding): {max_error:.1e} Hz")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark the band-limited filterbank application of madmom_update.
+
+Filters the magnitude spectrograms of a synthetic signal with the filterbanks
+built by the onset (CNN, RNN), beat (RNN) and chroma (deep chroma) processors,
+once with the dense ``np.dot(spectrogram, filterbank)`` used before and once
+with `Filterbank.filter`, which only uses the non-zero bins of each band.
+Reports the time of both, the fraction of bins of the filterbank actually
+multiplied, and the differences of the results: the sums are computed in a
+different order, thus they differ by float32 rounding errors. Fails if the
+largest relative difference exceeds the documented tolerance
+`BAND_LIMITED_RTOL`.
+
+Usage::
+
+    python benchmarks/bench_filterbank.py [--duration 300] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from madmom_update.audio.filters import BAND_LIMITED_RTOL, LogarithmicFilterbank, MelFilterbank  # noqa: E402
+from madmom_update.audio.signal import FramedSignal, Signal  # noqa: E402
+from madmom_update.audio.stft import fft_frequencies, stft  # noqa: E402
+
+SAMPLE_RATE = 44100
+
+# (processor, filterbank type, frame sizes, fps, filterbank arguments)
+PROCESSORS = [
+    ('CNNOnsetProcessor', MelFilterbank, [1024, 2048, 4096], 100,
+     dict(num_bands=80, fmin=27.5, fmax=16000, norm_filters=True, unique_filters=False)),
+    ('RNNOnsetProcessor', LogarithmicFilterbank, [1024, 2048, 4096], 100,
+     dict(num_bands=6, fmin=30, fmax=17000, norm_filters=True)),
+    ('RNNBeatProcessor', LogarithmicFilterbank, [1024, 2048, 4096], 100,
+     dict(num_bands=6, fmin=30, fmax=17000, norm_filters=True)),
+    ('RNNBeatProcessor online', LogarithmicFilterbank, [2048], 100,
+     dict(num_bands=12, fmin=30, fmax=17000, norm_filters=True)),
+    ('DeepChromaProcessor', LogarithmicFilterbank, [8192], 10,
+     dict(num_bands=24, fmin=65, fmax=2100, unique_filters=True)),
+]
+
+
+def measure(func, repeat):
+    """Best time of `repeat` calls of `func`."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def spectrogram(signal, frame_size, fps):
+    frames = FramedSignal(signal, frame_size=frame_size, fps=fps)
+    return np.abs(stft(frames, np.hanning(frame_size).astype(np.float32)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=300, help='signal length in seconds')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    signal = Signal(rng.standard_normal(int(args.duration * SAMPLE_RATE)).astype(np.float32),
+                    sample_rate=SAMPLE_RATE)
+    specs = {}
+    largest = 0
+
+    print(f"{args.duration:.0f} s at {SAMPLE_RATE} Hz")
+    print(f"{'processor':<24} {'frames':>6} {'bands':>5} {'used':>5} {'dense':>9} {'band-limited':>12} "
+          f"{'equal':>6} {'rel. diff':>9}")
+    totals = [0, 0]
+    for name, filterbank_type, frame_sizes, fps, kwargs in PROCESSORS:
+        for frame_size in frame_sizes:
+            if (frame_size, fps) not in specs:
+                specs[frame_size, fps] = spectrogram(signal, frame_size, fps)
+            spec = specs[frame_size, fps]
+            filterbank = filterbank_type(fft_frequencies(frame_size // 2, SAMPLE_RATE), **kwargs)
+            band_limited = filterbank.band_limited()
+            used = sum(weights.size for _, _, _, _, weights in band_limited.groups) \
+                if band_limited.dense is None else filterbank.size
+            dense, dense_time = measure(lambda: np.dot(spec, np.asarray(filterbank)), args.repeat)
+            result, time_ = measure(lambda: filterbank.filter(spec), args.repeat)
+            totals[0] += dense_time
+            totals[1] += time_
+            # all terms are positive, relative differences are meaningful
+            diff = np.max(np.abs(dense - result) / np.maximum(dense, np.finfo(np.float32).tiny))
+            largest = max(largest, diff)
+            print(f"{name:<24} {frame_size:>6} {filterbank.num_bands:>5} {used / filterbank.size:>5.0%} "
+                  f"{dense_time:7.3f} s {time_:10.3f} s {np.mean(dense == result):>6.1%} {diff:9.1e}")
+    print(f"{'total':<24} {'':>6} {'':>5} {'':>5} {totals[0]:7.3f} s {totals[1]:10.3f} s")
+    print(f"largest relative difference: {largest:.1e} (tolerance {BAND_LIMITED_RTOL:.0e}, "
+          f"float32 resolution {np.finfo(np.float32).eps:.1e})")
+    return 0 if largest <= BAND_LIMITED_RTOL else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Benchmark the strided framing of madmom_update.audio.signal.FramedSignal.
+
+Compares, on a synthetic signal, going over all frames one at a time (each
+frame is a copy made by `signal_frame`) with `FramedSignal.iter_blocks` and
+`FramedSignal.as_strided` (read-only views of the signal), and the STFT of the
+frames gathered one by one with the STFT of the strided blocks. Reports time,
+peak memory allocated by NumPy and checks that the frames and STFTs are
+identical.
+
+Usage::
+
+    python benchmarks/bench_framed_signal.py [--duration 300] [--frame-sizes 1024 2048 4096]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from madmom_update.audio.signal import FramedSignal, Signal  # noqa: E402
+from madmom_update.audio.stft import stft  # noqa: E402
+
+
+class FrameByFrame(object):
+    """Hides `iter_blocks`, so that `stft` gathers the frames one by one."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.shape, self.ndim = frames.shape, frames.ndim
+
+    def __iter__(self):
+        return iter(self.frames)
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def frame_sums(frames):
+    """Touch every frame one at a time."""
+    return np.array([frame.sum(dtype=np.float64) for frame in frames])
+
+
+def block_sums(blocks):
+    return np.concatenate([block.sum(axis=1, dtype=np.float64) for block in blocks])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=300, help='signal length in seconds')
+    parser.add_argument('--sr', type=int, default=44100)
+    parser.add_argument('--fps', type=float, default=100)
+    parser.add_argument('--frame-sizes', type=int, nargs='+', default=[1024, 2048, 4096])
+    parser.add_argument('--block-size', type=int, default=512, help='frames per block')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    signal = Signal(rng.standard_normal(int(args.duration * args.sr)).astype(np.float32), sample_rate=args.sr)
+    ok = True
+
+    print(f"{'frame size':>10} {'':<22} {'time':>9} {'peak':>9}")
+    for frame_size in args.frame_sizes:
+        frames = FramedSignal(signal, frame_size=frame_size, fps=args.fps)
+        reference, time_, peak = measure(lambda: frame_sums(frames))
+        print(f"{frame_size:>10} {'frame by frame':<22} {time_:7.3f} s {peak / 2 ** 20:5.0f} MiB")
+        result, time_, peak = measure(lambda: block_sums(frames.iter_blocks(args.block_size)))
+        ok &= np.array_equal(reference, result)
+        print(f"{'':>10} {'iter_blocks':<22} {time_:7.3f} s {peak / 2 ** 20:5.0f} MiB")
+        if frames.hop_size == int(frames.hop_size):
+            result, time_, peak = measure(lambda: block_sums([FramedSignal(
+                signal, frame_size=frame_size, fps=args.fps).as_strided()]))
+            ok &= np.array_equal(reference, result)
+            print(f"{'':>10} {'as_strided':<22} {time_:7.3f} s {peak / 2 ** 20:5.0f} MiB")
+
+        window = np.hanning(frame_size).astype(np.float32)
+        reference, time_, peak = measure(lambda: stft(FrameByFrame(frames), window, block_size=args.block_size))
+        print(f"{'':>10} {'stft, frame by frame':<22} {time_:7.3f} s {peak / 2 ** 20:5.0f} MiB")
+        result, time_, peak = measure(lambda: stft(frames, window, block_size=args.block_size))
+        ok &= np.array_equal(reference, result)
+        print(f"{'':>10} {'stft, strided blocks':<22} {time_:7.3f} s {peak / 2 ** 20:5.0f} MiB")
+
+    print(f"identical results: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""Benchmark the vectorized `core.to_local_average_cents` against the per-frame decoding.
+
+Decodes a synthetic (T, 360) salience around its argmax and around a given path
+(as `to_viterbi_cents` does) and checks that the results are identical.
+
+Usage::
+
+    python benchmarks/bench_local_average_cents.py [--minutes 60]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core import to_local_average_cents  # noqa: E402
+
+
+def per_frame(salience, path=None):
+    """Reference implementation: one call per frame."""
+    if path is None:
+        return np.array([to_local_average_cents(salience[i, :]) for i in range(salience.shape[0])])
+    return np.array([to_local_average_cents(salience[i, :], path[i]) for i in range(salience.shape[0])])
+
+
+def synthetic_salience(num_frames, seed=0):
+    """Gaussian bumps along a random walk, float32 like the model output."""
+    rng = np.random.default_rng(seed)
+    center = np.clip(180 + np.cumsum(rng.normal(0, 0.5, num_frames)), 0, 359)
+    bins = np.arange(360)
+    salience = np.exp(-0.5 * ((bins - center[:, None]) / 2.) ** 2)
+    salience += rng.uniform(0, 0.05, salience.shape)
+    return salience.astype(np.float32), np.round(center).astype(int)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=60.)
+    args = parser.parse_args()
+
+    salience, path = synthetic_salience(int(args.minutes * 6000))
+    print(f"{len(salience)} frames")
+    for label, center in (('argmax', None), ('path', path)):
+        start = time.perf_counter()
+        reference = per_frame(salience, center)
+        loop_time = time.perf_counter() - start
+        start = time.perf_counter()
+        cents = to_local_average_cents(salience, center)
+        vectorized_time = time.perf_counter() - start
+        print(f"{label:>8}: per frame {loop_time:7.3f} s, vectorized {vectorized_time:7.3f} s "
+              f"({loop_time / vectorized_time:.0f}x), identical: {np.array_equal(reference, cents)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Compare lists of note dicts with `NoteTable` on a large batch of notes.
+
+Measures the memory held by the notes, the size of the notes pickled to send
+them back from a worker process, and the time to concatenate per-file results,
+filter them as `post_process_notes` does and sort them.
+
+Usage::
+
+    python benchmarks/bench_note_table.py [--notes 1000000] [--files 1000]
+"""
+import argparse
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'crepe_notes'))
+
+from note_table import NoteTable  # noqa: E402
+
+
+def random_notes(num_notes, seed=0):
+    """Notes as `process` returns them, as a list of dicts (with NumPy scalars, like before)."""
+    rng = np.random.default_rng(seed)
+    start_idx = np.sort(rng.integers(0, 100 * num_notes, num_notes))
+    finish_idx = start_idx + rng.integers(2, 100, num_notes)
+    columns = dict(pitch=rng.integers(40, 90, num_notes), freq=rng.uniform(80, 1000, num_notes),
+                   velocity=rng.integers(0, 128, num_notes), start_idx=start_idx, finish_idx=finish_idx,
+                   conf=rng.random(num_notes), transition_strength=rng.random(num_notes),
+                   start=start_idx * 0.01, finish=finish_idx * 0.01)
+    return [{k: int(v[i]) if k == 'pitch' else v[i] for k, v in columns.items()} for i in range(num_notes)]
+
+
+def post_process_dicts(notes, duration_threshold=0.05, velocity_threshold_min=20, velocity_threshold_max=120):
+    return [n for n in notes if not n['finish'] - n['start'] < duration_threshold
+            and velocity_threshold_min <= n['velocity'] <= velocity_threshold_max]
+
+
+def post_process_table(notes, duration_threshold=0.05, velocity_threshold_min=20, velocity_threshold_max=120):
+    keep = ~(notes['finish'] - notes['start'] < duration_threshold)
+    keep &= (notes['velocity'] >= velocity_threshold_min) & (notes['velocity'] <= velocity_threshold_max)
+    return notes.filter(keep)
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=1000000)
+    parser.add_argument('--files', type=int, default=1000, help='number of per-file results to concatenate')
+    args = parser.parse_args()
+
+    dicts = random_notes(args.notes)
+    per_file = np.array_split(np.arange(args.notes), args.files)
+    dict_chunks = [dicts[c[0]:c[-1] + 1] for c in per_file if len(c)]
+    table_chunks = [NoteTable.from_dicts(chunk) for chunk in dict_chunks]
+    del dicts
+
+    def concat_dicts():
+        all_notes = []
+        for notes in dict_chunks:
+            all_notes.extend([n.copy() for n in notes])
+        return all_notes
+
+    all_dicts, dict_concat, dict_memory = measure(concat_dicts)
+    all_table, table_concat, table_memory = measure(lambda: NoteTable.concat(table_chunks))
+    print(f"{args.notes} notes in {len(dict_chunks)} files")
+    print(f"{'':>14} {'dicts':>12} {'NoteTable':>12}")
+    print(f"{'memory':>14} {dict_memory / 2 ** 20:10.1f}MB {table_memory / 2 ** 20:10.1f}MB")
+    print(f"{'pickled':>14} {len(pickle.dumps(dict_chunks[0])) * len(dict_chunks) / 2 ** 20:10.1f}MB "
+          f"{len(pickle.dumps(table_chunks[0])) * len(table_chunks) / 2 ** 20:10.1f}MB")
+
+    timings = [('concat', dict_concat, table_concat)]
+    for name, dict_func, table_func in (
+            ('post-process', lambda: post_process_dicts(all_dicts), lambda: post_process_table(all_table)),
+            ('sort', lambda: sorted(all_dicts, key=lambda n: (n['pitch'], n['start_idx'])),
+             lambda: all_table.sort(['pitch', 'start_idx']))):
+        start = time.perf_counter()
+        dict_result = dict_func()
+        dict_time = time.perf_counter() - start
+        start = time.perf_counter()
+        table_result = table_func()
+        table_time = time.perf_counter() - start
+        assert NoteTable.from_dicts(dict_result) == table_result
+        timings.append((name, dict_time, table_time))
+    for name, dict_time, table_time in timings:
+        print(f"{name:>14} {dict_time * 1000:10.1f}ms {table_time * 1000:10.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark batched onsetCNN inference against the frame-by-frame loop.
+
+Usage::
+
+    python benchmarks/bench_onset_cnn.py [--model-path model.pt] [--seconds 60]
+
+Without a model path the network is randomly initialised, which is enough to
+compare throughput and check that both code paths agree.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'crepe_notes'))
+
+from New_cnn import load_model, predict_onset_activations  # noqa: E402
+from utils import onsetCNN  # noqa: E402
+
+
+def predict_onset_activations_framewise(model, mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db, device):
+    """Reference implementation: one forward pass per context window."""
+    segment_length = 15
+    num_segments = mel_spectrogram1_db.shape[1] - segment_length + 1
+    dtype = next(model.parameters()).dtype
+    onsets = np.zeros(mel_spectrogram1_db.shape[1])
+    with torch.no_grad():
+        for i in range(num_segments):
+            segment = np.stack([mel_spectrogram1_db[:, i:i + segment_length],
+                                mel_spectrogram2_db[:, i:i + segment_length],
+                                mel_spectrogram3_db[:, i:i + segment_length]], axis=0)
+            segment = torch.tensor(segment, dtype=dtype).unsqueeze(0).to(device)
+            onsets[i:i + segment_length] += model(segment).squeeze().cpu().numpy()
+    return onsets
+
+
+def get_model(model_path, device, dtype):
+    if model_path is not None:
+        return load_model(model_path, device, dtype=dtype)
+    torch.manual_seed(0)
+    return onsetCNN().to(device=device, dtype=dtype).eval()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-path', default=None)
+    parser.add_argument('--seconds', type=float, default=60., help='length of the synthetic input')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[64, 256, 512, 1024])
+    args = parser.parse_args()
+
+    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    num_frames = int(args.seconds * 100)
+    rng = np.random.default_rng(0)
+    mels = [rng.uniform(-80, 0, size=(80, num_frames)).astype(np.float32) for _ in range(3)]
+
+    reference_model = get_model(args.model_path, device, torch.float64)
+    start = time.perf_counter()
+    reference = predict_onset_activations_framewise(reference_model, *mels, device)
+    elapsed = time.perf_counter() - start
+    print(f"{'framewise float64':>24}: {num_frames / elapsed:10.1f} frames/s")
+
+    for dtype in (torch.float64, torch.float32):
+        model = get_model(args.model_path, device, dtype)
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            activations = predict_onset_activations(model, *mels, device, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            max_error = np.max(np.abs(activations - reference))
+            label = f"batch {batch_size} {str(dtype).split('.')[-1]}"
+            print(f"{label:>24}: {num_frames / elapsed:10.1f} frames/s  (max abs diff {max_error:.2e})")
+
+
+if __name__ == '__main__':
+    main()
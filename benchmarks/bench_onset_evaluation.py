@@ -0,0 +1,123 @@
+"""Benchmark the onset evaluation of madmom_update.evaluation.
+
+Compares the vectorized `onset_evaluation` and `note_onset_evaluation` with
+the loops they replace (copied below) on synthetic onsets, and the evaluation
+of a sweep of peak-picking thresholds one by one with `onset_evaluation_batch`.
+Checks that all results are identical.
+
+Usage::
+
+    python benchmarks/bench_onset_evaluation.py [--onsets 20000] [--thresholds 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from madmom_update.evaluation.notes import note_onset_evaluation  # noqa: E402
+from madmom_update.evaluation.onsets import onset_evaluation, onset_evaluation_batch  # noqa: E402
+
+
+def loop_onset_evaluation(detections, annotations, window):
+    """`onset_evaluation` as it was before, with its early returns left out."""
+    det = np.sort(np.asarray(detections, dtype=float))
+    ann = np.sort(np.asarray(annotations, dtype=float))
+    tp, fp, fn, errors = np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0)
+    det_length, ann_length = len(det), len(ann)
+    det_index, ann_index = 0, 0
+    while det_index < det_length and ann_index < ann_length:
+        d, a = det[det_index], ann[ann_index]
+        if abs(d - a) <= window:
+            tp = np.append(tp, d)
+            errors = np.append(errors, d - a)
+            det_index += 1
+            ann_index += 1
+        elif d < a:
+            fp = np.append(fp, d)
+            det_index += 1
+        elif d > a:
+            fn = np.append(fn, a)
+            ann_index += 1
+        else:
+            raise AssertionError('can not match % with %', d, a)
+    fp = np.append(fp, det[det_index:])
+    fn = np.append(fn, ann[ann_index:])
+    return tp, fp, np.zeros(0), fn, errors
+
+
+def loop_note_onset_evaluation(detections, annotations, window):
+    """`note_onset_evaluation` as it was before, with its early returns left out."""
+    tp, fp, fn, errors = np.zeros((0, 2)), np.zeros((0, 2)), np.zeros((0, 2)), np.zeros((0, 2))
+    for note in np.unique(np.concatenate((detections[:, 1], annotations[:, 1]))).tolist():
+        det = detections[detections[:, 1] == note]
+        ann = annotations[annotations[:, 1] == note]
+        tp_, fp_, _, fn_, err_ = loop_onset_evaluation(det[:, 0], ann[:, 0], window)
+        tp = np.vstack((tp, det[np.isin(det[:, 0], tp_)]))
+        fp = np.vstack((fp, det[np.isin(det[:, 0], fp_)]))
+        fn = np.vstack((fn, ann[np.isin(ann[:, 0], fn_)]))
+        errors = np.vstack((errors, np.vstack((err_, np.repeat(note, len(err_)))).T))
+    errors = errors[tp[:, 0].argsort()]
+    return tp[tp[:, 0].argsort()], fp[fp[:, 0].argsort()], np.zeros((0, 2)), fn[fn[:, 0].argsort()], errors
+
+
+def synthetic_onsets(num_onsets, rng):
+    """Annotations every 50-500 ms and detections jittered, missed and added around them."""
+    annotations = np.cumsum(rng.uniform(0.05, 0.5, num_onsets))
+    detections = annotations + rng.normal(0, 0.015, num_onsets)
+    detections = detections[rng.random(num_onsets) > 0.1]
+    spurious = rng.uniform(0, annotations[-1], num_onsets // 10)
+    return np.round(np.concatenate((detections, spurious)), 3), np.round(annotations, 3)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def identical(a, b):
+    return all(np.array_equal(x, y) for x, y in zip(a, b))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--onsets', type=int, default=20000, help='number of annotated onsets')
+    parser.add_argument('--thresholds', type=int, default=50, help='number of peak-picking thresholds')
+    parser.add_argument('--window', type=float, default=0.025)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    ok = True
+
+    detections, annotations = synthetic_onsets(args.onsets, rng)
+    reference, loop_time = timed(loop_onset_evaluation, detections, annotations, args.window)
+    result, time_ = timed(onset_evaluation, detections, annotations, args.window)
+    ok &= identical(reference, result)
+    print(f"onset_evaluation, {len(detections)} detections: loop {loop_time:.3f} s, vectorized {time_:.3f} s")
+
+    notes = (rng.integers(40, 90, len(detections)), rng.integers(40, 90, len(annotations)))
+    det_notes, ann_notes = np.c_[detections, notes[0]], np.c_[annotations, notes[1]]
+    reference, loop_time = timed(loop_note_onset_evaluation, det_notes, ann_notes, args.window)
+    result, time_ = timed(note_onset_evaluation, det_notes, ann_notes, args.window)
+    ok &= identical(reference, result)
+    print(f"note_onset_evaluation, 50 notes: loop {loop_time:.3f} s, vectorized {time_:.3f} s")
+
+    # a sweep of thresholds: the higher the threshold, the fewer detections
+    strengths = rng.random(len(detections))
+    thresholds = np.linspace(0, 0.9, args.thresholds)
+    sweep = [detections[strengths >= threshold] for threshold in thresholds]
+    reference, loop_time = timed(lambda: [loop_onset_evaluation(d, annotations, args.window) for d in sweep])
+    individual, time_ = timed(lambda: [onset_evaluation(d, annotations, args.window) for d in sweep])
+    batch, batch_time = timed(onset_evaluation_batch, sweep, annotations, args.window)
+    ok &= all(identical(r, i) and identical(r, b) for r, i, b in zip(reference, individual, batch))
+    print(f"{args.thresholds} thresholds: loop {loop_time:.3f} s, vectorized {time_:.3f} s, batch {batch_time:.3f} s")
+
+    print(f"identical results: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
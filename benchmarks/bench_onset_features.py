@@ -0,0 +1,126 @@
+"""Benchmark the multi-resolution onset front-end of crepe_notes.
+
+Compares, on a synthetic recording, the spectrograms of the madmom CNN and of
+the onsetCNN computed as before (three madmom STFT chains in a
+ParallelProcessor, then three `librosa.feature.melspectrogram` calls) with
+`onset_features.onset_spectrograms`, for each consumer alone and for both in
+a single pass. Reports time and peak memory allocated by NumPy, and checks
+that the madmom spectrograms are identical and that the onsetCNN ones (in dB,
+computed with librosa's periodic Hann window, see onset_features) differ by
+at most `TOLERANCE` dB from librosa's.
+
+Usage::
+
+    python benchmarks/bench_onset_features.py [--duration 300]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from scipy.io import wavfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'crepe_notes'))
+
+from audio_context import AudioContext  # noqa: E402
+from onset_features import FRAME_SIZES, HOP_LENGTH, SAMPLE_RATE, onset_spectrograms  # noqa: E402
+
+# largest difference of the onsetCNN spectrograms to librosa's [dB], rounding errors only
+TOLERANCE = 0.01
+
+
+def previous_madmom(audio):
+    """The pre-processing of CNNOnsetProcessor as it was before."""
+    from madmom.audio.filters import MelFilterbank
+    from madmom.audio.signal import FramedSignalProcessor
+    from madmom.audio.spectrogram import FilteredSpectrogramProcessor, LogarithmicSpectrogramProcessor
+    from madmom.audio.stft import ShortTimeFourierTransformProcessor
+    from madmom.processors import ParallelProcessor, SequentialProcessor
+
+    multi = ParallelProcessor([])
+    for frame_size in [2048, 1024, 4096]:
+        multi.append(SequentialProcessor((
+            FramedSignalProcessor(frame_size=frame_size, fps=100), ShortTimeFourierTransformProcessor(),
+            FilteredSpectrogramProcessor(filterbank=MelFilterbank, num_bands=80, fmin=27.5, fmax=16000,
+                                         norm_filters=True, unique_filters=False),
+            LogarithmicSpectrogramProcessor(log=np.log, add=np.spacing(1)))))
+    return multi(audio.signal(SAMPLE_RATE, num_channels=1))
+
+
+def previous_onset_cnn(audio):
+    """`New_cnn.preprocess_audio` as it was before."""
+    import librosa
+
+    y = audio.mono(SAMPLE_RATE)
+    return [librosa.power_to_db(librosa.feature.melspectrogram(y=y, sr=SAMPLE_RATE, n_fft=n_fft,
+                                                               hop_length=HOP_LENGTH, n_mels=80, fmin=27.5,
+                                                               fmax=16000), ref=np.max)
+            for n_fft in FRAME_SIZES]
+
+
+def measure(func, path):
+    """Time and peak memory of `func(audio)` on a fresh AudioContext (decoded beforehand)."""
+    audio = AudioContext(path)
+    audio.signal(SAMPLE_RATE, num_channels=1), audio.mono(SAMPLE_RATE)
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(audio)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    audio.close()
+    return result, elapsed, peak
+
+
+def synthetic_recording(duration, rng):
+    """Tones of random pitch and length with decaying envelopes."""
+    num_samples = int(duration * SAMPLE_RATE)
+    lengths = rng.integers(SAMPLE_RATE // 10, SAMPLE_RATE // 2, num_samples // (SAMPLE_RATE // 10) + 1)
+    starts = np.cumsum(lengths) - lengths
+    note = np.searchsorted(starts, np.arange(num_samples), side='right') - 1
+    freqs = rng.uniform(80, 1000, len(lengths))[note]
+    envelope = np.exp(-(np.arange(num_samples) - starts[note]) / SAMPLE_RATE * 4)
+    y = envelope * np.sin(2 * np.pi * np.cumsum(freqs) / SAMPLE_RATE) + 0.01 * rng.standard_normal(num_samples)
+    return (y / np.abs(y).max() * 32767 * 0.9).astype(np.int16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=300, help='length of the recording in seconds')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'recording.wav'
+        wavfile.write(path, SAMPLE_RATE, synthetic_recording(args.duration, np.random.default_rng(0)))
+
+        runs = [
+            ('madmom CNN', 'previous', previous_madmom),
+            ('madmom CNN', 'front-end', lambda a: onset_spectrograms(path, ('madmom',), audio=a)['madmom']),
+            ('onsetCNN', 'previous (librosa)', previous_onset_cnn),
+            ('onsetCNN', 'front-end', lambda a: onset_spectrograms(path, ('onset_cnn',), audio=a)['onset_cnn']),
+            ('both', 'previous', lambda a: (previous_madmom(a), previous_onset_cnn(a))),
+            ('both', 'front-end, one pass', lambda a: onset_spectrograms(path, audio=a)),
+        ]
+        results = {}
+        print(f"{args.duration:.0f} s at {SAMPLE_RATE} Hz")
+        print(f"{'consumer':<12} {'':<20} {'time':>9} {'peak':>9}")
+        for consumer, label, func in runs:
+            results[consumer, label], elapsed, peak = measure(func, path)
+            print(f"{consumer:<12} {label:<20} {elapsed:7.3f} s {peak / 2 ** 20:5.0f} MiB")
+
+    identical = all(np.array_equal(a, b) for a, b in zip(results['madmom CNN', 'previous'],
+                                                         results['madmom CNN', 'front-end']))
+    diff = max(np.abs(a - b).max() for a, b in zip(results['onsetCNN', 'previous (librosa)'],
+                                                   results['onsetCNN', 'front-end']))
+    print(f"madmom CNN spectrograms identical: {identical}")
+    print(f"onsetCNN spectrograms: largest difference {diff:.1e} dB (tolerance {TOLERANCE} dB)")
+    return 0 if identical and diff <= TOLERANCE else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""Benchmark each stage of the transcription pipeline on synthetic audio.
+
+Generates test recordings locally (sine tones, sax-like tones with vibrato and
+breath noise, repeated notes, glissandi and a long file) and times, for each
+of them, the stages a `crepe_notes` run goes through: decode, CREPE
+activation, Viterbi decoding, amplitude envelope, madmom onsets, onsetCNN,
+segmentation (`process`) and MIDI writing. Each stage records its wall time,
+CPU time and peak resident memory (sampled while it runs). The analysis cache
+is disabled, so that every stage actually computes.
+
+Without tensorflow, a stand-in model replaces CREPE (see
+bench_crepe_activation.py); without a --onset-cnn-model, the onsetCNN runs
+with untrained weights (same cost). Stages whose dependencies are missing are
+reported as skipped.
+
+The results can be saved as a baseline JSON file, and later runs compared to
+it: a stage is a regression if its wall time exceeds the baseline by more
+than --threshold (relative) and --min-delta (absolute). The exit status is 1
+if there is any.
+
+Usage::
+
+    python benchmarks/bench_pipeline.py --save-baseline baseline.json
+    python benchmarks/bench_pipeline.py --baseline baseline.json [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from pathlib import Path
+
+import numpy as np
+from scipy.io import wavfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+# after the root, so that `crepe_notes` is the module rather than the package
+sys.path.insert(0, os.path.join(ROOT, 'crepe_notes'))
+
+import analysis_cache  # noqa: E402
+from audio_context import AudioContext  # noqa: E402
+from core import activation_to_pitch, get_activation  # noqa: E402
+from crepe_notes import AMP_ENVELOPE_PARAMS, process  # noqa: E402
+from envelope import amplitude_envelope  # noqa: E402
+
+STAGES = ('decode', 'crepe_activation', 'viterbi', 'envelope', 'madmom_onsets', 'onset_cnn', 'segmentation',
+          'midi_write')
+
+SAMPLE_RATE = 44100
+A4 = 440.
+
+
+def _rss():
+    """Current resident memory in bytes (Linux), None elsewhere."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class Stage(object):
+    """
+    Context manager measuring the wall time, CPU time (all threads) and peak resident memory of a stage.
+
+    The resident memory is sampled every `interval` seconds by a thread; where it cannot be read, the
+    peak is the peak of the process so far (`ru_maxrss`).
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.result = {}
+        self._peak = 0
+        self._done = threading.Event()
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self._peak = max(self._peak, _rss() or 0)
+
+    def __enter__(self):
+        self._start_rss = _rss()
+        self._peak = self._start_rss or 0
+        if self._start_rss is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        if self._start_rss is not None:
+            self._done.set()
+            self._thread.join()
+            peak = max(self._peak, _rss())
+            start = self._start_rss
+        else:
+            # kilobytes on Linux, bytes on macOS
+            scale = 1 if sys.platform == 'darwin' else 1024
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+            start = None
+        self.result = {'wall': wall, 'cpu': cpu, 'peak_rss': peak,
+                       'rss_increase': None if start is None else peak - start}
+
+
+# synthetic recordings ---------------------------------------------------------------------------------------------
+
+def _tone(freqs, sr, harmonics=(1.,), vibrato=0., rng=None):
+    """Sum of harmonics following the frequency curve `freqs` (one value per sample)."""
+    t = np.arange(len(freqs)) / sr
+    if vibrato:
+        freqs = freqs * 2 ** (vibrato / 1200 * np.sin(2 * np.pi * 5.5 * t + rng.uniform(0, 2 * np.pi)))
+    phase = 2 * np.pi * np.cumsum(freqs) / sr
+    return sum(a * np.sin(k * phase) for k, a in enumerate(harmonics, 1))
+
+
+def _note_envelope(num_samples, sr, attack=0.02, release=0.05):
+    envelope = np.ones(num_samples)
+    a, r = min(int(attack * sr), num_samples // 2), min(int(release * sr), num_samples // 2)
+    envelope[:a] = np.linspace(0, 1, a)
+    if r:
+        envelope[-r:] = np.linspace(1, 0, r)
+    return envelope
+
+
+def synthesize(kind, duration, sr=SAMPLE_RATE, seed=0):
+    """
+    Synthetic monophonic recording around A4 (the note `process` guesses from the file name).
+
+    Args:
+        kind (str): 'sine' (pure tones), 'sax' (harmonics, vibrato and breath noise), 'repeated'
+            (the same note repeated with short gaps) or 'glissando' (glides between notes).
+        duration (float): Duration in seconds.
+
+    Returns:
+        numpy array: The samples, float in [-1, 1].
+    """
+    rng = np.random.default_rng(seed)
+    num_samples = int(duration * sr)
+    y = np.zeros(num_samples)
+    sax = (1., .6, .45, .3, .2, .12, .08)
+    pos = int(0.2 * sr)
+    while pos < num_samples:
+        length = min(int(rng.uniform(0.15, 0.6) * sr), num_samples - pos)
+        gap = int(rng.uniform(0.01, 0.05 if kind == 'repeated' else 0.2) * sr)
+        semitones = 0 if kind == 'repeated' else rng.choice([-1, 0, 0, 1])
+        freq = A4 * 2 ** (semitones / 12)
+        if kind == 'glissando':
+            target = A4 * 2 ** (rng.choice([-1, 1]) / 12)
+            freqs = np.concatenate((np.full(length // 2, freq), np.geomspace(freq, target, length - length // 2)))
+        else:
+            freqs = np.full(length, freq)
+        if kind == 'sine':
+            note = _tone(freqs, sr)
+        else:
+            note = _tone(freqs, sr, harmonics=sax if kind != 'repeated' else sax[:3], vibrato=15, rng=rng)
+            note += 0.02 * rng.standard_normal(length)
+        y[pos:pos + length] = note * _note_envelope(length, sr) * rng.uniform(0.3, 0.8)
+        pos += length + gap
+    y += 0.001 * rng.standard_normal(num_samples)
+    return y / max(1., np.abs(y).max())
+
+
+def write_cases(directory, duration, long_minutes):
+    """Write the synthetic recordings as 16-bit WAV files, returns {case: path}."""
+    cases = {kind: duration for kind in ('sine', 'sax', 'repeated', 'glissando')}
+    if long_minutes > 0:
+        cases['long'] = long_minutes * 60
+    paths = {}
+    for seed, (case, seconds) in enumerate(cases.items()):
+        y = synthesize('sax' if case == 'long' else case, seconds, seed=seed)
+        path = os.path.join(directory, f"{case}_A4.wav")
+        wavfile.write(path, SAMPLE_RATE, (y * 32767).astype(np.int16))
+        paths[case] = path
+    return paths
+
+
+# stages -----------------------------------------------------------------------------------------------------------
+
+class Models(object):
+    """The models of the pipeline, loaded before the timings (as `warm_up` does in crepe_notes)."""
+
+    def __init__(self, crepe_capacity='full', onset_cnn_model=None):
+        self.notes = []
+        try:
+            from model_registry import get_crepe_model
+            self.crepe = get_crepe_model(crepe_capacity)
+        except ImportError:
+            from bench_crepe_activation import ProjectionModel
+            self.crepe = ProjectionModel()
+            self.notes.append('tensorflow or crepe is not installed, CREPE is replaced by a stand-in model')
+        try:
+            from model_registry import get_madmom_onset_processor
+            self.madmom = get_madmom_onset_processor()
+        except Exception as e:
+            self.madmom = None
+            self.notes.append(f"madmom onsets skipped: {e!r}")
+        try:
+            import torch
+            from utils import onsetCNN
+            self.device = torch.device('cpu')
+            if onset_cnn_model is None:
+                self.onset_cnn = onsetCNN().to(self.device).eval()
+                self.notes.append('onsetCNN with untrained weights')
+            else:
+                from model_registry import get_onset_cnn
+                self.onset_cnn = get_onset_cnn(onset_cnn_model, self.device)
+        except ImportError as e:
+            self.onset_cnn = None
+            self.notes.append(f"onsetCNN skipped: {e!r}")
+
+
+def run_pipeline(path, models, output_dir):
+    """Run the stages on `path`, returns {stage: measures} (None for skipped stages)."""
+    import pretty_midi as pm
+
+    results = dict.fromkeys(STAGES)
+    with Stage() as stage:
+        audio = AudioContext(path)
+        y, sr = audio.mono(), audio.sample_rate
+    results['decode'] = stage.result
+
+    with Stage() as stage:
+        activation = get_activation(audio.samples, sr, model=models.crepe, verbose=0)
+    results['crepe_activation'] = stage.result
+
+    with Stage() as stage:
+        _, frequency, confidence = activation_to_pitch(activation, viterbi=True)
+    results['viterbi'] = stage.result
+
+    with Stage() as stage:
+        envelope = amplitude_envelope(y, sr, cutoff=AMP_ENVELOPE_PARAMS['cutoff'], order=AMP_ENVELOPE_PARAMS['order'],
+                                      frame_rate=AMP_ENVELOPE_PARAMS['frame_rate'])
+    results['envelope'] = stage.result
+
+    onset_activations = None
+    if models.madmom is not None:
+        with Stage() as stage:
+            onset_activations = models.madmom(audio.signal(44100, num_channels=1))
+        results['madmom_onsets'] = stage.result
+
+    if models.onset_cnn is not None:
+        from New_cnn import predict_onsets, preprocess_audio
+        with Stage() as stage:
+            predict_onsets(models.onset_cnn, *preprocess_audio(path, audio=audio), models.device)
+        results['onset_cnn'] = stage.result
+
+    with Stage() as stage:
+        notes, _ = process(np.nan_to_num(frequency), np.nan_to_num(confidence), Path(path), None, sr=sr,
+                           filtered_amp_envelope=envelope.copy(), onset_activations=onset_activations,
+                           disable_splitting=onset_activations is None, use_cwd=True)
+    results['segmentation'] = stage.result
+
+    with Stage() as stage:
+        # as transcribe_audio in crepe_notes/cli.py
+        midi = pm.PrettyMIDI(initial_tempo=203)
+        instrument = pm.Instrument(program=0)
+        for n in notes:
+            if n['start'] < n['finish']:
+                instrument.notes.append(pm.Note(start=n['start'], end=n['finish'], pitch=n['pitch'],
+                                                velocity=n['velocity']))
+        midi.instruments.append(instrument)
+        midi.write(os.path.join(output_dir, os.path.basename(path) + '.mid'))
+    results['midi_write'] = stage.result
+    audio.close()
+    return results
+
+
+# baseline ---------------------------------------------------------------------------------------------------------
+
+def merge_repeats(runs):
+    """Best (smallest) wall and CPU time and largest peak memory of each stage over repeated runs."""
+    merged = {}
+    for stage in STAGES:
+        measures = [run[stage] for run in runs if run[stage] is not None]
+        if not measures:
+            merged[stage] = None
+            continue
+        merged[stage] = {'wall': min(m['wall'] for m in measures), 'cpu': min(m['cpu'] for m in measures),
+                         'peak_rss': max(m['peak_rss'] for m in measures)}
+        increases = [m['rss_increase'] for m in measures if m['rss_increase'] is not None]
+        merged[stage]['rss_increase'] = max(increases) if increases else None
+    return merged
+
+
+def compare(results, baseline, threshold, min_delta):
+    """
+    Returns:
+        list of tuples: (case, stage, baseline wall time, wall time) of the stages slower than the
+        baseline by more than `threshold` (relative) and `min_delta` seconds.
+    """
+    regressions = []
+    for case, stages in results['cases'].items():
+        for stage, measures in stages.items():
+            reference = baseline.get('cases', {}).get(case, {}).get(stage)
+            if measures is None or reference is None:
+                continue
+            if (measures['wall'] > reference['wall'] * (1 + threshold)
+                    and measures['wall'] - reference['wall'] > min_delta):
+                regressions.append((case, stage, reference['wall'], measures['wall']))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    mib = 2 ** 20
+    header = f"{'case':<10} {'stage':<17} {'wall':>9} {'cpu':>9} {'peak RSS':>10} {'increase':>10}"
+    print(header + (f" {'baseline':>9} {'change':>8}" if baseline else ''))
+    for case, stages in results['cases'].items():
+        for stage in STAGES:
+            m = stages.get(stage)
+            if m is None:
+                print(f"{case:<10} {stage:<17} {'skipped':>9}")
+                continue
+            increase = '' if m['rss_increase'] is None else f"{m['rss_increase'] / mib:6.1f} MiB"
+            line = (f"{case:<10} {stage:<17} {m['wall']:7.3f} s {m['cpu']:7.3f} s {m['peak_rss'] / mib:6.0f} MiB "
+                    f"{increase:>10}")
+            reference = (baseline or {}).get('cases', {}).get(case, {}).get(stage)
+            if reference is not None:
+                line += f" {reference['wall']:7.3f} s {100 * (m['wall'] / reference['wall'] - 1):+7.1f}%"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=30., help='duration of the short cases in seconds')
+    parser.add_argument('--long-minutes', type=float, default=5., help='duration of the long case, 0 to skip it')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per case, the best time is kept')
+    parser.add_argument('--capacity', default='full', choices=['tiny', 'small', 'medium', 'large', 'full'])
+    parser.add_argument('--onset-cnn-model', default=None, help='weights of the onsetCNN')
+    parser.add_argument('--output', default=None, help='write the results to this JSON file')
+    parser.add_argument('--save-baseline', default=None, help='write the results as a baseline JSON file')
+    parser.add_argument('--baseline', default=None, help='compare with this baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown counted as a regression')
+    parser.add_argument('--min-delta', type=float, default=0.05,
+                        help='slowdowns below this many seconds are never regressions (timer noise)')
+    args = parser.parse_args()
+
+    analysis_cache.configure(enabled=False)
+    models = Models(args.capacity, args.onset_cnn_model)
+    for note in models.notes:
+        print(note)
+
+    results = {'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                        'processor': platform.processor(), 'cpus': os.cpu_count(), 'date': time.strftime('%Y-%m-%d'),
+                        'duration': args.duration, 'long_minutes': args.long_minutes, 'notes': models.notes},
+               'cases': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for case, path in write_cases(tmp, args.duration, args.long_minutes).items():
+            runs = []
+            for _ in range(args.repeat):
+                try:
+                    runs.append(run_pipeline(path, models, tmp))
+                except Exception:
+                    print(f"{case}: échec\n{traceback.format_exc()}")
+                    break
+            if runs:
+                results['cases'][case] = merge_repeats(runs)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    for case, stage, reference, wall in regressions:
+        print(f"REGRESSION {case}/{stage}: {reference:.3f} s -> {wall:.3f} s")
+    print(f"{len(regressions)} regression(s) (threshold {args.threshold:.0%}, min {args.min_delta} s)")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
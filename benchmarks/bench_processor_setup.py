@@ -0,0 +1,87 @@
+"""Benchmark processors created anew for every file.
+
+`crepe_notes` creates its madmom processors per file; each fresh instance
+used to build its windows and filterbanks again. This script creates the
+onset (CNN, RNN), beat (RNN) and chroma (deep chroma) processors once per
+file of a batch of short synthetic files and runs their pre-processing (the
+spectrograms, without the neural networks), once with the window and
+filterbank caches emptied before every file (as before) and once sharing
+them. Reports the time per file, the number of windows and filterbanks built
+for the whole batch, and checks that the results are identical.
+
+Usage::
+
+    python benchmarks/bench_processor_setup.py [--files 20] [--duration 2]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from madmom_update.audio.chroma import DeepChromaProcessor  # noqa: E402
+from madmom_update.audio.filters import cached_filterbank  # noqa: E402
+from madmom_update.audio.signal import Signal  # noqa: E402
+from madmom_update.audio.stft import cached_window  # noqa: E402
+from madmom_update.features.beats import RNNBeatProcessor  # noqa: E402
+from madmom_update.features.onsets import CNNOnsetProcessor, RNNOnsetProcessor  # noqa: E402
+from madmom_update.processors import SequentialProcessor  # noqa: E402
+
+SAMPLE_RATE = 44100
+
+
+def pre_processor(processor):
+    """The spectrogram part of the processor, without the neural networks."""
+    if isinstance(processor, DeepChromaProcessor):
+        # signal, frames, STFT, spectrogram
+        return SequentialProcessor(processor.processors[:4])
+    return processor.processors[0]
+
+
+def run(processor_class, signals, shared):
+    """Create the processor for every signal and pre-process it."""
+    cached_window.cache_clear()
+    cached_filterbank.cache_clear()
+    results = []
+    elapsed = 0
+    built = 0
+    for signal in signals:
+        processor = pre_processor(processor_class())
+        start = time.perf_counter()
+        results.append(processor(signal))
+        elapsed += time.perf_counter() - start
+        if not shared or signal is signals[-1]:
+            built += cached_window.cache_info().misses + cached_filterbank.cache_info().misses
+            cached_window.cache_clear()
+            cached_filterbank.cache_clear()
+    return results, elapsed / len(signals), built
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20, help='number of files')
+    parser.add_argument('--duration', type=float, default=2, help='length of each file in seconds')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    signals = [Signal((rng.standard_normal(int(args.duration * SAMPLE_RATE)) * 3000).astype(np.int16),
+                      sample_rate=SAMPLE_RATE) for _ in range(args.files)]
+    ok = True
+
+    print(f"{args.files} files of {args.duration:.0f} s, pre-processing time per file")
+    print(f"{'processor':<20} {'rebuilt':>9} {'shared':>9} {'built':>13}")
+    for processor_class in (CNNOnsetProcessor, RNNOnsetProcessor, RNNBeatProcessor, DeepChromaProcessor):
+        reference, rebuilt, built_before = run(processor_class, signals, shared=False)
+        results, shared, built = run(processor_class, signals, shared=True)
+        ok &= all(np.array_equal(np.asarray(a), np.asarray(b)) for a, b in zip(reference, results))
+        print(f"{processor_class.__name__:<20} {rebuilt * 1000:6.1f} ms {shared * 1000:6.1f} ms "
+              f"{built_before:>5} -> {built:<4}")
+
+    print(f"identical results: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
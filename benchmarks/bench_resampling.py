@@ -0,0 +1,57 @@
+"""Compare the quality and speed of the `core.resample_audio` modes.
+
+A mix of tones below 8 kHz (kept by CREPE's 16 kHz input) and above it (which
+must be filtered out) is resampled to 16 kHz from several source rates. The
+result is compared with the in-band tones synthesized directly at 16 kHz: the
+signal-to-error ratio accounts for both passband distortion and aliasing.
+
+Usage::
+
+    python benchmarks/bench_resampling.py [--seconds 60] [--rates 44100 48000 96000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core import RESAMPLERS, resample_audio  # noqa: E402
+
+IN_BAND = (110., 440., 1234.5, 3000., 6500.)
+OUT_OF_BAND = (9000., 15000.)
+
+
+def tones(frequencies, sr, num_samples):
+    t = np.arange(num_samples) / sr
+    return sum(np.sin(2 * np.pi * f * t) for f in frequencies) / len(IN_BAND)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=60.)
+    parser.add_argument('--rates', type=int, nargs='+', default=[44100, 48000, 96000])
+    args = parser.parse_args()
+
+    target_sr = 16000
+    reference = tones(IN_BAND, target_sr, int(args.seconds * target_sr))
+    # ignore the filter transients at both ends
+    edge = target_sr // 10
+    for sr in args.rates:
+        num_samples = int(args.seconds * sr)
+        audio = (tones(IN_BAND, sr, num_samples) + 0.5 * tones(OUT_OF_BAND, sr, num_samples)).astype(np.float32)
+        for resampler in RESAMPLERS:
+            start = time.perf_counter()
+            resampled = resample_audio(audio, sr, target_sr, resampler)
+            elapsed = time.perf_counter() - start
+            n = min(len(resampled), len(reference))
+            error = resampled[edge:n - edge] - reference[edge:n - edge]
+            snr = 10 * np.log10(np.sum(reference[edge:n - edge] ** 2) / np.sum(error ** 2))
+            print(f"{sr:>6} Hz {resampler:>12}: {elapsed:7.3f} s ({args.seconds / elapsed:6.0f}x real time), "
+                  f"SNR {snr:5.1f} dB")
+
+
+if __name__ == '__main__':
+    main()
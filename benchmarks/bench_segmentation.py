@@ -0,0 +1,217 @@
+"""Benchmark the vectorized segmentation and note assembly of `process`.
+
+Compares `find_segments`, `merge_segments` and `split_notes_at_onsets` with the
+previous per-segment loops (steps 9 to 13 of `crepe_notes.process`, from before
+they were vectorized) on a synthetic dense passage, and checks that both
+produce the same notes. Each function is then checked on its own against its
+loop version, with the same input, on shorter passages with sparse to dense
+onsets.
+
+Usage::
+
+    python benchmarks/bench_segmentation.py [--minutes 10] [--seeds 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.signal import find_peaks, peak_widths
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'crepe_notes'))
+
+from crepe_notes import find_segments, merge_segments, split_notes_at_onsets  # noqa: E402
+from note_table import NoteTable  # noqa: E402
+
+
+def reference_segments(transition_starts, transition_ends, midi_pitch, freqs, conf, filtered_amp_envelope,
+                       midi_note, global_max_amp):
+    """Step 9 (segment list) as it was implemented with Python loops."""
+    transition_starts = list(map(int, np.round(transition_starts)))
+    transition_ends = list(map(int, np.round(transition_ends)))
+    transitions = [(s, f, 'transition') for (s, f) in zip(transition_starts, transition_ends)]
+    note_starts = [0] + transition_ends
+    note_ends = transition_starts + [len(conf) + 1]
+    note_regions = [(s, f, 'note') for (s, f) in (zip(note_starts, note_ends))]
+
+    segment_list = []
+    for a, b, label in sum(zip(note_regions, transitions), ()):
+        if label == 'transition' or a > b or b - a <= 1:
+            continue
+        max_amp = np.max(filtered_amp_envelope[a:b])
+        scaled_max_amp = np.interp(max_amp, (0, global_max_amp), (0, 127))
+        if np.round(np.median(midi_pitch[a:b])) == midi_note:
+            pitch = np.round(np.median(midi_pitch[a:b]))
+        else:
+            pitch = 0
+        segment_list.append({'pitch': pitch, 'freq': np.median(freqs[a:b]), 'conf': np.median(conf[a:b]),
+                             'transition_strength': 1 - conf[a], 'amplitude': scaled_max_amp,
+                             'start_idx': a, 'finish_idx': b})
+    return segment_list
+
+
+def reference_merge(segment_list, filtered_amp_envelope, midi_note, min_velocity, global_max_amp):
+    """Steps 10 and 11 (merging, output notes) as they were implemented with Python loops."""
+    notes = []
+    sub_list = []
+    for a, b in zip(segment_list, segment_list[1:]):
+        sub_list.append(a)
+        if np.abs(a['pitch'] - b['pitch']) > 0.5:
+            notes.append(sub_list)
+            sub_list = []
+    if len(sub_list) > 0:
+        notes.append(sub_list)
+
+    output_notes = []
+    for x_s in notes:
+        x_s_filt = [x for x in x_s if x['amplitude'] > min_velocity and midi_note - 1 <= x['pitch'] <= midi_note + 1]
+        if len(x_s_filt) == 0:
+            continue
+        seg_start = x_s_filt[0]['start_idx']
+        seg_end = x_s_filt[-1]['finish_idx']
+        max_amp = np.max(filtered_amp_envelope[seg_start:seg_end])
+        scaled_max_amp = np.interp(max_amp, (0, global_max_amp), (0, 127))
+        output_notes.append({'pitch': int(np.round(np.median(np.array([y['pitch'] for y in x_s_filt])))),
+                             'freq': x_s_filt[0]['freq'], 'velocity': round(scaled_max_amp),
+                             'start_idx': seg_start, 'finish_idx': seg_end,
+                             'conf': np.median(np.array([y['conf'] for y in x_s_filt])),
+                             'transition_strength': x_s[-1]['transition_strength']})
+    return output_notes
+
+
+def reference_split(output_notes, onsets, min_duration):
+    """Step 13 (splitting at onsets) as it was implemented with Python loops."""
+    onset_separated_notes = []
+    for n in output_notes:
+        n_s = n['start_idx']
+        n_f = n['finish_idx']
+        last_onset = 0
+        for idx in np.argwhere(onsets[n_s:n_f] > 0.7):
+            if idx[0] > last_onset + int(min_duration / 0.01):
+                new_note = n.copy()
+                new_note['start_idx'] = n_s + last_onset
+                new_note['finish_idx'] = n_s + idx[0]
+                onset_separated_notes.append(new_note)
+                last_onset = idx[0]
+        new_note = n.copy()
+        new_note['start_idx'] = n_s + last_onset
+        new_note['finish_idx'] = n_f
+        onset_separated_notes.append(new_note)
+    return onset_separated_notes
+
+
+def reference_notes(transition_starts, transition_ends, midi_pitch, freqs, conf, filtered_amp_envelope, midi_note,
+                    min_velocity, global_max_amp, onsets, min_duration):
+    """Steps 9 to 13 as they were implemented with Python loops."""
+    segment_list = reference_segments(transition_starts, transition_ends, midi_pitch, freqs, conf,
+                                      filtered_amp_envelope, midi_note, global_max_amp)
+    output_notes = reference_merge(segment_list, filtered_amp_envelope, midi_note, min_velocity, global_max_amp)
+    return reference_split(output_notes, onsets, min_duration)
+
+
+def vectorized_segments(transition_starts, transition_ends, midi_pitch, freqs, conf, filtered_amp_envelope,
+                        midi_note, global_max_amp):
+    transition_starts = np.round(transition_starts).astype(int)
+    transition_ends = np.round(transition_ends).astype(int)
+    note_starts = np.concatenate(([0], transition_ends))[:len(transition_starts)]
+    return find_segments(note_starts, transition_starts, midi_pitch, freqs, conf, filtered_amp_envelope,
+                         midi_note, global_max_amp)
+
+
+def vectorized_notes(transition_starts, transition_ends, midi_pitch, freqs, conf, filtered_amp_envelope, midi_note,
+                     min_velocity, global_max_amp, onsets, min_duration):
+    segments = vectorized_segments(transition_starts, transition_ends, midi_pitch, freqs, conf,
+                                   filtered_amp_envelope, midi_note, global_max_amp)
+    notes = merge_segments(segments, filtered_amp_envelope, midi_note, min_velocity, global_max_amp)
+    return split_notes_at_onsets(notes, onsets, min_duration)
+
+
+def check_stages(transition_starts, transition_ends, midi_pitch, freqs, conf, envelope, midi_note, min_velocity,
+                 global_max_amp, onsets, min_duration):
+    """
+    Compare each vectorized stage with its loop version, on the same input.
+
+    Returns:
+        dict: Whether the segments, the merged notes and the split notes are identical.
+    """
+    segment_list = reference_segments(transition_starts, transition_ends, midi_pitch, freqs, conf, envelope,
+                                      midi_note, global_max_amp)
+    segments = vectorized_segments(transition_starts, transition_ends, midi_pitch, freqs, conf, envelope,
+                                   midi_note, global_max_amp)
+    reference_columns = {key: np.array([s[key] for s in segment_list]) for key in segments}
+    output_notes = reference_merge(segment_list, envelope, midi_note, min_velocity, global_max_amp)
+    return {
+        'find_segments': all(len(segments[key]) == len(segment_list) and
+                             np.array_equal(segments[key], reference_columns[key]) for key in segments),
+        'merge_segments': NoteTable.from_dicts(output_notes) == merge_segments(
+            reference_columns, envelope, midi_note, min_velocity, global_max_amp),
+        'split_notes_at_onsets': NoteTable.from_dicts(reference_split(output_notes, onsets, min_duration)) ==
+        split_notes_at_onsets(NoteTable.from_dicts(output_notes), onsets, min_duration),
+    }
+
+
+def synthetic_passage(num_frames, midi_note=60, seed=0, onset_rate=0.02):
+    """
+    Fast passage alternating `midi_note` with neighbouring notes, with confidence dips between notes
+    and onsets on a fraction `onset_rate` of the frames.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(4, 20, size=num_frames // 4 + 1)
+    pitches = np.where(rng.random(len(lengths)) < 0.6, midi_note, midi_note + rng.integers(-3, 4, len(lengths)))
+    midi_pitch = np.repeat(pitches, lengths)[:num_frames] + rng.normal(0, 0.1, num_frames)
+    freqs = 440. * 2 ** ((midi_pitch - 69) / 12)
+    boundaries = np.cumsum(lengths)
+    boundaries = boundaries[boundaries < num_frames]
+    conf = np.clip(0.9 + rng.normal(0, 0.03, num_frames), 0, 1).astype(np.float32)
+    conf[boundaries] = rng.uniform(0.1, 0.6, len(boundaries))
+    envelope = np.abs(rng.normal(0.3, 0.1, num_frames))
+    onsets = np.zeros(num_frames)
+    onsets[rng.choice(num_frames, int(num_frames * onset_rate), replace=False)] = 1
+    return midi_pitch, freqs, conf, envelope, onsets
+
+
+def inputs_of(midi_pitch, freqs, conf, envelope, onsets, midi_note=60, min_velocity=6, min_duration=0.03):
+    """Arguments of `reference_notes` and `vectorized_notes` for a passage, as `process` derives them."""
+    conf_peaks, _ = find_peaks(1 - conf, distance=4, prominence=0.001)
+    _, _, transition_starts, transition_ends = peak_widths(1 - conf, conf_peaks, rel_height=0.5)
+    return (transition_starts, transition_ends, midi_pitch, freqs, conf, envelope, midi_note, min_velocity,
+            envelope.max(), onsets, min_duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=10.)
+    parser.add_argument('--seeds', type=int, default=5, help='number of passages checked stage by stage')
+    args = parser.parse_args()
+
+    inputs = inputs_of(*synthetic_passage(int(args.minutes * 6000)))
+    print(f"{len(inputs[2])} frames, {len(inputs[0])} confidence peaks")
+
+    results = {}
+    for name, func in (('loops', reference_notes), ('vectorized', vectorized_notes)):
+        start = time.perf_counter()
+        results[name] = func(*inputs)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12}: {elapsed * 1000:9.1f} ms, {len(results[name])} notes")
+    identical = NoteTable.from_dicts(results['loops']) == results['vectorized']
+    print(f"identical notes: {identical}")
+
+    # each stage on its own, on short passages with sparse to dense onsets and a silent one
+    print(f"{'seed':>4} {'onsets':>6} {'find_segments':>14} {'merge_segments':>15} {'split_notes_at_onsets':>22}")
+    for seed in range(args.seeds):
+        onset_rate = (0.01, 0.05, 0.2, 0.5, 1.)[seed % 5]
+        passage = synthetic_passage(6000, seed=seed, onset_rate=onset_rate)
+        if seed == args.seeds - 1:
+            # silence: no segment is loud enough
+            passage = passage[:3] + (np.zeros_like(passage[3]) + 1e-6, passage[4])
+        stages = check_stages(*inputs_of(*passage))
+        identical &= all(stages.values())
+        print(f"{seed:>4} {onset_rate:>6.0%} {str(stages['find_segments']):>14} {str(stages['merge_segments']):>15} "
+              f"{str(stages['split_notes_at_onsets']):>22}")
+    print(f"all identical: {identical}")
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
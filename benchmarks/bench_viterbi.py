@@ -0,0 +1,77 @@
+"""Benchmark the banded Viterbi decoder of `core` against hmmlearn's dense decoder.
+
+Decodes the argmax observations of a synthetic salience with both and checks
+that the paths are identical (hmmlearn is only needed for this benchmark).
+
+Usage::
+
+    python benchmarks/bench_viterbi.py [--minutes 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core import viterbi_model, viterbi_path  # noqa: E402
+
+
+def hmmlearn_path(observations):
+    """Reference implementation: the CategoricalHMM previously built on every call."""
+    from hmmlearn import hmm
+
+    starting = np.ones(360) / 360
+    xx, yy = np.meshgrid(range(360), range(360))
+    transition = np.maximum(12 - abs(xx - yy), 0)
+    transition = transition / np.sum(transition, axis=1)[:, None]
+    self_emission = 0.1
+    emission = (np.eye(360) * self_emission + np.ones(shape=(360, 360)) * ((1 - self_emission) / 360))
+    model = hmm.CategoricalHMM(360, starting, transition)
+    model.startprob_, model.transmat_, model.emissionprob_ = starting, transition, emission
+    return model.predict(observations.reshape(-1, 1), [len(observations)])
+
+
+def synthetic_observations(num_frames, seed=0):
+    """Argmax bins of a wandering pitch with octave errors and unvoiced noise."""
+    rng = np.random.default_rng(seed)
+    pitch = np.clip(180 + np.cumsum(rng.normal(0, 1, num_frames)), 0, 359)
+    observations = np.round(pitch).astype(int)
+    octave_errors = rng.random(num_frames) < 0.05
+    observations[octave_errors] = np.clip(observations[octave_errors] + 60, 0, 359)
+    unvoiced = rng.random(num_frames) < 0.1
+    observations[unvoiced] = rng.integers(0, 360, unvoiced.sum())
+    return observations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=5.)
+    args = parser.parse_args()
+
+    observations = synthetic_observations(int(args.minutes * 6000))
+    print(f"{len(observations)} frames")
+
+    start = time.perf_counter()
+    viterbi_model()
+    print(f"{'model':>10}: {time.perf_counter() - start:7.3f} s (once per process)")
+    start = time.perf_counter()
+    path = viterbi_path(observations)
+    banded_time = time.perf_counter() - start
+    print(f"{'banded':>10}: {banded_time:7.3f} s, {len(observations) / banded_time:9.0f} frames/s")
+
+    try:
+        start = time.perf_counter()
+        reference = hmmlearn_path(observations)
+    except ImportError:
+        print("hmmlearn is not installed, skipping the comparison")
+        return
+    dense_time = time.perf_counter() - start
+    print(f"{'hmmlearn':>10}: {dense_time:7.3f} s, {len(observations) / dense_time:9.0f} frames/s")
+    print(f"identical paths: {np.array_equal(path, reference)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark reading a long multi-channel 24-bit WAV file for framing.
+
+Compares reading the whole file into memory and down-mixing it (what loading a
+24-bit or multi-channel file amounted to before `madmom.io.audio.WaveFile`)
+with framing the memory-mapped file lazily through `WaveFile`. Reports the
+time and the peak memory allocated by NumPy to compute the energy of every
+frame, and checks that both give the same frames.
+
+Usage::
+
+    python benchmarks/bench_wave_reader.py [--minutes 5] [--channels 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from scipy.io import wavfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from madmom_update.audio.signal import FramedSignal, Signal, remix  # noqa: E402
+from madmom_update.io.audio import WaveFile  # noqa: E402
+
+
+def write_24bit_wave(filename, num_samples, num_channels, sample_rate, seed=0, block_size=2 ** 20):
+    """Write random 24-bit PCM without holding the whole file in memory."""
+    rng = np.random.default_rng(seed)
+    with open(filename, 'wb') as f:
+        data_size = num_samples * num_channels * 3
+        f.write(b'RIFF' + (36 + data_size).to_bytes(4, 'little') + b'WAVE')
+        f.write(b'fmt ' + (16).to_bytes(4, 'little') + np.array(
+            [1, num_channels], '<u2').tobytes() + np.array(
+            [sample_rate, sample_rate * num_channels * 3], '<u4').tobytes() + np.array(
+            [num_channels * 3, 24], '<u2').tobytes())
+        f.write(b'data' + data_size.to_bytes(4, 'little'))
+        for start in range(0, num_samples, block_size):
+            n = min(block_size, num_samples - start)
+            samples = rng.integers(-2 ** 21, 2 ** 21, (n, num_channels), dtype=np.int32)
+            f.write(samples.astype('<i4').view(np.uint8).reshape(n, num_channels, 4)[..., :3].tobytes())
+
+
+def frame_energy(frames):
+    return np.array([np.sum(frame.astype(np.float64) ** 2) for frame in frames])
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=5.)
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--sample-rate', type=int, default=48000)
+    parser.add_argument('--frame-size', type=int, default=2048)
+    args = parser.parse_args()
+
+    num_samples = int(args.minutes * 60 * args.sample_rate)
+    hop_size = args.sample_rate / 100.
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'session.wav')
+        write_24bit_wave(filename, num_samples, args.channels, args.sample_rate)
+        print(f"{args.minutes} min, {args.channels} channels, 24 bit: {os.path.getsize(filename) / 2 ** 20:.0f} MiB")
+
+        def in_memory():
+            sample_rate, samples = wavfile.read(filename)
+            signal = Signal(remix(samples, 1), sample_rate=sample_rate)
+            return frame_energy(FramedSignal(signal, frame_size=args.frame_size, hop_size=hop_size))
+
+        def memory_mapped():
+            return frame_energy(FramedSignal(WaveFile(filename, num_channels=1), frame_size=args.frame_size,
+                                             hop_size=hop_size))
+
+        results = {}
+        for name, func in (('in memory', in_memory), ('WaveFile', memory_mapped)):
+            results[name], elapsed, peak = measure(func)
+            print(f"{name:>10}: {elapsed:6.2f} s, peak {peak / 2 ** 20:8.1f} MiB, {len(results[name])} frames")
+    identical = np.array_equal(results['in memory'], results['WaveFile'])
+    print(f"identical frames: {identical}")
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
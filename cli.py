@@ -14,7 +14,8 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
 def run(filename, output=None, model_capacity='full', viterbi=False,
         save_activation=False, save_plot=False, plot_voicing=False,
-        no_centering=False, step_size=10, verbose=True):
+        no_centering=False, step_size=10, verbose=True, f0_format='csv',
+        resampler='resampy'):
     """
     Collect the WAV files to process and run the model
 
@@ -50,6 +51,12 @@ def run(filename, output=None, model_capacity='full', viterbi=False,
         The step size in milliseconds for running pitch estimation.
     verbose : bool
         Print status messages and keras progress (default=True).
+    f0_format : 'csv', 'npy' or 'both'
+        Format of the saved pitch track; 'npy' is a binary file that loads
+        much faster than the CSV (see :func:`~crepe.core.save_f0_binary`).
+    resampler : 'resampy', 'kaiser_fast' or 'polyphase'
+        How audio that is not at 16 kHz is resampled (see
+        :func:`~crepe.core.resample_audio`).
     """
 
     files = []
@@ -86,7 +93,9 @@ def run(filename, output=None, model_capacity='full', viterbi=False,
                      save_plot=save_plot,
                      plot_voicing=plot_voicing,
                      step_size=step_size,
-                     verbose=verbose)
+                     verbose=verbose,
+                     f0_format=f0_format,
+                     resampler=resampler)
 
 
 def positive_int(value):
@@ -158,6 +167,15 @@ def main():
     parser.add_argument('--step-size', '-s', default=10, type=positive_int,
                         help='The step size in milliseconds for running '
                              'pitch estimation. The default is 10 ms.')
+    parser.add_argument('--f0-format', '-f', default='csv',
+                        choices=['csv', 'npy', 'both'],
+                        help='Save the pitch track as CSV (default), as a '
+                             'binary .f0.npy file that loads faster, or both')
+    parser.add_argument('--resampler', '-r', default='resampy',
+                        choices=['resampy', 'kaiser_fast', 'polyphase'],
+                        help='How audio that is not at 16 kHz is resampled: '
+                             'resampy (default, best quality), kaiser_fast '
+                             'or polyphase (fastest)')
     parser.add_argument('--quiet', '-q', default=False,
                         action='store_true',
                         help='Suppress all non-error printouts (e.g. progress '
@@ -174,4 +192,6 @@ def main():
         plot_voicing=args.plot_voicing,
         no_centering=args.no_centering,
         step_size=args.step_size,
-        verbose=not args.quiet)
+        verbose=not args.quiet,
+        f0_format=args.f0_format,
+        resampler=args.resampler)
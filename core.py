@@ -4,6 +4,7 @@ from __future__ import print_function
 import os
 import re
 import sys
+import time
 
 from scipy.io import wavfile
 import numpy as np
@@ -97,9 +98,68 @@ def output_path(file, suffix, output_dir):
     return path
 
 
+# record layout of the binary f0 files (.f0.npy), one row per frame
+F0_DTYPE = np.dtype([('time', np.float64), ('frequency', np.float64),
+                     ('confidence', np.float32)])
+
+
+def save_f0_binary(path, time, frequency, confidence):
+    """
+    Save a pitch track as a binary .npy file of `F0_DTYPE` records.
+
+    Unlike the CSV output, values are stored at full precision and the file
+    can be memory-mapped by :func:`load_f0_binary`.
+
+    Parameters
+    ----------
+    path : str
+        Path of the .npy file.
+    time, frequency, confidence : np.ndarray [shape=(T,)]
+        The outputs of :func:`predict`.
+    """
+    f0_data = np.empty(len(time), dtype=F0_DTYPE)
+    f0_data['time'] = time
+    f0_data['frequency'] = frequency
+    f0_data['confidence'] = confidence
+    np.save(path, f0_data)
+
+
+def load_f0_binary(path, mmap_mode='r', activation_path=None):
+    """
+    Load a pitch track saved by :func:`save_f0_binary`.
+
+    Parameters
+    ----------
+    path : str
+        Path of the .f0.npy file.
+    mmap_mode : None, 'r', 'r+' or 'c'
+        Memory-map the file instead of reading it (see :func:`numpy.load`).
+    activation_path : str or None
+        Also load the activation matrix saved next to it
+        (``.activation.npy``), with the same memory-mapping.
+
+    Returns
+    -------
+    time, frequency, confidence : np.ndarray [shape=(T,)]
+    activation : np.ndarray [shape=(T, 360)]
+        Only returned if `activation_path` is given.
+    """
+    f0_data = np.load(path, mmap_mode=mmap_mode)
+    if f0_data.dtype != F0_DTYPE:
+        raise ValueError("{} is not a binary f0 file".format(path))
+    f0 = f0_data['time'], f0_data['frequency'], f0_data['confidence']
+    if activation_path is not None:
+        return f0 + (np.load(activation_path, mmap_mode=mmap_mode),)
+    return f0
+
+
 def to_local_average_cents(salience, center=None):
     """
     find the weighted average cents near the argmax bin
+
+    For a 2-D salience (one row per frame), `center` can be an array giving
+    the bin of each frame (e.g. a Viterbi path); all the frames are decoded
+    at once, with the same result as decoding them one by one.
     """
 
     if not hasattr(to_local_average_cents, 'cents_mapping'):
@@ -118,48 +178,231 @@ def to_local_average_cents(salience, center=None):
         weight_sum = np.sum(salience)
         return product_sum / weight_sum
     if salience.ndim == 2:
-        return np.array([to_local_average_cents(salience[i, :]) for i in
-                         range(salience.shape[0])])
+        if center is None:
+            center = np.argmax(salience, axis=1)
+        start = np.maximum(0, center - 4)
+        end = np.minimum(salience.shape[1], center + 5)
+        lengths = end - start
+        cents = np.empty(salience.shape[0])
+        # windows are clipped at the edges of the salience: gather the
+        # windows of each length separately so that the sums run over the
+        # same elements, in the same order, as in the 1-D case
+        for length in np.unique(lengths):
+            rows = np.flatnonzero(lengths == length)
+            bins = start[rows, None] + np.arange(length)
+            windows = salience[rows[:, None], bins]
+            product_sum = np.sum(
+                windows * to_local_average_cents.cents_mapping[bins], axis=1)
+            weight_sum = np.sum(windows, axis=1)
+            cents[rows] = product_sum / weight_sum
+        return cents
 
     raise Exception("label should be either 1d or 2d ndarray")
 
 
+def viterbi_model():
+    """
+    The HMM used by :func:`to_viterbi_cents`, built once per process.
+
+    Returns
+    -------
+    log_start : np.ndarray [shape=(360,)]
+        Log probabilities of the starting pitch (uniform).
+    log_transition_band : np.ndarray [shape=(360, 23)]
+        ``log_transition_band[j, m]`` is the log probability of moving to
+        bin ``j`` from bin ``j + 11 - m``. Transitions over more than 11 bins
+        have probability 0 and are not stored.
+    log_emission : np.ndarray [shape=(360, 360)]
+        ``log_emission[i, k]`` is the log probability of observing bin ``k``
+        (the argmax of the salience) in state ``i``.
+    """
+    if not hasattr(viterbi_model, 'model'):
+        # uniform prior on the starting pitch
+        starting = np.ones(360) / 360
+
+        # transition probabilities inducing continuous pitch
+        xx, yy = np.meshgrid(range(360), range(360))
+        transition = np.maximum(12 - abs(xx - yy), 0)
+        transition = transition / np.sum(transition, axis=1)[:, None]
+
+        # emission probability = fixed probability for self, evenly
+        # distribute the others
+        self_emission = 0.1
+        emission = (np.eye(360) * self_emission + np.ones(shape=(360, 360)) *
+                    ((1 - self_emission) / 360))
+
+        with np.errstate(divide='ignore'):
+            log_transition = np.log(transition)
+        band = np.full((360, 23), -np.inf)
+        for m in range(23):
+            previous = np.arange(360) + 11 - m
+            valid = (previous >= 0) & (previous < 360)
+            band[valid, m] = log_transition[previous[valid],
+                                            np.arange(360)[valid]]
+        viterbi_model.model = np.log(starting), band, np.log(emission)
+
+    return viterbi_model.model
+
+
+def viterbi_path(observations):
+    """
+    Most likely state sequence of the :func:`viterbi_model` HMM given the
+    observed argmax bins.
+
+    Only the 23 transitions with a non-zero probability are considered for
+    each state, so decoding runs in O(T * 360 * 23). Ties are broken
+    towards the highest previous bin, which gives the same path as
+    hmmlearn's decoder.
+
+    Parameters
+    ----------
+    observations : np.ndarray [shape=(T,)]
+        Index of the maximum of the salience in each frame.
+
+    Returns
+    -------
+    path : np.ndarray [shape=(T,)]
+    """
+    log_start, band, log_emission = viterbi_model()
+    num_frames = len(observations)
+    if num_frames == 0:
+        return np.zeros(0, dtype=int)
+
+    lattice = log_start + log_emission[:, observations[0]]
+    # backpointers as offsets into the band, 360 bytes per frame
+    backpointers = np.empty((num_frames, 360), dtype=np.int8)
+    padded = np.full(360 + 22, -np.inf)
+    # candidates[j, m] = lattice[j + 11 - m] + log_transition[j + 11 - m, j]
+    previous = np.lib.stride_tricks.sliding_window_view(padded, 23)[:, ::-1]
+    candidates = np.empty((360, 23))
+    states = np.arange(360)
+    for t in range(1, num_frames):
+        padded[11:371] = lattice
+        np.add(previous, band, out=candidates)
+        best = candidates.argmax(axis=1)
+        backpointers[t] = best
+        lattice = candidates[states, best] + log_emission[:, observations[t]]
+
+    path = np.empty(num_frames, dtype=int)
+    path[-1] = np.argmax(lattice)
+    for t in range(num_frames - 1, 0, -1):
+        path[t - 1] = path[t] + 11 - backpointers[t, path[t]]
+    return path
+
+
 def to_viterbi_cents(salience):
     """
     Find the Viterbi path using a transition prior that induces pitch
     continuity.
     """
-    from hmmlearn import hmm
+    # find the Viterbi path
+    observations = np.argmax(salience, axis=1)
+    path = viterbi_path(observations)
 
-    # uniform prior on the starting pitch
-    starting = np.ones(360) / 360
+    return to_local_average_cents(salience, path)
 
-    # transition probabilities inducing continuous pitch
-    xx, yy = np.meshgrid(range(360), range(360))
-    transition = np.maximum(12 - abs(xx - yy), 0)
-    transition = transition / np.sum(transition, axis=1)[:, None]
 
-    # emission probability = fixed probability for self, evenly distribute the
-    # others
-    self_emission = 0.1
-    emission = (np.eye(360) * self_emission + np.ones(shape=(360, 360)) *
-                ((1 - self_emission) / 360))
+# resampling methods of resample_audio, from best quality to fastest
+RESAMPLERS = ('resampy', 'kaiser_fast', 'polyphase')
 
-    # fix the model parameters because we are not optimizing the model
-    model = hmm.CategoricalHMM(360, starting, transition)
-    model.startprob_, model.transmat_, model.emissionprob_ = \
-        starting, transition, emission
 
-    # find the Viterbi path
-    observations = np.argmax(salience, axis=1)
-    path = model.predict(observations.reshape(-1, 1), [len(observations)])
+def resample_audio(audio, sr, target_sr=model_srate, resampler='resampy'):
+    """
+    Resample `audio` from `sr` to `target_sr`.
+
+    Parameters
+    ----------
+    audio : np.ndarray [shape=(N,)]
+        Mono audio samples.
+    sr, target_sr : int
+        Original and target sample rates.
+    resampler : 'resampy', 'kaiser_fast' or 'polyphase'
+        - 'resampy' (default): resampy's high quality 'kaiser_best' filter
+        - 'kaiser_fast': resampy's shorter 'kaiser_fast' filter
+        - 'polyphase': rational polyphase filtering with
+          :func:`scipy.signal.resample_poly`, much faster for common ratios
+          such as 96000 / 16000 or 44100 / 16000
+
+    Returns
+    -------
+    audio : np.ndarray [shape=(M,)]
+    """
+    if sr == target_sr:
+        return audio
+    if resampler == 'polyphase':
+        from math import gcd
+        from scipy.signal import resample_poly
+        divisor = gcd(int(sr), int(target_sr))
+        resampled = resample_poly(audio, int(target_sr) // divisor,
+                                  int(sr) // divisor)
+        return resampled.astype(audio.dtype, copy=False)
+    if resampler in ('resampy', 'kaiser_fast'):
+        from resampy import resample
+        return resample(audio, sr, target_sr,
+                        filter='kaiser_best' if resampler == 'resampy'
+                        else 'kaiser_fast')
+    raise ValueError("resampler should be one of {}".format(RESAMPLERS))
+
+
+def prepare_audio(audio, sr, center=True, resampler='resampy'):
+    """
+    Downmix, convert to float32, resample to 16 kHz (see
+    :func:`resample_audio`) and (if `center`) pad `audio` as expected by
+    :func:`frame_batches`.
+    """
+    if len(audio.shape) == 2:
+        audio = audio.mean(1)  # make mono
+    audio = audio.astype(np.float32)
+    if sr != model_srate:
+        # resample audio if necessary
+        audio = resample_audio(audio, sr, model_srate, resampler)
+
+    # pad so that frames are centered around their timestamps (i.e. first frame
+    # is zero centered).
+    if center:
+        audio = np.pad(audio, 512, mode='constant', constant_values=0)
+    return audio
+
+
+def frame_batches(audio, hop_length, batch_size):
+    """
+    Generate the normalized 1024-sample frames of `audio` in batches.
+
+    Only one batch of frames is materialized at a time; the frames are read
+    from a strided view of `audio`.
+
+    Parameters
+    ----------
+    audio : np.ndarray [shape=(N,)]
+        The (padded) 16 kHz mono audio, float32.
+    hop_length : int
+        Number of samples between the starts of consecutive frames.
+    batch_size : int
+        Number of frames per batch.
+
+    Yields
+    ------
+    start : int
+        Index of the first frame of the batch.
+    frames : np.ndarray [shape=(batch_size, 1024)]
+        The normalized frames (the last batch may be shorter).
+    """
+    n_frames = 1 + int((len(audio) - 1024) / hop_length)
+    all_frames = as_strided(audio, shape=(n_frames, 1024),
+                            strides=(hop_length * audio.itemsize,
+                                     audio.itemsize))
+    for start in range(0, n_frames, batch_size):
+        frames = all_frames[start:start + batch_size].copy()
 
-    return np.array([to_local_average_cents(salience[i, :], path[i]) for i in
-                     range(len(observations))])
+        # normalize each frame -- this is expected by the model
+        frames -= np.mean(frames, axis=1)[:, np.newaxis]
+        frames /= np.clip(np.std(frames, axis=1)[:, np.newaxis], 1e-8, None)
+        yield start, frames
 
 
 def get_activation(audio, sr, model_capacity='full', center=True, step_size=10,
-                   verbose=1):
+                   verbose=1, model=None, batch_size=2048, dtype=np.float32,
+                   out=None, resampler='resampy'):
     """
 
     Parameters
@@ -179,46 +422,181 @@ def get_activation(audio, sr, model_capacity='full', center=True, step_size=10,
     step_size : int
         The step size in milliseconds for running pitch estimation.
     verbose : int
-        Set the keras verbosity mode: 1 (default) will print out a progress bar
-        during prediction, 0 will suppress all non-error printouts.
+        1 (default) prints the number of frames processed per second,
+        0 suppresses all non-error printouts.
+    model : tensorflow.keras.models.Model or None
+        An already loaded model to use instead of the one returned by
+        :func:`~crepe.core.build_and_load_model` for `model_capacity`.
+    batch_size : int
+        Number of frames built, normalized and predicted at a time. Besides
+        the audio and the activation matrix, memory use is bounded by the
+        batch size (about 4 KiB per frame) rather than by the audio length.
+    dtype : np.dtype
+        Data type of the returned activation matrix, e.g. ``np.float16``
+        to halve its size. Ignored if `out` is given.
+    out : np.ndarray [shape=(T, 360)] or None
+        Array (e.g. a :func:`numpy.lib.format.open_memmap` file) to write
+        the activations into instead of allocating a new one.
+    resampler : 'resampy', 'kaiser_fast' or 'polyphase'
+        How audio that is not at 16 kHz is resampled; see the docstring of
+        :func:`~crepe.core.resample_audio`.
 
     Returns
     -------
     activation : np.ndarray [shape=(T, 360)]
         The raw activation matrix
     """
-    model = build_and_load_model(model_capacity)
-
-    if len(audio.shape) == 2:
-        audio = audio.mean(1)  # make mono
-    audio = audio.astype(np.float32)
-    if sr != model_srate:
-        # resample audio if necessary
-        from resampy import resample
-        audio = resample(audio, sr, model_srate)
+    if model is None:
+        model = build_and_load_model(model_capacity)
 
-    # pad so that frames are centered around their timestamps (i.e. first frame
-    # is zero centered).
-    if center:
-        audio = np.pad(audio, 512, mode='constant', constant_values=0)
+    audio = prepare_audio(audio, sr, center, resampler)
 
     # make 1024-sample frames of the audio with hop length of 10 milliseconds
     hop_length = int(model_srate * step_size / 1000)
     n_frames = 1 + int((len(audio) - 1024) / hop_length)
-    frames = as_strided(audio, shape=(1024, n_frames),
-                        strides=(audio.itemsize, hop_length * audio.itemsize))
-    frames = frames.transpose().copy()
+    if out is None:
+        out = np.empty((n_frames, 360), dtype=dtype)
+    elif out.shape != (n_frames, 360):
+        raise ValueError("out should have shape {}".format((n_frames, 360)))
+
+    # run prediction batch by batch, straight into the output
+    start_time = time.perf_counter()
+    for start, frames in frame_batches(audio, hop_length, batch_size):
+        out[start:start + len(frames)] = model.predict(frames, verbose=0)
+    elapsed = time.perf_counter() - start_time
+    if verbose:
+        print("CREPE: {} frames in {:.1f} s ({:.0f} frames/s)".format(
+            n_frames, elapsed, n_frames / max(elapsed, 1e-9)))
+
+    return out
+
+
+def get_activations(audios, model_capacity='full', center=True, step_size=10,
+                    verbose=1, model=None, batch_size=2048, dtype=np.float32,
+                    resampler='resampy'):
+    """
+    Compute the activations of several signals, packing the frames of all
+    of them into shared batches.
+
+    Short signals have fewer frames than a batch; packing them together
+    runs the model once per `batch_size` frames rather than at least once
+    per signal. Every frame is normalized on its own, so the activations are
+    the same as with :func:`get_activation` for each signal.
+
+    Parameters
+    ----------
+    audios : list of (np.ndarray, int)
+        The audio samples and sample rate of each signal; see the docstring
+        of :func:`~crepe.core.get_activation`.
+    model_capacity, center, step_size, model, batch_size, dtype, resampler :
+        See the docstring of :func:`~crepe.core.get_activation`.
+    verbose : int
+        1 (default) prints the number of frames processed per second,
+        0 suppresses all non-error printouts.
+
+    Returns
+    -------
+    activations : list of np.ndarray [shape=(T_i, 360)]
+        The raw activation matrix of each signal.
+    """
+    if model is None:
+        model = build_and_load_model(model_capacity)
+
+    hop_length = int(model_srate * step_size / 1000)
+    audios = [prepare_audio(audio, sr, center, resampler)
+              for audio, sr in audios]
+    activations = [np.empty((1 + int((len(audio) - 1024) / hop_length), 360),
+                            dtype=dtype) for audio in audios]
+
+    batch = np.empty((batch_size, 1024), dtype=np.float32)
+    # (signal, first frame in the signal, first row in the batch, frames)
+    pending = []
+    filled = 0
+
+    def flush():
+        predictions = model.predict(batch[:filled], verbose=0)
+        for i, start, row, count in pending:
+            activations[i][start:start + count] = predictions[row:row + count]
+        del pending[:]
+
+    start_time = time.perf_counter()
+    for i, audio in enumerate(audios):
+        for start, frames in frame_batches(audio, hop_length, batch_size):
+            copied = 0
+            while copied < len(frames):
+                count = min(len(frames) - copied, batch_size - filled)
+                batch[filled:filled + count] = frames[copied:copied + count]
+                pending.append((i, start + copied, filled, count))
+                filled += count
+                copied += count
+                if filled == batch_size:
+                    flush()
+                    filled = 0
+    if filled:
+        flush()
+    elapsed = time.perf_counter() - start_time
+    if verbose:
+        n_frames = sum(len(activation) for activation in activations)
+        print("CREPE: {} frames of {} signals in {:.1f} s ({:.0f} frames/s)"
+              .format(n_frames, len(audios), elapsed,
+                      n_frames / max(elapsed, 1e-9)))
+
+    return activations
+
+
+def activation_to_pitch(activation, viterbi=False, step_size=10):
+    """
+    Decode an activation matrix into the time, frequency and confidence
+    returned by :func:`predict`.
+    """
+    confidence = activation.max(axis=1)
+
+    if viterbi:
+        cents = to_viterbi_cents(activation)
+    else:
+        cents = to_local_average_cents(activation)
+
+    frequency = 10 * 2 ** (cents / 1200)
+    frequency[np.isnan(frequency)] = 0
+
+    time = np.arange(confidence.shape[0]) * step_size / 1000.0
+
+    return time, frequency, confidence
+
 
-    # normalize each frame -- this is expected by the model
-    frames -= np.mean(frames, axis=1)[:, np.newaxis]
-    frames /= np.clip(np.std(frames, axis=1)[:, np.newaxis], 1e-8, None)
+def predict_batch(audios, model_capacity='full', viterbi=False, center=True,
+                  step_size=10, verbose=1, model=None, batch_size=2048,
+                  resampler='resampy'):
+    """
+    Perform pitch estimation on several signals at once, e.g. many short
+    clips, with the frames of all signals packed into shared batches (see
+    :func:`get_activations`).
+
+    Parameters
+    ----------
+    audios : list of (np.ndarray, int)
+        The audio samples and sample rate of each signal.
+    model_capacity, viterbi, center, step_size, verbose, model, batch_size,
+    resampler :
+        See the docstring of :func:`~crepe.core.predict`.
 
-    # run prediction and convert the frequency bin weights to Hz
-    return model.predict(frames, verbose=verbose)
+    Returns
+    -------
+    results : list of tuple
+        For each signal, the (time, frequency, confidence, activation)
+        returned by :func:`predict`.
+    """
+    activations = get_activations(audios, model_capacity=model_capacity,
+                                  center=center, step_size=step_size,
+                                  verbose=verbose, model=model,
+                                  batch_size=batch_size, resampler=resampler)
+    return [activation_to_pitch(activation, viterbi, step_size) +
+            (activation,) for activation in activations]
 
 
 def predict(audio, sr, model_capacity='full',
-            viterbi=False, center=True, step_size=10, verbose=1):
+            viterbi=False, center=True, step_size=10, verbose=1, model=None,
+            batch_size=2048, resampler='resampy'):
     """
     Perform pitch estimation on given audio
 
@@ -241,8 +619,17 @@ def predict(audio, sr, model_capacity='full',
     step_size : int
         The step size in milliseconds for running pitch estimation.
     verbose : int
-        Set the keras verbosity mode: 1 (default) will print out a progress bar
-        during prediction, 0 will suppress all non-error printouts.
+        1 (default) prints the number of frames processed per second,
+        0 suppresses all non-error printouts.
+    model : tensorflow.keras.models.Model or None
+        An already loaded model; see the docstring of
+        :func:`~crepe.core.get_activation`
+    batch_size : int
+        Number of frames predicted at a time; see the docstring of
+        :func:`~crepe.core.get_activation`
+    resampler : 'resampy', 'kaiser_fast' or 'polyphase'
+        How audio that is not at 16 kHz is resampled; see the docstring of
+        :func:`~crepe.core.resample_audio`
 
     Returns
     -------
@@ -259,25 +646,18 @@ def predict(audio, sr, model_capacity='full',
     """
     activation = get_activation(audio, sr, model_capacity=model_capacity,
                                 center=center, step_size=step_size,
-                                verbose=verbose)
-    confidence = activation.max(axis=1)
-
-    if viterbi:
-        cents = to_viterbi_cents(activation)
-    else:
-        cents = to_local_average_cents(activation)
-
-    frequency = 10 * 2 ** (cents / 1200)
-    frequency[np.isnan(frequency)] = 0
-
-    time = np.arange(confidence.shape[0]) * step_size / 1000.0
+                                verbose=verbose, model=model,
+                                batch_size=batch_size, resampler=resampler)
+    time, frequency, confidence = activation_to_pitch(activation, viterbi,
+                                                      step_size)
 
     return time, frequency, confidence, activation
 
 
 def process_file(file, output=None, model_capacity='full', viterbi=False,
                  center=True, save_activation=False, save_plot=False,
-                 plot_voicing=False, step_size=10, verbose=True):
+                 plot_voicing=False, step_size=10, verbose=True,
+                 f0_format='csv', resampler='resampy'):
     """
     Use the input model to perform pitch estimation on the input file.
 
@@ -310,6 +690,12 @@ def process_file(file, output=None, model_capacity='full', viterbi=False,
         The step size in milliseconds for running pitch estimation.
     verbose : bool
         Print status messages and keras progress (default=True).
+    f0_format : 'csv', 'npy' or 'both'
+        Save the estimated frequencies as CSV (default), as a binary .f0.npy
+        file (see :func:`save_f0_binary`) or both.
+    resampler : 'resampy', 'kaiser_fast' or 'polyphase'
+        How audio that is not at 16 kHz is resampled; see the docstring of
+        :func:`resample_audio`.
 
     Returns
     -------
@@ -327,16 +713,26 @@ def process_file(file, output=None, model_capacity='full', viterbi=False,
         viterbi=viterbi,
         center=center,
         step_size=step_size,
-        verbose=1 * verbose)
+        verbose=1 * verbose,
+        resampler=resampler)
 
     # write prediction as TSV
-    f0_file = output_path(file, ".f0.csv", output)
-    f0_data = np.vstack([time, frequency, confidence]).transpose()
-    np.savetxt(f0_file, f0_data, fmt=['%.3f', '%.3f', '%.6f'], delimiter=',',
-               header='time,frequency,confidence', comments='')
-    if verbose:
-        print("CREPE: Saved the estimated frequencies and confidence values "
-              "at {}".format(f0_file))
+    if f0_format in ('csv', 'both'):
+        f0_file = output_path(file, ".f0.csv", output)
+        f0_data = np.vstack([time, frequency, confidence]).transpose()
+        np.savetxt(f0_file, f0_data, fmt=['%.3f', '%.3f', '%.6f'],
+                   delimiter=',', header='time,frequency,confidence',
+                   comments='')
+        if verbose:
+            print("CREPE: Saved the estimated frequencies and confidence "
+                  "values at {}".format(f0_file))
+
+    if f0_format in ('npy', 'both'):
+        f0_file = output_path(file, ".f0.npy", output)
+        save_f0_binary(f0_file, time, frequency, confidence)
+        if verbose:
+            print("CREPE: Saved the estimated frequencies and confidence "
+                  "values at {}".format(f0_file))
 
     # save the salience file to a .npy file
     if save_activation:
@@ -4,16 +4,32 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 from utils import onsetCNN
+from model_registry import get_onset_cnn
+from analysis_cache import cache, model_identity
+from onset_features import HOP_LENGTH, SAMPLE_RATE, onset_spectrograms, shared_front_end
 
-def load_model(model_path, device):
-    model = onsetCNN().double().to(device)
+def load_model(model_path, device, dtype=torch.float32):
+    model = onsetCNN().to(device=device, dtype=dtype)
     model.load_state_dict(torch.load(model_path, map_location=device))
     model.eval()
     return model
 
 
-def preprocess_audio(audio_path, sr=44100, n_fft=1024, hop_length=441, n_mels=80, fmin=27.5, fmax=16000):
-    y, sr = librosa.load(audio_path, sr=sr)
+def preprocess_audio(audio_path, sr=44100, n_fft=1024, hop_length=441, n_mels=80, fmin=27.5, fmax=16000, audio=None):
+    """
+    The three mel spectrograms (n_fft, 2048 and 4096 points) in dB of the onsetCNN, computed by
+    the multi-resolution front-end shared with the madmom CNN (see onset_features) if madmom
+    provides it, with librosa otherwise.
+    """
+    if shared_front_end() and (sr, hop_length) == (SAMPLE_RATE, HOP_LENGTH):
+        return onset_spectrograms(audio_path, ('onset_cnn',), audio=audio, frame_sizes=(n_fft, 2048, 4096),
+                                  n_mels=n_mels, fmin=fmin, fmax=fmax)['onset_cnn']
+
+    if audio is None:
+        y, sr = librosa.load(audio_path, sr=sr)
+    else:
+        # shared decode (and resampling) of the file, see AudioContext
+        y = audio.mono(sr)
     mel_spectrogram1 = librosa.feature.melspectrogram(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length, n_mels=n_mels, fmin=fmin, fmax=fmax)
     mel_spectrogram2 = librosa.feature.melspectrogram(y=y, sr=sr, n_fft=2048, hop_length=hop_length, n_mels=n_mels, fmin=fmin, fmax=fmax)
     mel_spectrogram3 = librosa.feature.melspectrogram(y=y, sr=sr, n_fft=4096, hop_length=hop_length, n_mels=n_mels, fmin=fmin, fmax=fmax)
@@ -24,23 +40,52 @@ def preprocess_audio(audio_path, sr=44100, n_fft=1024, hop_length=441, n_mels=80
 
     return mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db
 
-def predict_onsets(model, mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db, device, hop_length=441, sr=44100):
+def context_windows(mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db, contextlen=7):
+    """
+    Return all the context windows of the three stacked mel spectrograms as a
+    strided view of shape (num_segments, 3, n_mels, 2 * contextlen + 1).
+    No data is copied until a batch is sliced out of the view.
+    """
+    segment_length = 2 * contextlen + 1
+    stacked = np.stack([mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db], axis=0)
+    if stacked.shape[2] < segment_length:
+        return np.empty((0, 3, stacked.shape[1], segment_length), dtype=stacked.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(stacked, segment_length, axis=2)
+    # (3, n_mels, num_segments, segment_length) -> (num_segments, 3, n_mels, segment_length)
+    return windows.transpose(2, 0, 1, 3)
+
+
+def predict_onset_activations(model, mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db, device, batch_size=512):
+    """
+    Run the onset CNN over every context window in mini-batches of `batch_size`.
+    The inputs are cast to the dtype of the model parameters (see `load_model`).
+
+    Every prediction is added to all the frames of its window, so the returned
+    activations have one value per spectrogram frame.
+    """
     contextlen = 7  # +- frames
-    duration = 2 * contextlen + 1
-    segment_length = duration  # As used during training
-    num_segments = mel_spectrogram1_db.shape[1] - segment_length + 1
+    segment_length = 2 * contextlen + 1  # As used during training
+    num_frames = mel_spectrogram1_db.shape[1]
+    windows = context_windows(mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db, contextlen)
+    num_segments = len(windows)
 
-    onsets = np.zeros(mel_spectrogram1_db.shape[1])
+    if num_segments == 0:
+        return np.zeros(num_frames)
 
+    dtype = next(model.parameters()).dtype
+    predictions = np.empty(num_segments)
     with torch.no_grad():
-        for i in range(num_segments):
-            segment1 = mel_spectrogram1_db[:, i:i+segment_length]
-            segment2 = mel_spectrogram2_db[:, i:i+segment_length]
-            segment3 = mel_spectrogram3_db[:, i:i+segment_length]
-            segment = np.stack([segment1, segment2, segment3], axis=0)
-            segment = torch.tensor(segment, dtype=torch.float64).unsqueeze(0).to(device)  # Add batch dimension
-            prediction = model(segment).squeeze().cpu().numpy()
-            onsets[i:i+segment_length] += prediction
+        for start in range(0, num_segments, batch_size):
+            batch = np.ascontiguousarray(windows[start:start + batch_size])
+            batch = torch.from_numpy(batch).to(device=device, dtype=dtype)
+            predictions[start:start + len(batch)] = model(batch).reshape(-1).cpu().numpy()
+
+    # frame j collects the predictions of the windows i with i <= j < i + segment_length
+    return np.convolve(predictions, np.ones(segment_length))
+
+
+def predict_onsets(model, mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db, device, hop_length=441, sr=44100, batch_size=512):
+    onsets = predict_onset_activations(model, mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db, device, batch_size=batch_size)
     onsets = onsets * 10
 
     onsets = np.where(onsets > 0.02, 1, 0)
@@ -72,12 +117,21 @@ def plot_onsets(onsets, audio_path, sr=44100, hop_length=441):
     plt.tight_layout()
     plt.show()
 
-def detect_onsets_linda(audio_path, model_path, save_analysis_files):
+def detect_onsets_linda(audio_path, model_path, save_analysis_files, batch_size=512, dtype=torch.float32, audio=None):
     print("Prédictions with my cnn")
     device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-    model = load_model(model_path, device)
-    mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db = preprocess_audio(audio_path)
-    onsets = predict_onsets(model, mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db, device)
+
+    def compute():
+        model = get_onset_cnn(model_path, device, dtype=dtype)
+        mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db = preprocess_audio(audio_path, audio=audio)
+        return {'onsets': predict_onsets(model, mel_spectrogram1_db, mel_spectrogram2_db, mel_spectrogram3_db, device, batch_size=batch_size)}
+
+    params = {'dtype': str(dtype)}
+    if shared_front_end():
+        # the shared front-end weights the frames with a symmetric Hann window, see onset_features
+        params['features'] = 'shared-stft'
+    onsets = cache.get('onsets_cnn', audio_path, compute, params=params,
+                       model=model_identity(model_path, name='onsetCNN'))['onsets']
     
     if save_analysis_files:
         audio_dir = os.path.dirname(audio_path)
@@ -0,0 +1,234 @@
+"""Content-addressed cache of analysis results (f0, onsets, amplitude envelope).
+
+Entries are keyed by a hash of the audio content, the analysis parameters and
+the identity of the model that produced them, so a changed file, parameter or
+model never returns a stale result. The cache lives in its own directory
+(not next to the audio, which may be read-only), stores NumPy arrays as
+uncompressed .npz files and evicts the least recently used entries once its
+size exceeds a bound.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zipfile
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.environ.get('CREPE_NOTES_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'crepe_notes'))
+DEFAULT_MAX_SIZE = 2 * 2 ** 30
+
+_digests = {}
+
+
+def file_digest(path, chunk_size=2 ** 20):
+    """
+    SHA-256 of the content of a file.
+
+    The digest is memoized per process on the path, size and modification time
+    of the file, so each file is read at most once per run.
+    """
+    path = os.path.abspath(str(path))
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        _digests[memo_key] = digest.hexdigest()
+    return _digests[memo_key]
+
+
+class AnalysisCache(object):
+    """
+    Cache of analysis results stored as .npz files under `directory`.
+
+    Args:
+        directory (str): Cache directory, created on first write.
+        max_size (int): Size in bytes above which the least recently used entries are removed.
+        enabled (bool): If False, `load` always misses and `save` does nothing.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE, enabled=True):
+        self.directory = str(directory)
+        self.max_size = max_size
+        self.enabled = enabled
+        self._size = None
+        self._stats = {}
+        self._lock = threading.RLock()
+
+    def key(self, kind, audio_path, params=None, model=None):
+        """Hex key of an analysis of kind `kind` of `audio_path` with `params` by `model`."""
+        description = json.dumps({'kind': kind, 'audio': file_digest(audio_path), 'params': params or {},
+                                  'model': model}, sort_keys=True, default=str)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def _path(self, kind, key):
+        return os.path.join(self.directory, kind, key + '.npz')
+
+    def _count(self, kind, event, num_bytes=0):
+        stats = self._stats.setdefault(kind, {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0,
+                                              'bytes_read': 0, 'bytes_written': 0})
+        stats[event] += 1
+        if event == 'hits':
+            stats['bytes_read'] += num_bytes
+        elif event == 'stores':
+            stats['bytes_written'] += num_bytes
+
+    def load(self, kind, audio_path, params=None, model=None):
+        """
+        Returns:
+            dict of numpy arrays: The cached entry, None if there is none.
+        """
+        if not self.enabled:
+            return None
+        path = self._path(kind, self.key(kind, audio_path, params, model))
+        with self._lock:
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    arrays = {name: data[name] for name in data.files}
+                # the modification time orders the entries for eviction
+                os.utime(path)
+            except FileNotFoundError:
+                self._count(kind, 'misses')
+                return None
+            except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+                # truncated or corrupt entry: drop it so that it is computed again
+                self._remove(path)
+                self._count(kind, 'misses')
+                return None
+            self._count(kind, 'hits', os.path.getsize(path))
+            return arrays
+
+    def save(self, kind, audio_path, arrays, params=None, model=None):
+        """Store the dict of arrays `arrays` and evict old entries if the cache is full."""
+        if not self.enabled:
+            return
+        path = self._path(kind, self.key(kind, audio_path, params, model))
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # write to a temporary file first so that concurrent workers never read a partial entry;
+                # it is not named .npz, so that it is neither read nor evicted by another worker
+                fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+            except OSError as e:
+                print(f"Cache d'analyse désactivé, impossible d'écrire dans {self.directory} : {e}")
+                self.enabled = False
+                return
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp_path, path)
+            except OSError:
+                # the entry is not stored, it will be computed again next time
+                return
+            finally:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            num_bytes = os.path.getsize(path)
+            self._count(kind, 'stores', num_bytes)
+            if self._size is not None:
+                self._size += num_bytes
+            if self._size is None or self._size > self.max_size:
+                self.evict()
+
+    def get(self, kind, audio_path, compute, params=None, model=None):
+        """
+        Return the cached entry, or call `compute()` (which returns a dict of arrays),
+        store its result and return it.
+        """
+        arrays = self.load(kind, audio_path, params, model)
+        if arrays is None:
+            arrays = compute()
+            self.save(kind, audio_path, arrays, params, model)
+        return arrays
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.npz'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _remove(self, path):
+        try:
+            num_bytes = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        if self._size is not None:
+            self._size -= num_bytes
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in `max_size`."""
+        with self._lock:
+            entries = sorted(self._entries())
+            self._size = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if self._size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._size -= size
+                self._count(os.path.basename(os.path.dirname(path)), 'evictions')
+
+    def size(self):
+        """Total size of the cache entries in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+
+    def stats(self):
+        """
+        Returns:
+            dict: Per kind of analysis, the number of hits, misses, stores and evictions
+            and the number of bytes read from and written to the cache.
+        """
+        with self._lock:
+            return {kind: dict(stats) for kind, stats in self._stats.items()}
+
+    def print_stats(self):
+        print(f"Cache d'analyse {self.directory} ({self.size() / 2 ** 20:.1f} MiB)")
+        for kind, s in self.stats().items():
+            print(f"{kind}: {s['hits']} hits, {s['misses']} misses, {s['stores']} stores, {s['evictions']} evictions, "
+                  f"{s['bytes_read'] / 2 ** 20:.1f} MiB read, {s['bytes_written'] / 2 ** 20:.1f} MiB written")
+
+
+cache = AnalysisCache()
+
+
+def configure(directory=None, max_size=None, enabled=True):
+    """Change the directory, size bound or state of the process-wide cache."""
+    if directory is not None:
+        cache.directory = str(directory)
+        cache._size = None
+    if max_size is not None:
+        cache.max_size = max_size
+    cache.enabled = enabled
+    return cache
+
+
+def model_identity(*paths, name=None):
+    """Identify a model by the content of its weight files (and optionally a name)."""
+    digests = [file_digest(p)[:16] for p in paths if p is not None and os.path.exists(str(p))]
+    return '-'.join(([name] if name else []) + digests)
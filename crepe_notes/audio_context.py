@@ -0,0 +1,166 @@
+"""Decode an audio file once and serve it to every stage of the analysis.
+
+CREPE, the amplitude envelope, the madmom onset detector and the onsetCNN
+each used to read the file on their own, at their own sample rate and
+channel layout. An `AudioContext` reads the file at most once (PCM and float
+WAV files are memory-mapped, so the samples are not copied), and derives the
+mono float32 versions and resamplings the stages ask for lazily, computing
+each of them only once.
+"""
+import numpy as np
+from scipy.io import wavfile
+
+
+def to_float32(samples):
+    """Scale integer samples to [-1, 1) as float32, as soundfile and librosa do."""
+    if samples.dtype.kind == 'f':
+        return samples.astype(np.float32, copy=False)
+    if samples.dtype == np.uint8:
+        return (samples.astype(np.float32) - 128) / 128
+    return samples.astype(np.float32) / np.float32(2 ** (8 * samples.dtype.itemsize - 1))
+
+
+class AudioContext(object):
+    """
+    The samples of one audio file, decoded on first use and shared between the analysis stages.
+
+    Args:
+        audio_path (Path): Audio file.
+        mmap (bool): Memory-map WAV files instead of reading them into memory.
+
+    Can be used as a context manager, the mapping and the derived signals are
+    released on exit.
+    """
+
+    def __init__(self, audio_path, mmap=True):
+        self.audio_path = audio_path
+        self.mmap = mmap
+        self._samples = None
+        self._sample_rate = None
+        self._mono = {}
+        self._features = {}
+        self._stats = {'decodes': 0, 'bytes_decoded': 0, 'memory_mapped': False, 'derived': {}}
+
+    def _decode(self):
+        try:
+            try:
+                sr, samples = wavfile.read(str(self.audio_path), mmap=self.mmap)
+                self._stats['memory_mapped'] = self.mmap
+            except ValueError:
+                # e.g. 24-bit PCM, which cannot be memory-mapped
+                sr, samples = wavfile.read(str(self.audio_path))
+        except ValueError:
+            # not a WAV file, decode it with librosa (soundfile or audioread)
+            from librosa import load
+            samples, sr = load(str(self.audio_path), sr=None, mono=False)
+            samples = samples.T
+        self._samples, self._sample_rate = samples, sr
+        self._stats['decodes'] += 1
+        self._stats['bytes_decoded'] += samples.nbytes
+
+    @property
+    def samples(self):
+        """Samples of the file as stored (channels as columns), memory-mapped if possible."""
+        if self._samples is None:
+            self._decode()
+        return self._samples
+
+    @property
+    def sample_rate(self):
+        if self._sample_rate is None:
+            self._decode()
+        return self._sample_rate
+
+    @property
+    def num_channels(self):
+        return 1 if self.samples.ndim == 1 else self.samples.shape[1]
+
+    def mono(self, sample_rate=None, res_type='soxr_hq'):
+        """
+        Mono float32 signal, as returned by `librosa.load(audio_path, sr=sample_rate)`.
+
+        Args:
+            sample_rate (int): Sample rate, the sample rate of the file if None.
+            res_type (str): Resampling method, see `librosa.resample`.
+
+        Returns:
+            numpy array: The samples, computed on the first call and shared afterwards.
+        """
+        sample_rate = sample_rate or self.sample_rate
+        key = (sample_rate, res_type if sample_rate != self.sample_rate else None)
+        if key not in self._mono:
+            if sample_rate == self.sample_rate:
+                y = to_float32(self.samples)
+                if y.ndim == 2:
+                    y = y.mean(axis=1)
+            else:
+                from librosa import resample
+                y = resample(self.mono(), orig_sr=self.sample_rate, target_sr=sample_rate,
+                             res_type=res_type).astype(np.float32, copy=False)
+            self._mono[key] = y
+            self._stats['derived'][f"mono@{sample_rate}"] = y.nbytes
+        return self._mono[key]
+
+    def signal(self, sample_rate=44100, num_channels=1):
+        """
+        The audio as a madmom `Signal` with `sample_rate` and `num_channels`.
+
+        At the sample rate of the file, the signal wraps the stored samples
+        (down-mixed by madmom the same way as when it reads the file itself).
+        Otherwise it wraps the mono float32 resampling of `mono`, so that the
+        onset detectors share it.
+        """
+        from madmom.audio.signal import Signal
+
+        if sample_rate == self.sample_rate:
+            return Signal(self.samples, sample_rate=sample_rate, num_channels=num_channels)
+        return Signal(self.mono(sample_rate), sample_rate=sample_rate, num_channels=num_channels)
+
+    def feature(self, name):
+        """
+        A feature of the audio shared with `add_feature`, e.g. spectrograms used by several stages.
+
+        Returns:
+            The feature, None if it was not added.
+        """
+        return self._features.get(name)
+
+    def add_feature(self, name, value):
+        """
+        Share a feature computed from the audio with the other stages.
+
+        Args:
+            name (str): Name of the feature, including its parameters.
+            value (numpy array or list of arrays): The feature.
+        """
+        self._features[name] = value
+        arrays = value if isinstance(value, (list, tuple)) else [value]
+        self._stats['derived'][name] = sum(np.asarray(a).nbytes for a in arrays)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of decodes of the file (0 or 1), bytes decoded, whether the
+            samples are memory-mapped and the size in bytes of each derived signal.
+        """
+        return dict(self._stats, derived=dict(self._stats['derived']))
+
+    def print_stats(self):
+        s = self.stats()
+        derived = ', '.join(f"{name} {size / 2 ** 20:.1f} MiB" for name, size in s['derived'].items())
+        print(f"{self.audio_path} : {s['decodes']} décodage(s), {s['bytes_decoded'] / 2 ** 20:.1f} MiB"
+              f"{' (mmap)' if s['memory_mapped'] else ''}{', dérivés : ' + derived if derived else ''}")
+
+    def close(self):
+        self._samples = None
+        self._mono.clear()
+        self._features.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"AudioContext({self.audio_path})"
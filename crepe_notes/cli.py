@@ -3,14 +3,20 @@ import pathlib
 import click
 from pathlib import Path
 import pretty_midi as pm
-from crepe_notes import process, parse_f0, run_crepe
+from crepe_notes import process, parse_f0, run_crepe, run_crepe_batch, analyse_blocks, find_f0_file
+from audio_context import AudioContext
 from tqdm import tqdm 
+from model_registry import registry, warm_up
+from note_table import NoteTable
+import analysis_cache
 import warnings
 warnings.filterwarnings("ignore")  
 
 
+import multiprocessing
 import os
 import sys
+import traceback
 
 stderr = sys.stderr
 sys.stderr = open(os.devnull, 'w')
@@ -27,22 +33,36 @@ sys.stderr = stderr
 @click.option('--min-duration', type=click.FloatRange(0, 1), default=0.03, help='Minimum duration of a note in seconds')
 @click.option('--min-velocity', type=click.IntRange(0, 127, clamp=True), default=6, help='Minimum velocity of a note in midi scale (0-127)')
 @click.option('--disable-splitting', is_flag=True, default=False, help='Disable detection of repeated notes via onset detection')
+@click.option('--onset-threshold', type=click.FloatRange(0, 1), default=0.6, help='Minimum activation of the madmom onsets used to split repeated notes')
 @click.option('--tuning-offset', type=click.FloatRange(-100, 100, clamp=True), default=False, help='Manually apply a tuning offset in cents. Fractional numbers are allowed. Set to 0 for no offset, otherwise it will be calculated automatically.')
 @click.option('--use-smoothing', is_flag=True, default=False, help='Enable smoothing of confidence')
 @click.option('--use-cwd', is_flag=True, default=False, help='If True, write to the cwd of the current command, else write to the parent folder of the f0_path')
-@click.option('--f0', type=click.Path(exists=True))
-@click.option('--save-analysis-files', is_flag=True, default=False, help='Save f0, madmom onsets and amp envelope as files')
+@click.option('--f0', type=click.Path(exists=True), help='Precomputed pitch track, binary .f0.npy (fastest) or CSV')
+@click.option('--save-analysis-files', is_flag=True, default=False, help='Export f0 (CSV) and onsetCNN onsets as files next to the audio')
 @click.option('--not-combined-file', is_flag=True, default=True, help='Save the prediction into one file combined')
 @click.option('--post-process', is_flag=True, default=False, help='Save the prediction into one file combined')
 
 @click.option('--my-cnn', is_flag=True, default=False, help='Use author CNN than Madmom')
 @click.option('--model-path', default=None, help='Directory of the model CNN for onset detection')
+@click.option('--block-duration', type=click.IntRange(1, None), default=None, help='Analyse long recordings in blocks of this many seconds to bound memory use (default: whole file)')
+@click.option('--block-overlap', type=click.IntRange(0, None), default=2, help='Seconds of context shared by adjacent blocks; results may differ from a whole-file run within this margin of a block boundary')
+@click.option('--resampler', type=click.Choice(['resampy', 'kaiser_fast', 'polyphase']), default='resampy', help='How audio is resampled to 16 kHz for CREPE: resampy (best quality), kaiser_fast or polyphase (fastest)')
+@click.option('--batch-crepe', is_flag=True, default=False, help='When audio_path is a directory, run CREPE on all the files first, packing the frames of many files into shared model calls (much faster for short files); results go through the analysis cache')
+@click.option('--jobs', '-j', type=click.IntRange(1, None), default=1, help='Number of worker processes used when audio_path is a directory')
+@click.option('--cache-dir', default=analysis_cache.DEFAULT_CACHE_DIR, show_default=True, help='Directory of the analysis cache (f0, onsets and amplitude envelopes, keyed by audio content, parameters and model)')
+@click.option('--cache-size', type=click.IntRange(0, None), default=analysis_cache.DEFAULT_MAX_SIZE // 2 ** 20, show_default=True, help='Size of the analysis cache in MiB, least recently used entries are evicted beyond it')
+@click.option('--no-cache', is_flag=True, default=False, help='Do not read or write the analysis cache')
+@click.option('--cache-stats', is_flag=True, default=False, help='Print hits, misses and evictions of the analysis cache at the end of the run')
+@click.option('--audio-stats', is_flag=True, default=False, help='Print how many bytes of audio were decoded (and derived by resampling) for each file')
+@click.option('--model-stats', is_flag=True, default=False, help='Print load time and resident memory of each model at the end of the run')
 @click.argument('audio_path', type=click.Path(exists=True, path_type=pathlib.Path))
 @click.help_option()
 
-def main(f0, audio_path,model_path, output_label, save_dir, not_combined_file, midi_tempo, sensitivity, min_duration, min_velocity, disable_splitting, tuning_offset, use_smoothing, use_cwd, save_analysis_files, post_process,my_cnn):
+def main(f0, audio_path,model_path, output_label, save_dir, not_combined_file, midi_tempo, sensitivity, min_duration, min_velocity, disable_splitting, onset_threshold, tuning_offset, use_smoothing, use_cwd, save_analysis_files, post_process,my_cnn, block_duration, block_overlap, resampler, batch_crepe, jobs, cache_dir, cache_size, no_cache, cache_stats, audio_stats, model_stats):
     if post_process:
       print("POST PROCESS ON")
+    cache_config = (cache_dir, cache_size * 2 ** 20, not no_cache)
+    analysis_cache.configure(*cache_config)
     # Définir le répertoire de sauvegarde par défaut
     if save_dir is None:
         folder_name = "Prédictions_post_proc" if post_process else "Prédictions"
@@ -52,73 +72,159 @@ def main(f0, audio_path,model_path, output_label, save_dir, not_combined_file, m
     save_dir.mkdir(parents=True, exist_ok=True)
     
     if audio_path.is_dir():
-        audio_files = list(audio_path.glob('*.wav'))
+        audio_files = sorted(audio_path.glob('*.wav'))
 
         # Vérifier si le dossier est vide
         if not audio_files:
             print(f"Erreur : Aucun fichier audio trouvé dans le dossier {audio_path}")
             return  # Arrêter l'exécution du programme
 
-        output_midi = pm.PrettyMIDI(initial_tempo=midi_tempo)
-        instrument = pm.Instrument(program=pm.instrument_name_to_program('Acoustic Grand Piano'))
+        process_kwargs = dict(f0=f0, model_path=model_path, output_label=output_label, sensitivity=sensitivity, min_duration=min_duration,
+                              min_velocity=min_velocity, disable_splitting=disable_splitting, tuning_offset=tuning_offset, use_smoothing=use_smoothing,
+                              use_cwd=use_cwd, save_analysis_files=save_analysis_files, my_cnn=my_cnn,
+                              block_duration=block_duration, block_overlap=block_overlap, resampler=resampler,
+                              audio_stats=audio_stats, onset_threshold=onset_threshold)
+        warm_crepe = True
+        if batch_crepe and f0 is None and not block_duration:
+            if no_cache:
+                raise click.UsageError('--batch-crepe stores the pitch tracks in the analysis cache and cannot be used with --no-cache')
+            pending = [audio for audio in audio_files if find_f0_file(audio) is None]
+            print(f"CREPE sur {len(pending)} fichiers")
+            run_crepe_batch(pending, resampler=resampler)
+            # the workers only read the pitch tracks from the cache
+            warm_crepe = False
+        results = process_files(audio_files, process_kwargs, post_process, jobs=jobs, cache_config=cache_config,
+                                warm_crepe=warm_crepe)
 
-        # Liste des fichiers .wav à traiter
-        audio_files = list(audio_path.glob('*.wav'))
         if not_combined_file:
             print("Combined MIDI")
+            output_midi = pm.PrettyMIDI(initial_tempo=midi_tempo)
+            instrument = pm.Instrument(program=pm.instrument_name_to_program('Acoustic Grand Piano'))
             all_notes = []
-            with tqdm(total=len(audio_files), desc="Processing files", unit="file", bar_format='{l_bar}{bar} {percentage:3.0f}%') as pbar:
-                
-                for audio in audio_files:
-                    audio = Path(audio)
-                    notes, filtered_amp_envelope = process_audio(audio, f0, model_path,output_label, sensitivity, min_duration, min_velocity, disable_splitting, tuning_offset, use_smoothing, use_cwd, save_analysis_files,my_cnn)
-                    
-                    if post_process:
-                        notes = post_process_notes(notes)
-                    
-                    all_notes.extend(notes)
-                    pbar.update(1)  # Mise à jour de la barre de progression après chaque fichier
+            filtered_amp_envelope = None
+            for audio, notes, filtered_amp_envelope in results:
+                all_notes.append(notes)
+            all_notes = NoteTable.concat(all_notes)
 
+            if filtered_amp_envelope is None:
+                print("Erreur : aucun fichier audio n'a pu être traité")
+                return
             transcribe_audio(all_notes, filtered_amp_envelope, output_midi, instrument, save_dir, "Combined_" + output_label, audio_path, direction=True)
         else:
             print("Not combined MIDI")
-            with tqdm(total=len(audio_files), desc="Processing files", unit="file", bar_format='{l_bar}{bar} {percentage:3.0f}%') as pbar:
-                for audio in audio_files:
-                    output_midi = pm.PrettyMIDI(initial_tempo=midi_tempo)
-                    instrument = pm.Instrument(program=pm.instrument_name_to_program('Acoustic Grand Piano'))
-                    audio = Path(audio)
-                    notes, filtered_amp_envelope = process_audio(audio, f0, model_path, output_label, sensitivity, min_duration, min_velocity, disable_splitting, tuning_offset, use_smoothing, use_cwd, save_analysis_files,my_cnn)
-                    
-                    if post_process:
-                        notes = post_process_notes(notes)
-                    
-                    transcribe_audio(notes, filtered_amp_envelope, output_midi, instrument, save_dir, output_label, audio)
-                    pbar.update(1)  # Mise à jour de la barre de progression après chaque fichier
+            for audio, notes, filtered_amp_envelope in results:
+                output_midi = pm.PrettyMIDI(initial_tempo=midi_tempo)
+                instrument = pm.Instrument(program=pm.instrument_name_to_program('Acoustic Grand Piano'))
+                transcribe_audio(notes, filtered_amp_envelope, output_midi, instrument, save_dir, output_label, audio)
     else:
         print("single file")
         output_midi = pm.PrettyMIDI(initial_tempo=midi_tempo)
         instrument = pm.Instrument(program=pm.instrument_name_to_program('Acoustic Grand Piano'))
         audio_path = Path(audio_path)
-        notes, filtered_amp_envelope = process_audio(audio_path, f0, model_path, output_label, sensitivity, min_duration, min_velocity, disable_splitting, tuning_offset, use_smoothing, use_cwd, save_analysis_files,my_cnn)
+        notes, filtered_amp_envelope = process_audio(audio_path, f0, model_path, output_label, sensitivity, min_duration, min_velocity, disable_splitting, tuning_offset, use_smoothing, use_cwd, save_analysis_files,my_cnn, block_duration, block_overlap, resampler, audio_stats, onset_threshold)
         
         if post_process:
             notes = post_process_notes(notes)
         
         transcribe_audio(notes, filtered_amp_envelope, output_midi, instrument, save_dir, output_label, audio_path) 
 
-def process_audio(audio_path, f0, model_path, output_label, sensitivity, min_duration, min_velocity, disable_splitting, tuning_offset, use_smoothing, use_cwd, save_analysis_files,my_cnn):
+    if model_stats:
+        registry.print_stats()
+    if cache_stats:
+        analysis_cache.cache.print_stats()
+
+
+def _init_worker(warm_crepe, model_path, disable_splitting, my_cnn, cache_config=None):
+    if cache_config is not None:
+        analysis_cache.configure(*cache_config)
+    # load the models once per worker rather than once per file
+    warm_up(crepe_capacity='full' if warm_crepe else None,
+            madmom=not (disable_splitting or my_cnn),
+            onset_cnn_path=model_path if (my_cnn and not disable_splitting) else None)
+
+
+def _process_file(job):
+    audio, process_kwargs, post_process = job
+    try:
+        notes, filtered_amp_envelope = process_audio(audio, **process_kwargs)
+        if post_process:
+            notes = post_process_notes(notes)
+        return notes, filtered_amp_envelope, None
+    except Exception:
+        return None, None, traceback.format_exc()
+
+
+def process_files(audio_files, process_kwargs, post_process, jobs=1, cache_config=None, warm_crepe=True):
+    """
+    Run `process_audio` on every file, spread over `jobs` worker processes.
+
+    Args:
+        audio_files (list of Path): Audio files to process.
+        process_kwargs (dict): Keyword arguments passed to `process_audio`.
+        post_process (bool): Apply `post_process_notes` to the notes of each file.
+        jobs (int): Number of worker processes, 1 processes the files in this process.
+        cache_config (tuple): (directory, max_size, enabled) of the analysis cache in the workers.
+        warm_crepe (bool): Load CREPE in each worker up front (unless an f0 file is given).
+
+    Yields:
+        tuple: (audio_path, notes, filtered_amp_envelope) in the order of `audio_files`,
+        whatever order the workers finish in. Files that fail are reported and skipped.
+    """
+    job_list = [(Path(audio), process_kwargs, post_process) for audio in audio_files]
+
+    with tqdm(total=len(job_list), desc="Processing files", unit="file", bar_format='{l_bar}{bar} {percentage:3.0f}%') as pbar:
+        if jobs > 1:
+            # spawn rather than fork, tensorflow and torch are not fork-safe
+            pool = multiprocessing.get_context('spawn').Pool(
+                jobs, initializer=_init_worker,
+                initargs=(warm_crepe and process_kwargs['f0'] is None,)
+                + tuple(process_kwargs[k] for k in ('model_path', 'disable_splitting', 'my_cnn')) + (cache_config,))
+            results = pool.imap(_process_file, job_list)
+        else:
+            pool = None
+            results = map(_process_file, job_list)
+
+        try:
+            for (audio, _, _), (notes, filtered_amp_envelope, error) in zip(job_list, results):
+                pbar.update(1)  # Mise à jour de la barre de progression après chaque fichier
+                if error is not None:
+                    print(f"Erreur lors du traitement de {audio} :\n{error}")
+                    continue
+                yield audio, notes, filtered_amp_envelope
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+
+def process_audio(audio_path, f0, model_path, output_label, sensitivity, min_duration, min_velocity, disable_splitting, tuning_offset, use_smoothing, use_cwd, save_analysis_files,my_cnn, block_duration=None, block_overlap=2, resampler='resampy', audio_stats=False, onset_threshold=0.6):
    
-    default_f0_path = audio_path.parent / "F0" / audio_path.with_suffix(".f0.csv").name
-    if not default_f0_path.exists() and f0 is None:
-        frequency, confidence = run_crepe(audio_path)
-    elif f0 is None:
-        frequency, confidence = parse_f0(default_f0_path)
+    default_f0_path = find_f0_file(audio_path)
+    run_pitch = default_f0_path is None and f0 is None
+    analysis = {}
+    audio = None
+    if block_duration:
+        if my_cnn and not disable_splitting:
+            raise click.UsageError('--block-duration only supports the madmom onset detector, not --my-cnn')
+        sr, frequency, confidence, filtered_amp_envelope, onset_activations = analyse_blocks(
+            audio_path, block_duration, block_overlap, pitch=run_pitch, onsets=not disable_splitting, resampler=resampler)
+        analysis = dict(sr=sr, filtered_amp_envelope=filtered_amp_envelope, onset_activations=onset_activations)
     else:
-        frequency, confidence = parse_f0(f0)
+        # all the stages share a single decode of the file, done only if one of them misses the analysis cache
+        audio = AudioContext(audio_path)
+        analysis = dict(audio=audio)
+        if run_pitch:
+            frequency, confidence = run_crepe(audio_path, resampler=resampler, audio=audio)
+    if not run_pitch:
+        frequency, confidence = parse_f0(default_f0_path if f0 is None else f0)
 
     notes, filtered_amp_envelope = process(frequency, confidence, audio_path,model_path, sensitivity=sensitivity, use_smoothing=use_smoothing,
             min_duration=min_duration, min_velocity=min_velocity, disable_splitting=disable_splitting, use_cwd=use_cwd,
-            tuning_offset=tuning_offset, save_analysis_files=save_analysis_files,my_cnn=my_cnn)
+            tuning_offset=tuning_offset, save_analysis_files=save_analysis_files,my_cnn=my_cnn, onset_threshold=onset_threshold, **analysis)
+    if audio is not None:
+        if audio_stats:
+            audio.print_stats()
+        audio.close()
     return notes, filtered_amp_envelope
 
 def transcribe_audio(notes, filtered_amp_envelope, output_midi, instrument, save_dir, output_label,audio_path, direction=False):
@@ -157,42 +263,29 @@ def post_process_notes(notes, duration_threshold=0.05, velocity_threshold_min=20
     Applique un post-traitement aux notes pour supprimer les faux positifs potentiels.
 
     Args:
-        notes (list of dict): Liste des notes détectées.
+        notes (NoteTable or list of dict): Notes détectées.
         duration_threshold (float): Seuil minimum pour la durée des notes à conserver (en secondes).
         velocity_threshold (int): Seuil minimum pour la vélocité des notes à conserver.
         pitch_ranges_to_ignore (list of tuple): Liste de tuples définissant les plages de pitch à ignorer [(min_pitch, max_pitch)].
 
     Returns:
-        list of dict: Liste des notes après post-traitement.
+        NoteTable: Notes après post-traitement.
     """
-    processed_notes = []
+    notes = NoteTable.from_dicts(notes)
 
-    for note in notes:
-        # Calculer la durée de la note
-        note_duration = note['finish'] - note['start']
-        
-        # Appliquer les règles de filtrage
-        if note_duration < duration_threshold:
-            continue  # Ignorer les notes trop courtes
-        
-        if note['velocity'] < velocity_threshold_min:
-            continue  # Ignorer les notes avec vélocité trop faible
-        if note['velocity'] > velocity_threshold_max:
-            continue  # Ignorer les notes avec vélocité trop faible
-        
-        if pitch_ranges_to_ignore:
-            ignore_note = False
-            for pitch_range in pitch_ranges_to_ignore:
-                if pitch_range[0] <= note['pitch'] <= pitch_range[1]:
-                    ignore_note = True
-                    break
-            if ignore_note:
-                continue  # Ignorer les notes dont le pitch est dans une plage à ignorer
-
-        # Si la note passe tous les filtres, on la garde
-        processed_notes.append(note)
-    
-    return processed_notes
+    # Calculer la durée des notes
+    note_duration = notes['finish'] - notes['start']
+
+    # Appliquer les règles de filtrage
+    keep = ~(note_duration < duration_threshold)  # Ignorer les notes trop courtes
+    keep &= notes['velocity'] >= velocity_threshold_min  # Ignorer les notes avec vélocité trop faible
+    keep &= notes['velocity'] <= velocity_threshold_max  # Ignorer les notes avec vélocité trop forte
+
+    # Ignorer les notes dont le pitch est dans une plage à ignorer
+    for pitch_range in pitch_ranges_to_ignore or []:
+        keep &= ~((pitch_range[0] <= notes['pitch']) & (notes['pitch'] <= pitch_range[1]))
+
+    return notes.filter(keep)
 if __name__ == "__main__":
  
     main()  # pragma: no cover
@@ -1,39 +1,45 @@
 """Main module."""
-from librosa import load, pitch_tuning, hz_to_midi, time_to_samples
-from scipy.signal import find_peaks, hilbert, peak_widths, butter, filtfilt
+from librosa import pitch_tuning, hz_to_midi
+from scipy.signal import find_peaks, peak_widths
 import numpy as np
 import crepe
-from scipy.io import wavfile
 from pathlib import Path
 from fonctions import *
 from New_cnn import *
+from model_registry import get_crepe_model, get_madmom_onset_processor, crepe_model_id, madmom_onset_model_id
+from analysis_cache import cache
+from note_table import NoteTable
+from audio_context import AudioContext
+from envelope import amplitude_envelope
+from onset_features import onset_spectrograms, shared_front_end
 import warnings
 warnings.filterwarnings("ignore")  
 import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
-def detect_onsets(audio_path,save_analysis_files, Display=False):
-  
-    audio_dir = audio_path.parent
-    
-    onsets_path = os.path.join(audio_dir, audio_path.stem + '.onsets.npz')
-    
-    if not os.path.exists(onsets_path):
-        print(f"Fichier des onsets non trouvé à {onsets_path}")
+def detect_onset_activations(audio_path, audio=None):
+    """Onset activations of the madmom CNN (100 frames per second), through the analysis cache."""
+
+    def compute():
+        print(f"Onsets de {audio_path} absents du cache d'analyse")
         print("Lancement de la détection des onsets...")
-        
-        from madmom.features import CNNOnsetProcessor
-        
-        onset_activations = CNNOnsetProcessor()(str(audio_path))
-        if save_analysis_files:
-            np.savez(onsets_path, activations=onset_activations)
-            print(f"Onsets sauvegardés dans {onsets_path}")
-    else:
-        print(f"Chargement des onsets depuis {onsets_path}")
-        onset_activations = np.load(onsets_path, allow_pickle=True)['activations']
+        processor = get_madmom_onset_processor()
+        if not shared_front_end():
+            # the CNN works on mono 44.1 kHz audio, madmom would read the file again without the context
+            signal = str(audio_path) if audio is None else audio.signal(44100, num_channels=1)
+            return {'activations': processor(signal)}
+        # spectrograms of the multi-resolution front-end, shared with the onsetCNN through the context
+        spectrograms = onset_spectrograms(audio_path, ('madmom',), audio=audio)['madmom']
+        return {'activations': processor.process_spectrograms(spectrograms)}
 
-    onsets = np.zeros_like(onset_activations)
-    onsets[find_peaks(onset_activations, distance=4, height=0.6)[0]] = 1
+    return cache.get('onsets_madmom', audio_path, compute, model=madmom_onset_model_id())['activations']
+
+
+def detect_onsets(audio_path, Display=False, audio=None, threshold=0.6):
+
+    onset_activations = detect_onset_activations(audio_path, audio)
+
+    onsets = pick_onsets(onset_activations, threshold)
     
     if Display:
         # Afficher les activations des onsets
@@ -47,12 +53,62 @@ def detect_onsets(audio_path,save_analysis_files, Display=False):
     return onsets
 
 
-def run_crepe(audio_path):
-    
-    sr, audio = wavfile.read(str(audio_path))
-    time, frequency, confidence, activation = crepe.predict(audio, sr, viterbi=True)
-    
-    return frequency, confidence
+def pick_onsets(onset_activations, threshold=0.6):
+    onsets = np.zeros_like(onset_activations)
+    onsets[find_peaks(onset_activations, distance=4, height=threshold)[0]] = 1
+    return onsets
+
+
+# parameters of the CREPE analysis, part of its key in the analysis cache
+CREPE_PARAMS = {'viterbi': True, 'step_size': 10, 'center': True}
+
+
+def run_crepe(audio_path, model_capacity='full', resampler='resampy', audio=None):
+
+    def compute():
+        context = AudioContext(audio_path) if audio is None else audio
+        model = get_crepe_model(model_capacity)
+        time, frequency, confidence, activation = crepe.predict(context.samples, context.sample_rate, model_capacity=model_capacity, viterbi=True, model=model,
+                                                                resampler=resampler)
+        return {'frequency': frequency, 'confidence': confidence}
+
+    f0 = cache.get('f0', audio_path, compute, params=dict(CREPE_PARAMS, resampler=resampler), model=crepe_model_id(model_capacity))
+    return f0['frequency'], f0['confidence']
+
+
+def run_crepe_batch(audio_paths, model_capacity='full', files_per_batch=256, batch_size=2048, resampler='resampy'):
+    """
+    Run CREPE on many (short) files, packing the frames of `files_per_batch` files at a
+    time into shared model batches (see `crepe.predict_batch`), and store the results in
+    the analysis cache. Files already in the cache are skipped.
+
+    Args:
+        audio_paths (list of Path): Audio files.
+        model_capacity (str): CREPE model capacity.
+        files_per_batch (int): Number of files decoded and held in memory at a time.
+        batch_size (int): Number of frames per model call.
+        resampler (str): How audio that is not at 16 kHz is resampled, see `crepe.core.resample_audio`.
+
+    Returns:
+        list of tuple: (frequency, confidence) of each file, as returned by `run_crepe`.
+    """
+    model_id = crepe_model_id(model_capacity)
+    params = dict(CREPE_PARAMS, resampler=resampler)
+    results = [cache.load('f0', audio_path, params=params, model=model_id) for audio_path in audio_paths]
+    missing = [i for i, f0 in enumerate(results) if f0 is None]
+    for first in range(0, len(missing), files_per_batch):
+        chunk = missing[first:first + files_per_batch]
+        audios = []
+        for i in chunk:
+            context = AudioContext(audio_paths[i])
+            audios.append((context.samples, context.sample_rate))
+        predictions = crepe.predict_batch(audios, model_capacity=model_capacity, viterbi=True, verbose=0,
+                                          model=get_crepe_model(model_capacity), batch_size=batch_size,
+                                          resampler=resampler)
+        for i, (_, frequency, confidence, _) in zip(chunk, predictions):
+            results[i] = {'frequency': frequency, 'confidence': confidence}
+            cache.save('f0', audio_paths[i], results[i], params=params, model=model_id)
+    return [(f0['frequency'], f0['confidence']) for f0 in results]
 
 
 def steps_to_samples(step_val, sr, step_size=0.01):
@@ -74,41 +130,375 @@ def calculate_tuning_offset(freqs):
 
 
 def parse_f0(f0_path):
+    if str(f0_path).endswith('.npy'):
+        # binary f0 (see save_f0), memory-mapped rather than parsed
+        _, frequency, confidence = crepe.load_f0_binary(str(f0_path))
+        return np.nan_to_num(frequency), np.nan_to_num(confidence)
     data = np.genfromtxt(f0_path, delimiter=',', names=True)
     return np.nan_to_num(data['frequency']), np.nan_to_num(data['confidence'])
     
 def save_f0(f0_path, frequency, confidence):
+    if str(f0_path).endswith('.npy'):
+        crepe.save_f0_binary(str(f0_path), np.arange(len(frequency)) * 0.01, frequency, confidence)
+        return
     np.savetxt(f0_path, np.stack([np.linspace(0, 0.01 * len(frequency), len(frequency)).astype('float'), frequency.astype('float'), confidence.astype('float')], axis=1), fmt='%10.7f', delimiter=',', header='time,frequency,confidence', comments='')
     return
 
-def load_audio(audio_path, cached_amp_envelope_path, default_sample_rate, detect_amplitude, save_amp_envelope):
-    if cached_amp_envelope_path.exists():
+
+def find_f0_file(audio_path):
+    """
+    Pitch track saved for `audio_path` by --save-analysis-files, the binary .f0.npy
+    being preferred to the CSV export. None if there is neither.
+    """
+    f0_folder_path = audio_path.parent / "F0"
+    for suffix in (".f0.npy", ".f0.csv"):
+        f0_path = f0_folder_path / audio_path.with_suffix(suffix).name
+        if f0_path.exists():
+            return f0_path
+    return None
+
+# parameters of the amplitude envelope, part of its key in the analysis cache
+AMP_ENVELOPE_PARAMS = {'method': 'hilbert', 'filter': 'butter', 'order': 4, 'cutoff': 50, 'frame_rate': 100,
+                       'engine': 'blocks'}
+
+
+def load_audio(audio_path, detect_amplitude, audio=None):
+    cached = cache.load('amp_envelope', audio_path, params=AMP_ENVELOPE_PARAMS)
+    if cached is not None:
         # if we have a cached amplitude envelope, no need to load audio
-        filtered_amp_envelope = np.load(cached_amp_envelope_path, allow_pickle=True)['filtered_amp_envelope']
-        # sr = get_samplerate(audio_path)
-        sr = default_sample_rate # this is mainly to make tests work without having to load audio
+        return int(cached['sr']), None, cached['filtered_amp_envelope'], detect_amplitude
+
+    try:
+        context = AudioContext(audio_path) if audio is None else audio
+        y, sr = context.mono(), context.sample_rate
+    except:
+        print("Error loading audio file. Amplitudes will be set to 80")
+        detect_amplitude = False
         y = None
+        pass
+
+    # low pass filtered amplitude envelope at 100 Hz, scaled to [0, 1]
+    filtered_amp_envelope = amplitude_envelope(y, sr, cutoff=AMP_ENVELOPE_PARAMS['cutoff'],
+                                               order=AMP_ENVELOPE_PARAMS['order'],
+                                               frame_rate=AMP_ENVELOPE_PARAMS['frame_rate'])
+
+    cache.save('amp_envelope', audio_path, {'filtered_amp_envelope': filtered_amp_envelope, 'sr': np.array(sr)},
+               params=AMP_ENVELOPE_PARAMS)
+    return sr, y, filtered_amp_envelope, detect_amplitude
+
+
+def iter_audio_blocks(audio_path, block_duration=60, overlap=2):
+    """
+    Read an audio file block by block instead of loading it completely.
+
+    Args:
+        audio_path (Path): Audio file.
+        block_duration (int): Length of each block in seconds.
+        overlap (int): Seconds of context added on both sides of each block (where available).
+
+    Yields:
+        tuple: (block, sr, start, stop, read_start) with the mono float32 samples of the block,
+        the sample rate, the block boundaries in samples and the position of the first sample
+        of `block` (i.e. `start` minus the left context).
+    """
+    import soundfile as sf
+
+    with sf.SoundFile(str(audio_path)) as f:
+        sr = f.samplerate
+        block_size = int(block_duration) * sr
+        overlap_size = int(overlap) * sr
+        for start in range(0, f.frames, block_size):
+            stop = min(start + block_size, f.frames)
+            read_start = max(0, start - overlap_size)
+            f.seek(read_start)
+            block = f.read(min(f.frames, stop + overlap_size) - read_start, dtype='float32')
+            if block.ndim == 2:
+                block = block.mean(axis=1)
+            yield block, sr, start, stop, read_start
+
+
+def read_audio_ends(audio_path, duration=1):
+    """
+    Returns:
+        tuple: (head, tail), the first and last `duration` seconds of the audio file as mono
+        float32 samples, as `iter_audio_blocks` reads them.
+    """
+    import soundfile as sf
+
+    with sf.SoundFile(str(audio_path)) as f:
+        num_samples = min(f.frames, int(duration * f.samplerate))
+        ends = [f.read(num_samples, dtype='float32')]
+        f.seek(f.frames - num_samples)
+        ends.append(f.read(num_samples, dtype='float32'))
+    return tuple(end.mean(axis=1) if end.ndim == 2 else end for end in ends)
+
+
+def analyse_blocks(audio_path, block_duration=60, overlap=2, pitch=True, onsets=True, model_capacity='full',
+                   resampler='resampy'):
+    """
+    Compute the frame-wise analysis of `process` (CREPE f0 and confidence, amplitude envelope
+    and madmom onset activations, all at 100 frames per second) on overlapping blocks of audio
+    and stitch the results together.
+
+    Only one block of audio and of CREPE activations is held in memory at a time, the stitched
+    results are 100 Hz vectors. Results match a whole-file analysis except within `overlap`
+    seconds of the block boundaries.
+
+    Returns:
+        tuple: (sr, frequency, confidence, filtered_amp_envelope, onset_activations),
+        frequency and confidence are None if `pitch` is False, onset_activations is None if
+        `onsets` is False.
+    """
+    if pitch:
+        crepe_model = get_crepe_model(model_capacity)
+    if onsets:
+        from madmom.audio.signal import Signal
+        onset_processor = get_madmom_onset_processor()
+
+    frequency, confidence, amp_envelope, onset_activations = [], [], [], []
+    amp_min, amp_max = np.inf, -np.inf
+    # the analytic signal of the whole file wraps around its ends (see envelope.py)
+    import soundfile as sf
+    num_samples = sf.info(str(audio_path)).frames
+    file_head, file_tail = read_audio_ends(audio_path)
+    for block, sr, start, stop, read_start in iter_audio_blocks(audio_path, block_duration, overlap):
+        # CREPE and madmom frames are 10 ms apart, blocks start on whole seconds
+        first_frame = (start - read_start) * 100 // sr
+        last_frame = first_frame + -(-(stop - start) * 100 // sr)
+        if pitch:
+            _, block_frequency, block_confidence, _ = crepe.predict(block, sr, model_capacity=model_capacity, viterbi=True,
+                                                                     verbose=0, model=crepe_model, resampler=resampler)
+            frequency.append(block_frequency[first_frame:last_frame])
+            confidence.append(block_confidence[first_frame:last_frame])
+        if onsets:
+            onset_activations.append(onset_processor(Signal(block, sample_rate=sr))[first_frame:last_frame])
+
+        # the envelope is filtered unscaled and rescaled once the global extrema are known,
+        # this is the same as filtering the rescaled envelope since the filter is linear
+        step = sr // 100
+        # sample on the global grid of the whole-file envelope (every `step` samples from 0)
+        offset = -read_start % step
+        context = (file_tail if start == 0 else None, file_head if stop == num_samples else None)
+        envelope, block_min, block_max = amplitude_envelope(
+            block[offset:], sr, scale=False, extrema=(start - read_start - offset, stop - read_start - offset),
+            context=context)
+        amp_min, amp_max = min(amp_min, block_min), max(amp_max, block_max)
+        first_step = -(-start // step) - (read_start + offset) // step
+        last_step = -(-stop // step) - (read_start + offset) // step
+        amp_envelope.append(envelope[first_step:last_step])
+
+    filtered_amp_envelope = np.concatenate(amp_envelope)
+    filtered_amp_envelope = (filtered_amp_envelope - amp_min) / (amp_max - amp_min)
+    return (sr,
+            np.concatenate(frequency) if pitch else None,
+            np.concatenate(confidence) if pitch else None,
+            filtered_amp_envelope,
+            np.concatenate(onset_activations) if onsets else None)
+
+
+
+def _ranges(starts, stops):
+    """
+    Indices covering the ranges [starts[i], stops[i]) back to back, together with
+    the offset of each range in the returned indices and its length.
+    """
+    lengths = stops - starts
+    offsets = np.cumsum(lengths) - lengths
+    idx = np.arange(lengths.sum()) - np.repeat(offsets - starts, lengths)
+    return idx, offsets, lengths
+
+
+def _run_medians(values, offsets, lengths):
+    """Medians of the consecutive non-empty runs of `values`, same result as np.median per run."""
+    run_ids = np.repeat(np.arange(len(lengths)), lengths)
+    values = values[np.lexsort((values, run_ids))]
+    return (values[offsets + (lengths - 1) // 2] + values[offsets + lengths // 2]) / 2
+
+
+def _range_maxima(values, starts, stops):
+    idx, offsets, _ = _ranges(starts, stops)
+    return np.maximum.reduceat(values[idx], offsets)
+
+
+def find_segments(note_starts, note_ends, midi_pitch, freqs, conf, filtered_amp_envelope, midi_note, global_max_amp,
+                  detect_amplitude=True):
+    """
+    Describe the candidate note regions [note_starts[i], note_ends[i]) with their median
+    pitch, frequency and confidence and their maximum amplitude.
+
+    Regions shorter than 2 frames are discarded. The pitch of a region is set to 0 if it
+    does not match `midi_note`.
+
+    Returns:
+        dict of numpy arrays: 'pitch', 'freq', 'conf', 'transition_strength', 'amplitude',
+        'start_idx' and 'finish_idx', one entry per segment.
+    """
+    note_starts = np.asarray(note_starts, dtype=int)
+    note_ends = np.asarray(note_ends, dtype=int)
+    # Handle an edge case where rounding could cause
+    # an end index for a note to be before the start index
+    keep = note_ends - note_starts > 1
+    a, b = note_starts[keep], note_ends[keep]
+
+    idx, offsets, lengths = _ranges(a, b)
+    pitch = np.round(_run_medians(midi_pitch[idx], offsets, lengths))
+    # Nouvelle etape : filtrer les fréquences pour ne gardes que celle autour de la note que l'on veut détecter
+    pitch[pitch != midi_note] = 0
+
+    if detect_amplitude:
+        max_amp = _range_maxima(filtered_amp_envelope, a, np.minimum(b, len(filtered_amp_envelope)))
+        amplitude = np.interp(max_amp, (0, global_max_amp), (0, 127))
     else:
-        try:
-            y, sr = load(str(audio_path), sr=None)
-        except:
-            print("Error loading audio file. Amplitudes will be set to 80")
-            detect_amplitude = False
-            y = None
-            pass
-
-        amp_envelope = np.abs(hilbert(y))
-
-        scaled_amp_envelope = np.interp(amp_envelope, (amp_envelope.min(), amp_envelope.max()), (0, 1))
-        # low pass filter the amplitude envelope
-        b, a = butter(4, 50, 'low', fs=sr)
-        filtered_amp_envelope = filtfilt(b, a, scaled_amp_envelope)[::(sr//100)]
-    
-    if save_amp_envelope:
-        np.savez(cached_amp_envelope_path, filtered_amp_envelope=filtered_amp_envelope)
-    
-    return sr, y, filtered_amp_envelope, detect_amplitude    
+        amplitude = np.full(len(a), 80)
+
+    return {
+        'pitch': pitch,
+        'freq': _run_medians(freqs[idx], offsets, lengths),
+        'conf': _run_medians(conf[idx], offsets, lengths),
+        'transition_strength': 1 - conf[a],  # TODO: make use of the dip in confidence as a measure of how strong an onset is
+        'amplitude': amplitude,
+        'start_idx': a,
+        'finish_idx': b,
+    }
+
+
+def merge_segments(segments, filtered_amp_envelope, midi_note, min_velocity, global_max_amp):
+    """
+    Merge runs of adjacent segments with the same pitch into notes.
+
+    Only the segments loud enough and within a semitone of `midi_note` contribute to a
+    note. Note: the last segment never closes a run and is therefore not used.
+
+    Returns:
+        NoteTable: The notes.
+    """
+    num_segments = len(segments['pitch']) - 1
+    if num_segments < 1:
+        return NoteTable()
+    pitch = segments['pitch'][:num_segments]
+
+    # a new run starts after each change of pitch
+    # TODO: make use of variance in segment to catch glissandi?
+    run_ends = np.abs(np.diff(segments['pitch'])) > 0.5  # or a['transition_strength'] > 0.4
+    run_ids = np.concatenate(([0], np.cumsum(run_ends)[:-1]))
+    last_in_run = np.append(np.flatnonzero(run_ends[:-1]), num_segments - 1)
 
+    # Filter out notes that are too short or too quiet
+    kept = np.flatnonzero((segments['amplitude'][:num_segments] > min_velocity) &
+                          (midi_note - 1 <= pitch) & (pitch <= midi_note + 1))
+    if len(kept) == 0:
+        return NoteTable()
+    note_runs, first, counts = np.unique(run_ids[kept], return_index=True, return_counts=True)
+    last = first + counts - 1
+
+    median_pitch = _run_medians(pitch[kept], first, counts)
+    median_confidence = _run_medians(segments['conf'][kept], first, counts)
+    seg_start = segments['start_idx'][kept[first]]
+    seg_end = segments['finish_idx'][kept[last]]
+    max_amp = _range_maxima(filtered_amp_envelope, seg_start, np.minimum(seg_end, len(filtered_amp_envelope)))
+    scaled_max_amp = np.interp(max_amp, (0, global_max_amp), (0, 127))
+    freq = segments['freq'][kept[first]]
+    transition_strength = segments['transition_strength'][last_in_run[note_runs]]
+
+    # TODO: make use of confidence strength
+    return NoteTable.from_columns(pitch=np.round(median_pitch).astype(int),
+                                  freq=freq,
+                                  velocity=np.round(scaled_max_amp),
+                                  start_idx=seg_start,
+                                  finish_idx=seg_end,
+                                  conf=median_confidence,
+                                  transition_strength=transition_strength)
+
+
+def split_notes_at_onsets(notes, onsets, min_duration, threshold=0.7):
+    """
+    Split notes at the onsets found within them, e.g. to separate repeated notes.
+
+    An onset is only used if it comes more than `min_duration` seconds after the
+    previous split point of the note.
+
+    Returns:
+        NoteTable: The split notes.
+    """
+    onset_idxs = np.flatnonzero(onsets > threshold)
+    min_gap = int(min_duration / 0.01)
+    note_starts = notes['start_idx'].astype(int)
+    note_ends = notes['finish_idx'].astype(int)
+    first_onsets = np.searchsorted(onset_idxs, note_starts)
+    last_onsets = np.searchsorted(onset_idxs, note_ends)
+
+    rows, split_starts, split_ends = [], [], []
+    for row, (n_s, n_f, i, j) in enumerate(zip(note_starts, note_ends, first_onsets, last_onsets)):
+        onset_idxs_within_note = onset_idxs[i:j] - n_s
+
+        last_onset = 0
+        k = np.searchsorted(onset_idxs_within_note, last_onset + min_gap, side='right')
+        while k < len(onset_idxs_within_note):
+            rows.append(row)
+            split_starts.append(n_s + last_onset)
+            split_ends.append(n_s + onset_idxs_within_note[k])
+            last_onset = onset_idxs_within_note[k]
+            k = np.searchsorted(onset_idxs_within_note, last_onset + min_gap, side='right')
+
+        # If there are no valid onsets within the range
+        # the following should keep the original note,
+        # but if there were splits at onsets then it will also clean up any tails
+        # left in the sequence
+        rows.append(row)
+        split_starts.append(n_s + last_onset)
+        split_ends.append(n_f)
+
+    onset_separated_notes = notes.take(np.array(rows, dtype=int))
+    onset_separated_notes['start_idx'] = split_starts
+    onset_separated_notes['finish_idx'] = split_ends
+    return onset_separated_notes
+
+
+def trim_notes(notes, filtered_amp_envelope, sr, min_duration, noise_floor=0.01):
+    """
+    Trim the start and end of each note to the first and last frame where the amplitude
+    envelope is above `noise_floor`, and set their 'start' and 'finish' times in seconds.
+
+    Notes not longer than `min_duration` seconds and notes that never rise above the noise
+    floor are dropped.
+
+    Returns:
+        NoteTable: The trimmed notes.
+    """
+    s = notes['start_idx'].astype(int)
+    f = notes['finish_idx'].astype(int)
+    notes = notes.filter(f - s > (min_duration / 0.01))
+    s = notes['start_idx'].astype(int)
+    f = notes['finish_idx'].astype(int)
+
+    # first and last frame above the noise floor within each note
+    f_clipped = np.maximum(np.minimum(f, len(filtered_amp_envelope)), s)
+    idx, offsets, lengths = _ranges(s, f_clipped)
+    above = np.flatnonzero(filtered_amp_envelope[idx] > noise_floor)
+    counts = np.bincount(np.repeat(np.arange(len(s)), lengths)[above], minlength=len(s))
+    audible = counts > 0
+    first = (np.cumsum(counts) - counts)[audible]
+    first_above = above[first] - offsets[audible]
+    last_above = above[first + counts[audible] - 1] - offsets[audible]
+
+    notes = notes.filter(audible)
+    s, f, f_clipped = s[audible], f[audible], f_clipped[audible]
+    # same sample/step round trip as steps_to_samples and samples_to_steps
+    s_samp = np.trunc(s * (sr * 0.01)).astype(int)
+    f_samp = np.trunc(f * (sr * 0.01)).astype(int)
+    s_adj_samp_idx = s_samp + first_above
+    f_adj_samp_idx = f_samp - (f_clipped - s - 1 - last_above)
+    if np.any((f_adj_samp_idx > f_samp) | (f_adj_samp_idx < 1)):
+        print("something has gone wrong")
+
+    s_adj = np.trunc(s_adj_samp_idx / (sr * 0.01)).astype(int)
+    f_adj = np.trunc(f_adj_samp_idx / (sr * 0.01)).astype(int)
+    if np.any((f_adj > f) | (f_adj < 1)):
+        print("something has gone more wrong")
+
+    notes['start'] = s_adj * 0.01
+    notes['finish'] = f_adj * 0.01
+    return notes
 
 
 def process(freqs,
@@ -123,17 +513,20 @@ def process(freqs,
             use_cwd=True,
             tuning_offset=False,
             detect_amplitude=True,
-            save_amp_envelope=False,
-            default_sample_rate=44100,
             save_analysis_files=False,
-            my_cnn=False):
+            my_cnn=False,
+            sr=None,
+            filtered_amp_envelope=None,
+            onset_activations=None,
+            audio=None,
+            onset_threshold=0.6):
     
     display = False
     # Etape 1 : Chargement de l'audio
     fname = audio_path.stem
     note_list,_ = Create_Note_list()
-    cached_amp_envelope_path = audio_path.with_suffix(".amp_envelope.npz")
-    sr, y, filtered_amp_envelope, detect_amplitude = load_audio(audio_path, cached_amp_envelope_path, default_sample_rate, detect_amplitude, (save_analysis_files or save_amp_envelope))
+    if filtered_amp_envelope is None:
+        sr, y, filtered_amp_envelope, detect_amplitude = load_audio(audio_path, detect_amplitude, audio)
     note, midi_note = get_note_guessed_from_fname(note_list=note_list, fname=fname)
     # print(f"Note guessed from filename: {note} ({midi_note})")
     
@@ -153,25 +546,27 @@ def process(freqs,
         f0_folder_path = audio_path.parent / "F0"
         f0_folder_path.mkdir(parents=True, exist_ok=True)
 
-        # Définir le chemin complet pour le fichier .f0.csv à l'intérieur du dossier "F0"
-        f0_path = f0_folder_path / audio_path.with_suffix(".f0.csv").name
-
-        # Vérifier si le fichier .f0.csv n'existe pas déjà et l'enregistrer
-        if not f0_path.exists():
-            # print(f"Saving f0 to {f0_path}")
-            save_f0(f0_path, freqs, conf)
+        # Enregistrer le f0 en binaire (relu par les exécutions suivantes) et en CSV (export)
+        # s'ils n'existent pas déjà
+        for suffix in (".f0.npy", ".f0.csv"):
+            f0_path = f0_folder_path / audio_path.with_suffix(suffix).name
+            if not f0_path.exists():
+                save_f0(f0_path, freqs, conf)
 
     # Étape 3 : Détection des onsets avec madmom
     if not disable_splitting:
         
-        if my_cnn: 
+        if onset_activations is not None:
+            # onsets computed beforehand, e.g. block-wise by analyse_blocks
+            onsets = pick_onsets(onset_activations, onset_threshold)
+        elif my_cnn: 
           
-            onsets = detect_onsets_linda(audio_path,model_path,save_analysis_files)
+            onsets = detect_onsets_linda(audio_path,model_path,save_analysis_files, audio=audio)
         # # Chargemnt des onsets 
         
         else :
           
-          onsets = detect_onsets(audio_path, save_analysis_files,Display=False)
+          onsets = detect_onsets(audio_path, Display=False, audio=audio, threshold=onset_threshold)
 
     # Étape 4 : Calcul du décalage de l'accordage
     if tuning_offset == False:
@@ -211,18 +606,18 @@ def process(freqs,
     #transition_ends = list(map(int, np.round(transition_ends)))
 
     _, _, transition_starts_conf, transition_ends_conf = peak_widths(change_point_signal, conf_peaks, rel_height=0.5)
-    transition_starts = list(map(int, np.round(transition_starts_conf)))
-    transition_ends = list(map(int, np.round(transition_ends_conf)))
    
     # Étape 7 : Détection des régions de notes candidates
-    # get candidate note regions - any point between two peaks in the change point signal
-    transitions = [(s, f, 'transition') for (s, f) in zip(transition_starts, transition_ends)]
-  
-    note_starts = [0] + transition_ends
-    note_ends = transition_starts + [len(change_point_signal) + 1]
-    note_regions = [(s, f, 'note') for (s, f) in (zip(note_starts, note_ends))]
+    # get candidate note regions - any point between two transitions
+    # Note: only the regions followed by a transition are used, i.e. the region
+    #       after the last transition is ignored
+    transition_starts = np.round(transition_starts_conf).astype(int)
+    transition_ends = np.round(transition_ends_conf).astype(int)
+    note_starts = np.concatenate(([0], transition_ends))[:len(transition_starts)]
+    note_ends = transition_starts
 
     # Étape 8 : Détection de l'amplitude (optionnel)
+    global_max_amp = None
     if detect_amplitude:
         # take the amplitudes within 6 sigma of the mean
         # helps to clean up outliers in amplitude scaling as we are not looking for 100% accuracy
@@ -231,121 +626,14 @@ def process(freqs,
         # filtered_amp_envelope = amp_envelope.copy()
         filtered_amp_envelope[filtered_amp_envelope > amp_mean + (6 * amp_sd)] = 0
         global_max_amp = max(filtered_amp_envelope)
- 
-
-    # Étape 9 : Création de la liste des segments
-    segment_list = []
-    for a, b, label in sum(zip(note_regions, transitions), ()):
-        if label == 'transition':
-            continue
-
-        # Handle an edge case where rounding could cause
-        # an end index for a note to be before the start index
-        if a > b:
-            continue
-        elif b - a <= 1:
-            continue
-
-        if detect_amplitude:
-            max_amp = np.max(filtered_amp_envelope[a:b])
-            scaled_max_amp = np.interp(max_amp, (0, global_max_amp), (0, 127))
-          
-        else:
-            scaled_max_amp = 80
-        
-        # Nouvelle etape : filtrer les fréquences pour ne gardes que celle autour de la note que l'on veut détecter
-        if np.round(np.median(midi_pitch[a:b]))== midi_note:
-            pitch= np.round(np.median(midi_pitch[a:b]))
-            # print(f"midi pitch: {pitch}")
-        else:
-            pitch=0
-        segment_list.append({
-            'pitch': pitch,
-            'freq': np.median(freqs[a:b]),
-            'conf': np.median(conf[a:b]),
-            'transition_strength': 1 - conf[a], # TODO: make use of the dip in confidence as a measure of how strong an onset is
-            'amplitude': scaled_max_amp,
-            'start_idx': a,
-            'finish_idx': b,
-        })
-
-    ## Étape 10 : Filtrage et fusion des segments
-    # segment list contains our candidate notes
-    # now we iterate through them and merge if two adjacent segments have the same median pitch
-    notes = []
-    sub_list = []
-    for a, b in zip(segment_list, segment_list[1:]):
-        # TODO: make use of variance in segment to catch glissandi?
-        # if np.var(midi_pitch[a[1][0]:a[1][1]]) > 1:
-        #     continue
-
-        if np.abs(a['pitch'] -
-                  b['pitch']) > 0.5:  # or a['transition_strength'] > 0.4:
-            sub_list.append(a)
-            notes.append(sub_list)
-            sub_list = []
-        else:
-            sub_list.append(a)
-
-    # catch any segments at the end
-    if len(sub_list) > 0:
-        notes.append(sub_list)
-
-
-    # garder les notes si le pitch coorespond à la note
-    # Étape 11 : Création des notes de sortie
-  
-    velocities = []
-    durations = []
-    output_notes = []
-    min_diff=8
-    # Filter out notes that are too short or too quiet
-    for x_s in notes:
-        
-        #x_s_filt = [x for x in x_s if x['amplitude'] > min_velocity and abs(x['pitch']-midi_note)<min_diff]
-        x_s_filt = [x for x in x_s if x['amplitude'] > min_velocity and midi_note-1<=x['pitch']<=midi_note+1]
-        # print x_s_filt['amplitude']
-        
-        #x_s_filt = [x for x in x_s if x['pitch']==midi_note]
-        #x_s_filt = [x for x in x_s if abs(x['pitch']-midi_note)<min_diff]    
-       
-        if len(x_s_filt) == 0:
-            continue
-        median_pitch = np.median(np.array([y['pitch'] for y in x_s_filt]))
-        median_confidence = np.median(np.array([y['conf'] for y in x_s_filt]))
-        seg_start = x_s_filt[0]['start_idx']
-        seg_end = x_s_filt[-1]['finish_idx']
-        time_start = 0.01 * seg_start
-        time_end = 0.01 * seg_end
-        sample_start = time_to_samples(time_start, sr=sr)
-        sample_end = time_to_samples(time_end, sr=sr)
-        max_amp = np.max(filtered_amp_envelope[seg_start:seg_end])
-        scaled_max_amp = np.interp(max_amp, (0, global_max_amp), (0, 127))
-
-        valid_amplitude = scaled_max_amp > min_velocity
-        valid_duration = (time_end - time_start) > min_duration
-        
-        # TODO: make use of confidence strength
-        valid_confidence = True  # median_confidence > 0.1
-
-        #if valid_amplitude and valid_confidence and valid_duration:
-        output_notes.append({
-            'pitch':
-                int(np.round(median_pitch)),
-            'freq':
-                x_s_filt[0]['freq'],
-            'velocity':
-                round(scaled_max_amp),
-            'start_idx':
-                seg_start,
-            'finish_idx':
-                seg_end,
-            'conf':
-                median_confidence,
-            'transition_strength':
-                x_s[-1]['transition_strength']
-        })
-   
+
+    # Étape 9 : Création des segments
+    segments = find_segments(note_starts, note_ends, midi_pitch, freqs, conf, filtered_amp_envelope,
+                             midi_note, global_max_amp, detect_amplitude)
+
+    # Étapes 10 et 11 : Fusion des segments et création des notes de sortie
+    output_notes = merge_segments(segments, filtered_amp_envelope, midi_note, min_velocity, global_max_amp)
+
     # Étape 13 : Gestion des notes répétées 
     # Handle repeated notes
     # Here we use a standard onset detection algorithm from madmom
@@ -353,72 +641,15 @@ def process(freqs,
     # Repeated notes have a pitch gradient of 0 and are therefore
     # not separated by the algorithm above
     if not disable_splitting:
-        onset_separated_notes = []
-        for n in output_notes:
-            n_s = n['start_idx']
-            n_f = n['finish_idx']
-
-            last_onset = 0
-            if np.any(onsets[n_s:n_f] > 0.7):
-                onset_idxs_within_note = np.argwhere(onsets[n_s:n_f] > 0.7)
-                for idx in onset_idxs_within_note:
-                    if idx[0] > last_onset + int(min_duration / 0.01):
-                        new_note = n.copy()
-                        new_note['start_idx'] = n_s + last_onset
-                        new_note['finish_idx'] = n_s + idx[0]
-                        onset_separated_notes.append(new_note)
-                        last_onset = idx[0]
-
-            # If there are no valid onsets within the range
-            # the following should append a copy of the original note,
-            # but if there were splits at onsets then it will also clean up any tails
-            # left in the sequence
-            new_note = n.copy()
-            new_note['start_idx'] = n_s + last_onset
-            new_note['finish_idx'] = n_f
-            onset_separated_notes.append(new_note)
-            output_notes = onset_separated_notes
+        output_notes = split_notes_at_onsets(output_notes, onsets, min_duration)
     
     if detect_amplitude:
         # Trim notes that fall below a certain amplitude threshold
-        timed_output_notes = []
-        for n in output_notes:
-            timed_note = n.copy()
-
-            # Adjusting the start time to meet a minimum amp threshold
-            s = timed_note['start_idx']
-            f = timed_note['finish_idx']
-
-            if f - s > (min_duration / 0.01):
-                # TODO: make noise floor configurable
-                noise_floor = 0.01  # this will vary depending on the signal
-                s_samp = steps_to_samples(s, sr)
-                f_samp = steps_to_samples(f, sr)
-                s_adj_samp_all = s_samp + np.where(
-                    filtered_amp_envelope[s:f] > noise_floor)[0]
-
-                if len(s_adj_samp_all) > 0:
-                    s_adj_samp_idx = s_adj_samp_all[0]
-                else:
-                    continue
-
-                s_adj = samples_to_steps(s_adj_samp_idx, sr)
-
-                f_adj_samp_idx = f_samp - np.where(
-                    np.flip(filtered_amp_envelope[s:f]) > noise_floor)[0][0]
-                if f_adj_samp_idx > f_samp or f_adj_samp_idx < 1:
-                    print("something has gone wrong")
-
-                f_adj = samples_to_steps(f_adj_samp_idx, sr)
-                if f_adj > f or f_adj < 1:
-                    print("something has gone more wrong")
-
-                timed_note['start'] = s_adj * 0.01
-                timed_note['finish'] = f_adj * 0.01
-                timed_output_notes.append(timed_note)
-            else:
-                timed_note['start'] = s * 0.01
-                timed_note['finish'] = f * 0.01
-        
-    
+        # TODO: make noise floor configurable
+        timed_output_notes = trim_notes(output_notes, filtered_amp_envelope, sr, min_duration)
+    else:
+        timed_output_notes = output_notes.take(slice(None))
+        timed_output_notes['start'] = timed_output_notes['start_idx'] * 0.01
+        timed_output_notes['finish'] = timed_output_notes['finish_idx'] * 0.01
+
     return timed_output_notes, filtered_amp_envelope
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""Evaluate transcriptions against reference MIDI files.
+
+Every estimated MIDI file matching a glob pattern is paired with the reference
+whose name is obtained by replacing part of its name, and scored with
+`mir_eval.transcription.evaluate`. Pairs are parsed and scored in worker
+processes, reference note arrays go through the analysis cache (so evaluating
+another estimator, or the same one again, does not parse them again), and the
+results are written as CSV files: one row per file, the aggregate of each
+metric, and the time spent in each stage.
+"""
+import csv
+import multiprocessing
+import time
+import traceback
+from pathlib import Path
+
+import click
+import numpy as np
+import pretty_midi as pm
+
+import analysis_cache
+
+# parameters of the parsed reference notes, part of their key in the analysis cache
+REFERENCE_NOTES_PARAMS = {'parser': 'pretty_midi', 'tracks': 'first'}
+
+# per-file timings, in the order of the stages of `evaluate_pair`
+STAGES = ('parse_reference', 'parse_estimate', 'window', 'mir_eval')
+
+SUMMARY_COLUMNS = ['Precision_no_offset', 'Recall_no_offset', 'F-measure_no_offset',
+                   'Average_Overlap_Ratio_no_offset']
+
+
+def midi_notes(midi, merge_tracks=True):
+    """
+    Note intervals and pitches of a MIDI file.
+
+    Args:
+        midi (PrettyMIDI): Parsed MIDI file.
+        merge_tracks (bool): Take the notes of all the instruments, else of the first one only.
+
+    Returns:
+        tuple: (intervals, pitches), the (num_notes, 2) onset and offset times in seconds and
+        the (num_notes,) frequencies in Hz, in the order of the file.
+    """
+    instruments = midi.instruments if merge_tracks else midi.instruments[:1]
+    notes = [n for instrument in instruments for n in instrument.notes]
+    num_notes = len(notes)
+    intervals = np.fromiter((t for n in notes for t in (n.start, n.end)), dtype=float,
+                            count=2 * num_notes).reshape(num_notes, 2)
+    pitches = pm.note_number_to_hz(np.fromiter((n.pitch for n in notes), dtype=float, count=num_notes))
+    return intervals, np.atleast_1d(pitches).astype(float)
+
+
+def reference_notes(ref_path):
+    """Note intervals and pitches of the first track of `ref_path`, through the analysis cache."""
+    def parse():
+        intervals, pitches = midi_notes(pm.PrettyMIDI(str(ref_path)), merge_tracks=False)
+        return {'intervals': intervals, 'pitches': pitches}
+
+    arrays = analysis_cache.cache.get('reference_notes', ref_path, parse, params=REFERENCE_NOTES_PARAMS)
+    return arrays['intervals'], arrays['pitches']
+
+
+def window_estimates(ref_intervals, est_intervals, est_pitches):
+    """
+    Keep the estimated notes starting or ending strictly between the first and last reference
+    note times, the references often covering only part of the recording.
+    """
+    first_ref_note = np.min(ref_intervals)
+    last_ref_note = np.max(ref_intervals)
+    valid = np.any((est_intervals > first_ref_note) & (est_intervals < last_ref_note), axis=1)
+    return est_intervals[valid], est_pitches[valid]
+
+
+def evaluate_pair(job):
+    """
+    Score one estimated MIDI file against its reference.
+
+    Args:
+        job (tuple): (est_path, ref_path, merge_tracks, onset_tolerance).
+
+    Returns:
+        tuple: (metrics, timings, error), the dict of metrics of `mir_eval.transcription.evaluate`,
+        the seconds spent in each stage and None, or None, None and the traceback if it failed.
+    """
+    import mir_eval
+
+    est_path, ref_path, merge_tracks, onset_tolerance = job
+    timings = {}
+    try:
+        start = time.perf_counter()
+        ref_intervals, ref_pitches = reference_notes(ref_path)
+        timings['parse_reference'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        est_intervals, est_pitches = midi_notes(pm.PrettyMIDI(str(est_path)), merge_tracks=merge_tracks)
+        timings['parse_estimate'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        est_intervals, est_pitches = window_estimates(ref_intervals, est_intervals, est_pitches)
+        timings['window'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        metrics = mir_eval.transcription.evaluate(ref_intervals, ref_pitches, est_intervals, est_pitches,
+                                                  onset_tolerance=onset_tolerance)
+        timings['mir_eval'] = time.perf_counter() - start
+    except Exception:
+        return None, None, traceback.format_exc()
+    return dict(metrics), timings, None
+
+
+def find_pairs(root, midi_path, midi_replace_str, midi_replace_with):
+    """
+    Returns:
+        list of tuples: (est_path, ref_path) of every file under `root` matching the glob pattern
+        `midi_path`, the reference path being the estimate path with `midi_replace_str` replaced
+        by `midi_replace_with`. Sorted by estimate path.
+    """
+    return [(path, Path(str(path).replace(midi_replace_str, midi_replace_with)))
+            for path in sorted(Path(root).rglob(midi_path))]
+
+
+def _init_worker(cache_config):
+    analysis_cache.configure(*cache_config)
+
+
+def aggregate(rows, columns):
+    """Mean, standard deviation, median, minimum and maximum of each column over `rows`."""
+    summary = []
+    for column in columns:
+        values = np.array([row[column] for row in rows], dtype=float)
+        summary.append({'metric': column, 'count': len(values),
+                        'mean': np.mean(values) if len(values) else np.nan,
+                        'std': np.std(values) if len(values) else np.nan,
+                        'median': np.median(values) if len(values) else np.nan,
+                        'min': np.min(values) if len(values) else np.nan,
+                        'max': np.max(values) if len(values) else np.nan})
+    return summary
+
+
+def write_csv(path, rows, columns):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def evaluate(midi_path='*.crepe_notes.mid',
+             midi_replace_str='.crepe_notes.mid',
+             midi_replace_with='.mid',
+             output_label='crepe_notes',
+             root='.',
+             output_dir='.',
+             jobs=1,
+             merge_tracks=True,
+             onset_tolerance=0.05,
+             cache_config=None):
+    """
+    Evaluate every estimate under `root` against its reference and write the results.
+
+    Args:
+        midi_path (str): Glob pattern of the estimated MIDI files.
+        midi_replace_str (str): Part of the estimate path replaced to obtain the reference path.
+        midi_replace_with (str): What it is replaced with.
+        output_label (str): Prefix of the output files.
+        root (str): Directory searched recursively for estimates.
+        output_dir (str): Directory of the output files.
+        jobs (int): Number of worker processes, 1 evaluates the files in this process.
+        merge_tracks (bool): Evaluate the notes of all the tracks of the estimates, else of the first one.
+        onset_tolerance (float): Onset tolerance of mir_eval in seconds.
+        cache_config (tuple): (directory, max_size, enabled) of the analysis cache in the workers.
+
+    Returns:
+        tuple: (rows, summary, timings), the metrics of each file, their aggregates and the
+        total seconds spent in each stage. They are written to `<output_label>_eval.csv`,
+        `<output_label>_eval_summary.csv` and `<output_label>_eval_timings.csv`.
+    """
+    timings = dict.fromkeys(('find_pairs',) + STAGES + ('total', 'write'), 0.)
+    start_total = time.perf_counter()
+    start = time.perf_counter()
+    pairs = find_pairs(root, midi_path, midi_replace_str, midi_replace_with)
+    for est_path, ref_path in pairs:
+        if not ref_path.exists():
+            print(f"{output_label}: pas de référence {ref_path} pour {est_path}")
+    num_pairs = len(pairs)
+    pairs = [(est_path, ref_path) for est_path, ref_path in pairs if ref_path.exists()]
+    timings['find_pairs'] = time.perf_counter() - start
+
+    job_list = [(est_path, ref_path, merge_tracks, onset_tolerance) for est_path, ref_path in pairs]
+    if jobs > 1 and len(job_list) > 1:
+        if cache_config is None:
+            cache_config = (analysis_cache.cache.directory, analysis_cache.cache.max_size,
+                            analysis_cache.cache.enabled)
+        pool = multiprocessing.get_context('spawn').Pool(min(jobs, len(job_list)), initializer=_init_worker,
+                                                         initargs=(cache_config,))
+        results = pool.imap(evaluate_pair, job_list)
+    else:
+        pool = None
+        results = map(evaluate_pair, job_list)
+
+    rows = []
+    try:
+        for (est_path, ref_path), (metrics, file_timings, error) in zip(pairs, results):
+            if error is not None:
+                print(f"{output_label}: erreur lors de l'évaluation de {est_path} :\n{error}")
+                continue
+            print(f"{output_label}: {est_path}")
+            row = {'file': str(est_path), 'reference': str(ref_path)}
+            row.update(metrics)
+            row.update({f"time_{stage}": file_timings[stage] for stage in STAGES})
+            rows.append(row)
+            for stage in STAGES:
+                timings[stage] += file_timings[stage]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    timings['total'] = time.perf_counter() - start_total
+
+    metric_columns = [column for column in (rows[0] if rows else {})
+                      if column not in ('file', 'reference') and not column.startswith('time_')]
+    summary = aggregate(rows, metric_columns)
+
+    start = time.perf_counter()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    write_csv(output_dir / f"{output_label}_eval.csv", rows,
+              ['file', 'reference'] + metric_columns + [f"time_{stage}" for stage in STAGES])
+    write_csv(output_dir / f"{output_label}_eval_summary.csv", summary,
+              ['metric', 'count', 'mean', 'std', 'median', 'min', 'max'])
+    timings['write'] = time.perf_counter() - start
+    # the per-file stages add up the time spent in all the workers, `total` is the wall time
+    write_csv(output_dir / f"{output_label}_eval_timings.csv",
+              [{'stage': stage, 'seconds': seconds} for stage, seconds in timings.items()], ['stage', 'seconds'])
+
+    print_summary(summary, num_pairs - len(rows))
+    return rows, summary, timings
+
+
+def print_summary(summary, num_errors=0):
+    print(f"{'':<32} {'count':>5} {'mean':>6} {'std':>6} {'min':>6} {'max':>6}")
+    for s in summary:
+        if s['metric'] in SUMMARY_COLUMNS:
+            print(f"{s['metric']:<32} {s['count']:>5} {s['mean']:6.3f} {s['std']:6.3f} {s['min']:6.3f} {s['max']:6.3f}")
+    if num_errors:
+        print(f"{num_errors} fichier(s) en erreur")
+
+
+@click.command()
+@click.option('--pattern', 'midi_path', default='*.crepe_notes.mid', show_default=True, help='Glob pattern of the estimated MIDI files, searched recursively under ROOT')
+@click.option('--replace', 'midi_replace_str', default='.crepe_notes.mid', show_default=True, help='Part of the estimate path replaced to obtain the reference path')
+@click.option('--replace-with', 'midi_replace_with', default='.mid', show_default=True, help='What it is replaced with')
+@click.option('--output-label', default='crepe_notes', show_default=True, help='Prefix of the output CSV files')
+@click.option('--output-dir', default='.', show_default=True, help='Directory of the output CSV files')
+@click.option('--jobs', '-j', type=click.IntRange(1, None), default=1, help='Number of worker processes')
+@click.option('--first-track-only', is_flag=True, default=False, help='Evaluate only the first track of the estimates instead of merging all tracks')
+@click.option('--onset-tolerance', type=click.FloatRange(0, None), default=0.05, show_default=True, help='Onset tolerance in seconds')
+@click.option('--cache-dir', default=analysis_cache.DEFAULT_CACHE_DIR, show_default=True, help='Directory of the analysis cache, where parsed references are kept between runs')
+@click.option('--no-cache', is_flag=True, default=False, help='Do not read or write the analysis cache')
+@click.argument('root', type=click.Path(exists=True, file_okay=False), default='.')
+@click.help_option()
+def main(midi_path, midi_replace_str, midi_replace_with, output_label, output_dir, jobs, first_track_only,
+         onset_tolerance, cache_dir, no_cache, root):
+    """Evaluate the transcriptions found under ROOT against their reference MIDI files."""
+    cache = analysis_cache.configure(cache_dir, enabled=not no_cache)
+    _, _, timings = evaluate(midi_path, midi_replace_str, midi_replace_with, output_label, root=root,
+                             output_dir=output_dir, jobs=jobs, merge_tracks=not first_track_only,
+                             onset_tolerance=onset_tolerance,
+                             cache_config=(cache.directory, cache.max_size, cache.enabled))
+    print(', '.join(f"{stage} {seconds:.2f} s" for stage, seconds in timings.items()))
+
+
+if __name__ == '__main__':
+    main()
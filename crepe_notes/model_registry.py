@@ -0,0 +1,167 @@
+"""Process-wide cache for the CREPE, madmom CNN and onsetCNN models.
+
+Models are loaded lazily the first time they are requested and then kept in
+memory, so transcribing a folder of files pays the loading cost only once.
+The number of resident models is bounded; the least recently used model is
+dropped when the bound is exceeded.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from analysis_cache import model_identity
+
+MAX_MODELS = 4
+
+
+def resident_memory():
+    """Resident set size of the current process in bytes (None if unknown)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModelRegistry(object):
+    """
+    LRU cache of loaded models.
+
+    Args:
+        max_models (int): Maximum number of models kept in memory.
+    """
+
+    def __init__(self, max_models=MAX_MODELS):
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._stats = {}
+        self._lock = threading.RLock()
+
+    def get(self, key, loader):
+        """
+        Return the model stored under `key`, calling `loader()` to load it
+        if it is not resident yet.
+        """
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self._stats[key]['hits'] += 1
+                return self._models[key]
+
+            rss_before = resident_memory()
+            start = time.perf_counter()
+            model = loader()
+            load_time = time.perf_counter() - start
+            rss_after = resident_memory()
+
+            stats = self._stats.setdefault(key, {'loads': 0, 'hits': 0})
+            stats['loads'] += 1
+            stats['load_time'] = load_time
+            stats['memory'] = None if rss_before is None else rss_after - rss_before
+
+            self._models[key] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            return model
+
+    def __contains__(self, key):
+        return key in self._models
+
+    def __len__(self):
+        return len(self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def stats(self):
+        """
+        Returns:
+            list of dict: One entry per model ever loaded, with the load time
+            in seconds, the growth of the resident memory while loading in
+            bytes, the number of loads and cache hits and whether the model
+            is currently resident.
+        """
+        with self._lock:
+            return [dict(key=key, resident=key in self._models, **stats)
+                    for key, stats in self._stats.items()]
+
+    def print_stats(self):
+        for s in self.stats():
+            memory = 'n/a' if s['memory'] is None else f"{s['memory'] / 2 ** 20:.1f} MiB"
+            print(f"{'/'.join(map(str, s['key']))}: loaded {s['loads']}x in {s['load_time']:.2f}s, "
+                  f"{memory}, {s['hits']} hits{'' if s['resident'] else ' (evicted)'}")
+
+
+registry = ModelRegistry()
+
+
+def get_crepe_model(model_capacity='full', device=None):
+    def loader():
+        import crepe.core
+
+        if device is None:
+            model = crepe.core.build_and_load_model(model_capacity)
+        else:
+            import tensorflow as tf
+            with tf.device(device):
+                model = crepe.core.build_and_load_model(model_capacity)
+        # the registry owns the model, so that it can actually be evicted
+        crepe.core.models[model_capacity] = None
+        return model
+
+    return registry.get(('crepe', model_capacity, device or 'default'), loader)
+
+
+def get_madmom_onset_processor():
+    def loader():
+        from madmom.features import CNNOnsetProcessor
+        return CNNOnsetProcessor()
+
+    return registry.get(('madmom', 'CNNOnsetProcessor', 'cpu'), loader)
+
+
+def get_onset_cnn(model_path, device, dtype=None):
+    import torch
+    from New_cnn import load_model
+
+    dtype = dtype or torch.float32
+
+    def loader():
+        return load_model(model_path, device, dtype=dtype)
+
+    key = ('onsetCNN', os.path.abspath(model_path), str(device), str(dtype).replace('torch.', ''))
+    return registry.get(key, loader)
+
+
+def warm_up(crepe_capacity='full', madmom=True, onset_cnn_path=None, device=None):
+    """Load the models needed for a run up front instead of on first use."""
+    if crepe_capacity is not None:
+        get_crepe_model(crepe_capacity)
+    if madmom:
+        get_madmom_onset_processor()
+    if onset_cnn_path is not None:
+        import torch
+        device = device or torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        get_onset_cnn(onset_cnn_path, device)
+
+
+def crepe_model_id(model_capacity='full'):
+    """Identity of a CREPE model for the analysis cache (capacity and weights)."""
+    import crepe.core
+    weights = os.path.join(os.path.dirname(os.path.realpath(crepe.core.__file__)), f'model-{model_capacity}.h5')
+    return model_identity(weights, name=f'crepe-{model_capacity}')
+
+
+def madmom_onset_model_id():
+    """Identity of the madmom CNN onset models for the analysis cache."""
+    from madmom.models import ONSETS_CNN
+    return model_identity(*ONSETS_CNN, name='madmom-CNNOnsetProcessor')
@@ -0,0 +1,173 @@
+"""Columnar storage for the notes produced by `process`.
+
+A `NoteTable` keeps all the notes of one or many files in a single NumPy
+structured array (one row per note), so that filtering, sorting and
+concatenating notes are array operations and a note costs a few dozen bytes
+instead of a Python dict. Indexing a table with an integer (or iterating over
+it) gives a `Note`, a dict-like view of one row, so code written for lists of
+note dicts keeps working.
+"""
+from collections.abc import MutableMapping
+
+import numpy as np
+
+NOTE_DTYPE = np.dtype([
+    ('pitch', np.int16),
+    ('velocity', np.int16),
+    ('start_idx', np.int32),
+    ('finish_idx', np.int32),
+    ('freq', np.float64),
+    ('conf', np.float64),
+    ('transition_strength', np.float64),
+    ('start', np.float64),
+    ('finish', np.float64),
+])
+
+
+class Note(MutableMapping):
+    """
+    Dict-like view of one row of a `NoteTable`.
+
+    Values are returned as Python scalars and assignments write through to the
+    table. `copy()` returns a plain dict, detached from the table.
+    """
+
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key):
+        if key not in NOTE_DTYPE.names:
+            raise KeyError(key)
+        return self._table.data[key][self._row].item()
+
+    def __setitem__(self, key, value):
+        if key not in NOTE_DTYPE.names:
+            raise KeyError(key)
+        self._table.data[key][self._row] = value
+
+    def __delitem__(self, key):
+        raise TypeError('the fields of a note cannot be deleted')
+
+    def __iter__(self):
+        return iter(NOTE_DTYPE.names)
+
+    def __len__(self):
+        return len(NOTE_DTYPE.names)
+
+    def copy(self):
+        return dict(self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class NoteTable(object):
+    """
+    Table of notes stored column-wise.
+
+    Args:
+        data (numpy structured array, optional): Rows with dtype `NOTE_DTYPE`.
+            An empty table is created if None.
+
+    Columns are accessed with a field name (``table['pitch']`` is an array),
+    rows with an integer (a `Note` view) and subsets of rows with a slice,
+    a boolean mask or an array of indices (a new `NoteTable`).
+    """
+
+    def __init__(self, data=None):
+        if data is None:
+            data = np.zeros(0, dtype=NOTE_DTYPE)
+        self.data = np.asarray(data, dtype=NOTE_DTYPE)
+
+    @classmethod
+    def from_columns(cls, num_notes=None, **columns):
+        """
+        Build a table from one array per field. Fields that are not given are
+        set to 0, except 'start' and 'finish' which are set to NaN.
+        """
+        if num_notes is None:
+            num_notes = len(next(iter(columns.values()))) if columns else 0
+        data = np.zeros(num_notes, dtype=NOTE_DTYPE)
+        data['start'] = np.nan
+        data['finish'] = np.nan
+        for name, values in columns.items():
+            if name not in NOTE_DTYPE.names:
+                raise KeyError(name)
+            data[name] = values
+        return cls(data)
+
+    @classmethod
+    def from_dicts(cls, notes):
+        """Build a table from a list of note dicts (missing fields as in `from_columns`)."""
+        if isinstance(notes, NoteTable):
+            return notes
+        notes = list(notes)
+        columns = {name: [n[name] for n in notes] for name in NOTE_DTYPE.names if notes and name in notes[0]}
+        return cls.from_columns(len(notes), **columns)
+
+    @classmethod
+    def concat(cls, tables):
+        """Concatenate several tables (or lists of note dicts) into one."""
+        tables = [cls.from_dicts(t) for t in tables]
+        if not tables:
+            return cls()
+        return cls(np.concatenate([t.data for t in tables]))
+
+    def to_dicts(self):
+        """
+        Returns:
+            list of dict: The notes as plain dicts of Python scalars.
+        """
+        names = NOTE_DTYPE.names
+        return [dict(zip(names, row)) for row in self.data.tolist()]
+
+    def filter(self, mask):
+        """Keep the notes where `mask` is True."""
+        return NoteTable(self.data[np.asarray(mask, dtype=bool)])
+
+    def sort(self, by='start_idx'):
+        """Sort the notes by one field (or a list of fields, the first being the primary key)."""
+        by = [by] if isinstance(by, str) else list(by)
+        return NoteTable(self.data[np.lexsort([self.data[k] for k in reversed(by)])])
+
+    def take(self, rows):
+        return NoteTable(self.data[rows])
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        for row in range(len(self.data)):
+            yield Note(self, row)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.data[key]
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self.data)
+            if not 0 <= key < len(self.data):
+                raise IndexError('note index out of range')
+            return Note(self, key)
+        return NoteTable(self.data[key])
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, str):
+            raise TypeError('only whole columns can be assigned, e.g. table["velocity"] = values')
+        self.data[key] = value
+
+    def __eq__(self, other):
+        if not isinstance(other, NoteTable):
+            return NotImplemented
+        return len(self) == len(other) and all(np.array_equal(self.data[k], other.data[k], equal_nan=True)
+                                               for k in NOTE_DTYPE.names)
+
+    def __repr__(self):
+        return f"NoteTable({len(self)} notes)"
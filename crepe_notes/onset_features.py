@@ -0,0 +1,136 @@
+"""Multi-resolution spectrograms shared by the madmom CNN and the onsetCNN.
+
+Both onset detectors look at mel spectrograms of the mono 44.1 kHz signal
+with frame sizes of 1024, 2048 and 4096 samples, 10 ms apart: the madmom
+CNN at log-scaled magnitudes through madmom's mel filterbank, the onsetCNN
+at power spectrograms through librosa's mel filterbank, in dB. Instead of
+three STFTs each (through madmom, then again through librosa), the
+front-end frames the signal once per block of frames, computes one STFT per
+frame size, and applies the filterbanks of every requested consumer to it.
+Only the 80-band spectrograms are kept, and they are shared through the
+`AudioContext` of the file.
+
+Each consumer keeps the window it was trained with: madmom's symmetric Hann
+window for the madmom CNN, librosa's periodic one for the onsetCNN, thus the
+front-end computes one STFT per frame size and window. The onsetCNN
+spectrograms then equal those of `librosa.feature.melspectrogram` up to
+rounding.
+"""
+import functools
+
+import numpy as np
+
+from audio_context import AudioContext
+
+SAMPLE_RATE = 44100
+HOP_LENGTH = 441
+FRAME_SIZES = (1024, 2048, 4096)
+N_MELS = 80
+FMIN = 27.5
+FMAX = 16000
+
+
+def periodic_hann(size):
+    """librosa's STFT window, the periodic Hann window (`scipy.signal.get_window('hann', size)`)."""
+    return np.hanning(size + 1)[:-1]
+
+
+@functools.lru_cache(maxsize=16)
+def onset_cnn_filterbank(sample_rate, n_fft, n_mels=N_MELS, fmin=FMIN, fmax=FMAX):
+    """
+    librosa's mel filterbank used by the onsetCNN, cached per sample rate and FFT size.
+
+    Returns:
+        numpy array: Read-only filterbank of shape (n_fft // 2, n_mels), without the
+        Nyquist bin (madmom's STFT leaves it out, it is outside of all bands below fmax).
+    """
+    from librosa.filters import mel
+
+    filterbank = mel(sr=sample_rate, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)
+    if fmax < sample_rate / 2 and filterbank[:, -1].any():
+        raise ValueError(f"the mel filterbank up to {fmax} Hz uses the Nyquist bin")
+    filterbank = np.ascontiguousarray(filterbank[:, :n_fft // 2].T)
+    filterbank.flags.writeable = False
+    return filterbank
+
+
+def shared_front_end():
+    """Whether the installed madmom provides the multi-resolution front-end (madmom_update does)."""
+    try:
+        from madmom.audio.spectrogram import multi_resolution_spectrograms  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def madmom_spectrogram_processor():
+    """The multi-resolution spectrogram stage of the shared madmom CNN onset processor."""
+    from model_registry import get_madmom_onset_processor
+    return get_madmom_onset_processor().spectrogram_processor
+
+
+def onset_spectrograms(audio_path, consumers=('madmom', 'onset_cnn'), audio=None, frame_sizes=FRAME_SIZES,
+                       n_mels=N_MELS, fmin=FMIN, fmax=FMAX, block_size=512):
+    """
+    Spectrograms of the onset detectors, computed in a single pass over the signal.
+
+    Args:
+        audio_path (Path): Audio file.
+        consumers (tuple): 'madmom' and/or 'onset_cnn'.
+        audio (AudioContext): Shared decode of the file; the spectrograms are also
+            shared through it, so that each one is computed once per file.
+        frame_sizes (tuple): FFT sizes of the onsetCNN spectrograms.
+        n_mels, fmin, fmax: Mel bands of the onsetCNN spectrograms.
+        block_size (int): Number of frames processed at once.
+
+    Returns:
+        dict: 'madmom': list of log mel spectrograms (frames x bands) in the order of
+        the madmom processor (2048, 1024, 4096), ready for
+        `CNNOnsetProcessor.process_spectrograms`; 'onset_cnn': tuple of mel
+        spectrograms in dB (bands x frames), one per frame size, as
+        `New_cnn.preprocess_audio` returns them.
+    """
+    from madmom.audio.signal import FramedSignal
+    from madmom.audio.spectrogram import multi_resolution_spectrograms
+
+    context = AudioContext(audio_path) if audio is None else audio
+    keys = {'madmom': 'madmom CNN spectrograms',
+            'onset_cnn': f"onsetCNN spectrograms {'/'.join(map(str, frame_sizes))} {n_mels} bands {fmin}-{fmax} Hz"}
+    result = {consumer: context.feature(keys[consumer]) for consumer in consumers}
+    missing = [consumer for consumer in consumers if result[consumer] is None]
+    if not missing:
+        return result
+
+    signal = context.signal(SAMPLE_RATE, num_channels=1)
+    madmom_proc = madmom_spectrogram_processor() if 'madmom' in missing else None
+    # one output per consumer: magnitudes with madmom's window for madmom, powers with
+    # librosa's window for the onsetCNN, with empty filterbanks for frame sizes a
+    # consumer does not use
+    outputs = []
+    if madmom_proc:
+        outputs.append((1, np.hanning, madmom_proc.frame_sizes,
+                        lambda size: madmom_proc.get_filterbank(SAMPLE_RATE, size)))
+    if 'onset_cnn' in missing:
+        outputs.append((2, periodic_hann, frame_sizes,
+                        lambda size: onset_cnn_filterbank(SAMPLE_RATE, size, n_mels, fmin, fmax)))
+    sizes = sorted(set().union(*(output[2] for output in outputs)))
+    filterbanks = [[filterbank(size) if size in used else np.zeros((size // 2, 0), np.float32)
+                    for _, _, used, filterbank in outputs] for size in sizes]
+    # librosa centers one more frame than madmom if the length is a multiple of the hop
+    num_frames = len(signal) // HOP_LENGTH + 1 if 'onset_cnn' in missing else None
+    frames = [FramedSignal(signal, frame_size=size, hop_size=HOP_LENGTH, num_frames=num_frames) for size in sizes]
+    outputs = multi_resolution_spectrograms(frames, filterbanks, [output[0] for output in outputs],
+                                            window=[output[1] for output in outputs], block_size=block_size)
+
+    if madmom_proc:
+        specs = dict(zip(sizes, outputs.pop(0)))
+        num_madmom = int(np.ceil(len(signal) / float(HOP_LENGTH)))
+        result['madmom'] = [madmom_proc.scale(specs[size][:num_madmom]) for size in madmom_proc.frame_sizes]
+        context.add_feature(keys['madmom'], result['madmom'])
+    if 'onset_cnn' in missing:
+        from librosa import power_to_db
+        specs = dict(zip(sizes, outputs.pop(0)))
+        result['onset_cnn'] = tuple(power_to_db(specs[size].T, ref=np.max) for size in frame_sizes)
+        context.add_feature(keys['onset_cnn'], result['onset_cnn'])
+    return result
+
@@ -0,0 +1,251 @@
+"""Sweep the segmentation parameters of `process` over a grid and score each point.
+
+Only the segmentation in `process` depends on the sensitivity, the minimum
+duration and velocity of the notes and the onset threshold. The CREPE pitch
+track, the amplitude envelope and the onset activations are computed (or read
+from the analysis cache) once per file, and every point of the grid is then
+segmented in-process from them and scored against the reference MIDI file
+with `mir_eval`, without writing MIDI files. Files are spread over worker
+processes with `--jobs`.
+"""
+import itertools
+import multiprocessing
+import time
+import traceback
+from pathlib import Path
+
+import click
+import numpy as np
+import pretty_midi as pm
+
+import analysis_cache
+from audio_context import AudioContext
+from crepe_notes import (process, parse_f0, run_crepe, analyse_blocks, find_f0_file, load_audio,
+                         detect_onset_activations)
+from evaluation import reference_notes, window_estimates, aggregate, write_csv
+
+# the swept parameters of `process`, in the order of the columns of the results
+SWEEP_PARAMS = ('sensitivity', 'min_duration', 'min_velocity', 'onset_threshold')
+
+
+def parameter_grid(**values):
+    """
+    Returns:
+        list of dict: Every combination of the values given for each parameter, e.g.
+        `parameter_grid(sensitivity=[0.001, 0.002], min_duration=[0.03])` has 2 points.
+    """
+    names = list(values)
+    return [dict(zip(names, point)) for point in itertools.product(*(values[name] for name in names))]
+
+
+def analyse_file(audio_path, f0=None, disable_splitting=False, block_duration=None, block_overlap=2,
+                 resampler='resampy'):
+    """
+    The analysis `process` segments: pitch track, amplitude envelope and onset activations,
+    computed the same way as by the `crepe_notes` command (through the analysis cache).
+
+    Returns:
+        dict: 'freqs', 'conf', 'sr', 'filtered_amp_envelope' and 'onset_activations' (None if
+        `disable_splitting`).
+    """
+    default_f0_path = find_f0_file(audio_path)
+    run_pitch = default_f0_path is None and f0 is None
+    if block_duration:
+        sr, frequency, confidence, filtered_amp_envelope, onset_activations = analyse_blocks(
+            audio_path, block_duration, block_overlap, pitch=run_pitch, onsets=not disable_splitting,
+            resampler=resampler)
+    else:
+        with AudioContext(audio_path) as audio:
+            if run_pitch:
+                frequency, confidence = run_crepe(audio_path, resampler=resampler, audio=audio)
+            sr, _, filtered_amp_envelope, _ = load_audio(audio_path, True, audio)
+            onset_activations = None if disable_splitting else detect_onset_activations(audio_path, audio)
+    if not run_pitch:
+        frequency, confidence = parse_f0(default_f0_path if f0 is None else f0)
+    return dict(freqs=frequency, conf=confidence, sr=sr, filtered_amp_envelope=filtered_amp_envelope,
+                onset_activations=onset_activations)
+
+
+def score_notes(notes, ref_path, onset_tolerance=0.05):
+    """
+    Score notes against a reference MIDI file as `crepe_notes_eval` scores the MIDI file they
+    would be written to (up to the quantization of the note times to MIDI ticks).
+
+    Returns:
+        dict: The metrics of `mir_eval.transcription.evaluate`.
+    """
+    import mir_eval
+
+    notes = notes.filter(notes['start'] < notes['finish'])
+    est_intervals = np.column_stack((notes['start'], notes['finish'])).astype(float)
+    est_pitches = np.atleast_1d(pm.note_number_to_hz(notes['pitch'].astype(float)))
+    ref_intervals, ref_pitches = reference_notes(ref_path)
+    est_intervals, est_pitches = window_estimates(ref_intervals, est_intervals, est_pitches)
+    return dict(mir_eval.transcription.evaluate(ref_intervals, ref_pitches, est_intervals, est_pitches,
+                                                onset_tolerance=onset_tolerance))
+
+
+def sweep_file(job):
+    """
+    Analyse one file and segment and score it at every point of the grid.
+
+    Args:
+        job (tuple): (audio_path, ref_path, grid, process_kwargs, analysis_kwargs, onset_tolerance).
+
+    Returns:
+        tuple: (rows, timings, error), one dict of parameters and metrics per point of the grid,
+        the seconds spent analysing and segmenting/scoring and None, or None, None and the
+        traceback if it failed.
+    """
+    audio_path, ref_path, grid, process_kwargs, analysis_kwargs, onset_tolerance = job
+    try:
+        start = time.perf_counter()
+        analysis = analyse_file(audio_path, **analysis_kwargs)
+        timings = {'analysis': time.perf_counter() - start, 'segmentation': 0., 'scoring': 0.}
+        rows = []
+        for point in grid:
+            start = time.perf_counter()
+            # `process` removes the outliers of the envelope in place
+            notes, _ = process(analysis['freqs'], analysis['conf'], audio_path, None, sr=analysis['sr'],
+                               filtered_amp_envelope=analysis['filtered_amp_envelope'].copy(),
+                               onset_activations=analysis['onset_activations'], **process_kwargs, **point)
+            timings['segmentation'] += time.perf_counter() - start
+            start = time.perf_counter()
+            metrics = score_notes(notes, ref_path, onset_tolerance)
+            timings['scoring'] += time.perf_counter() - start
+            rows.append(dict({'file': str(audio_path), 'num_notes': len(notes)}, **point, **metrics))
+    except Exception:
+        return None, None, traceback.format_exc()
+    return rows, timings, None
+
+
+def _init_worker(cache_config):
+    analysis_cache.configure(*cache_config)
+
+
+def sweep(audio_files, grid, reference_dir=None, reference_suffix='.mid', output='sweep', jobs=1,
+          disable_splitting=False, tuning_offset=False, block_duration=None, block_overlap=2, resampler='resampy',
+          f0=None, onset_tolerance=0.05, cache_config=None):
+    """
+    Segment and score every file at every point of `grid`, and write the results.
+
+    Args:
+        audio_files (list of Path): Audio files.
+        grid (list of dict): Points of the grid, values of the parameters of `SWEEP_PARAMS`.
+        reference_dir (Path): Directory of the reference MIDI files, that of each audio file if None.
+        reference_suffix (str): The reference of `x.wav` is `x<reference_suffix>`.
+        output (str): Prefix of the output CSV files.
+        jobs (int): Number of worker processes, each of them sweeps one file at a time.
+        disable_splitting, tuning_offset: Fixed parameters of `process`.
+        block_duration, block_overlap, resampler, f0: How the files are analysed, see `crepe_notes --help`.
+        onset_tolerance (float): Onset tolerance of mir_eval in seconds.
+        cache_config (tuple): (directory, max_size, enabled) of the analysis cache in the workers.
+
+    Returns:
+        tuple: (rows, summary), the metrics of each file at each point, written to
+        `<output>.csv`, and the mean metrics over the files at each point, sorted by decreasing
+        onset F-measure (without offsets) and written to `<output>_summary.csv`.
+    """
+    process_kwargs = dict(disable_splitting=disable_splitting, tuning_offset=tuning_offset, use_cwd=True)
+    analysis_kwargs = dict(f0=f0, disable_splitting=disable_splitting, block_duration=block_duration,
+                           block_overlap=block_overlap, resampler=resampler)
+    job_list = []
+    for audio_path in audio_files:
+        audio_path = Path(audio_path)
+        ref_path = (Path(reference_dir) if reference_dir else audio_path.parent) / (audio_path.stem + reference_suffix)
+        if not ref_path.exists():
+            print(f"Pas de référence {ref_path} pour {audio_path}")
+            continue
+        job_list.append((audio_path, ref_path, grid, process_kwargs, analysis_kwargs, onset_tolerance))
+
+    if jobs > 1 and len(job_list) > 1:
+        if cache_config is None:
+            cache_config = (analysis_cache.cache.directory, analysis_cache.cache.max_size,
+                            analysis_cache.cache.enabled)
+        # spawn rather than fork, tensorflow and torch are not fork-safe
+        pool = multiprocessing.get_context('spawn').Pool(min(jobs, len(job_list)), initializer=_init_worker,
+                                                         initargs=(cache_config,))
+        results = pool.imap(sweep_file, job_list)
+    else:
+        pool = None
+        results = map(sweep_file, job_list)
+
+    rows = []
+    try:
+        for job, (file_rows, timings, error) in zip(job_list, results):
+            if error is not None:
+                print(f"Erreur lors du balayage de {job[0]} :\n{error}")
+                continue
+            print(f"{job[0]} : analyse {timings['analysis']:.2f} s, {len(grid)} points segmentés en "
+                  f"{timings['segmentation']:.2f} s et évalués en {timings['scoring']:.2f} s")
+            rows.extend(file_rows)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    param_columns = list(grid[0]) if grid else []
+    metric_columns = [column for column in (rows[0] if rows else {})
+                      if column not in ['file', 'num_notes'] + param_columns]
+    summary = []
+    for point in grid:
+        point_rows = [row for row in rows if all(row[name] == value for name, value in point.items())]
+        means = {s['metric']: s['mean'] for s in aggregate(point_rows, ['num_notes'] + metric_columns)}
+        summary.append(dict(point, num_files=len(point_rows), **means))
+    summary.sort(key=lambda s: -np.nan_to_num(s.get('F-measure_no_offset', np.nan), nan=-1))
+
+    write_csv(f"{output}.csv", rows, ['file'] + param_columns + ['num_notes'] + metric_columns)
+    write_csv(f"{output}_summary.csv", summary, param_columns + ['num_files', 'num_notes'] + metric_columns)
+    return rows, summary
+
+
+def _floats(text):
+    return [float(value) for value in text.split(',')]
+
+
+def _ints(text):
+    return [int(value) for value in text.split(',')]
+
+
+@click.command()
+@click.option('--sensitivity', default='0.001', show_default=True, help='Comma-separated values of --sensitivity')
+@click.option('--min-duration', default='0.03', show_default=True, help='Comma-separated values of --min-duration (seconds)')
+@click.option('--min-velocity', default='6', show_default=True, help='Comma-separated values of --min-velocity (0-127)')
+@click.option('--onset-threshold', default='0.6', show_default=True, help='Comma-separated values of --onset-threshold')
+@click.option('--reference-dir', type=click.Path(exists=True, file_okay=False), default=None, help='Directory of the reference MIDI files (default: that of each audio file)')
+@click.option('--reference-suffix', default='.mid', show_default=True, help='The reference of x.wav is x<suffix>')
+@click.option('--output', default='sweep', show_default=True, help='Prefix of the output CSV files')
+@click.option('--jobs', '-j', type=click.IntRange(1, None), default=1, help='Number of worker processes, one file per worker at a time')
+@click.option('--disable-splitting', is_flag=True, default=False, help='Disable detection of repeated notes via onset detection')
+@click.option('--tuning-offset', type=click.FloatRange(-100, 100, clamp=True), default=False, help='Tuning offset in cents, calculated automatically if not given')
+@click.option('--block-duration', type=click.IntRange(1, None), default=None, help='Analyse long recordings in blocks of this many seconds')
+@click.option('--block-overlap', type=click.IntRange(0, None), default=2)
+@click.option('--resampler', type=click.Choice(['resampy', 'kaiser_fast', 'polyphase']), default='resampy')
+@click.option('--onset-tolerance', type=click.FloatRange(0, None), default=0.05, show_default=True, help='Onset tolerance of the evaluation in seconds')
+@click.option('--cache-dir', default=analysis_cache.DEFAULT_CACHE_DIR, show_default=True, help='Directory of the analysis cache')
+@click.option('--no-cache', is_flag=True, default=False, help='Do not read or write the analysis cache')
+@click.argument('audio_path', type=click.Path(exists=True, path_type=Path))
+@click.help_option()
+def main(sensitivity, min_duration, min_velocity, onset_threshold, reference_dir, reference_suffix, output, jobs,
+         disable_splitting, tuning_offset, block_duration, block_overlap, resampler, onset_tolerance, cache_dir,
+         no_cache, audio_path):
+    """Sweep the segmentation parameters over the .wav files of AUDIO_PATH and score them against reference MIDI files."""
+    cache = analysis_cache.configure(cache_dir, enabled=not no_cache)
+    audio_files = sorted(audio_path.glob('*.wav')) if audio_path.is_dir() else [audio_path]
+    values = dict(sensitivity=_floats(sensitivity), min_duration=_floats(min_duration),
+                  min_velocity=_ints(min_velocity), onset_threshold=_floats(onset_threshold))
+    if disable_splitting:
+        values['onset_threshold'] = values['onset_threshold'][:1]
+    grid = parameter_grid(**values)
+    print(f"{len(audio_files)} fichier(s), {len(grid)} points")
+    _, summary = sweep(audio_files, grid, reference_dir, reference_suffix, output, jobs=jobs,
+                       disable_splitting=disable_splitting, tuning_offset=tuning_offset,
+                       block_duration=block_duration, block_overlap=block_overlap, resampler=resampler,
+                       onset_tolerance=onset_tolerance, cache_config=(cache.directory, cache.max_size, cache.enabled))
+    for s in summary[:5]:
+        print(', '.join(f"{name}={s[name]}" for name in SWEEP_PARAMS if name in s) +
+              f" : F-measure_no_offset {s.get('F-measure_no_offset', np.nan):.3f}")
+
+
+if __name__ == '__main__':
+    main()
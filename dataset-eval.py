@@ -1,86 +1,19 @@
-import mir_eval
-from pathlib import Path
-import pretty_midi as pm
-import numpy as np
-import pandas as pd
+"""
+Evaluate transcriptions against reference MIDI files.
 
+Kept for existing workflows, the evaluation lives in `crepe_notes/evaluation.py`
+(console script `crepe_notes_eval`). For example, to score the MT3 transcriptions
+`*.mt3.mid` against the references `*.mid` found under the current directory on
+4 processes::
 
-def evaluate(midi_path='*.crepe_notes.mid',
-             midi_replace_str='.crepe_notes.mid',
-             midi_replace_with='.mid',
-             output_label='crepe_notes'):
-    results = []
+    python dataset-eval.py --pattern '*.mt3.mid' --replace .mt3.mid --replace-with .mid --output-label mt3 -j 4
+"""
+import os
+import sys
 
-    merge_tracks = True
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crepe_notes'))
 
-    paths = sorted(Path('./').rglob(midi_path))
-    for path in paths:
-        print(f"{output_label}: {path}")
-        est_path = str(path)
-        ref_path = str(path).replace(midi_replace_str, midi_replace_with)
+from evaluation import evaluate, main  # noqa: E402,F401
 
-        ref = pm.PrettyMIDI(ref_path)
-        est = pm.PrettyMIDI(est_path)
-
-        ref_times = np.array([[n.start, n.end]
-                              for n in ref.instruments[0].notes])
-        ref_pitches = np.array(
-            [pm.note_number_to_hz(n.pitch) for n in ref.instruments[0].notes])
-
-        if merge_tracks:
-            est_times = np.array(
-                [[n.start, n.end]
-                 for inst_notes in map(lambda i: i.notes, est.instruments)
-                 for n in inst_notes])
-            est_pitches = np.array([
-                pm.note_number_to_hz(n.pitch)
-                for inst_notes in map(lambda i: i.notes, est.instruments)
-                for n in inst_notes
-            ])
-        else:
-            est_times = np.array([[n.start, n.end]
-                                  for n in est.instruments[0].notes])
-            est_pitches = np.array([
-                pm.note_number_to_hz(n.pitch) for n in est.instruments[0].notes
-            ])
-
-        first_ref_note = np.min(ref_times)
-        last_ref_note = np.max(ref_times)
-        est_times_valid_idxs = np.unique(
-            np.where((est_times > first_ref_note)
-                     & (est_times < last_ref_note))[0])
-
-        est_times = est_times[est_times_valid_idxs]
-        est_pitches = est_pitches[est_times_valid_idxs]
-
-        eval_result = mir_eval.transcription.evaluate(ref_times, ref_pitches,
-                                                      est_times, est_pitches,
-                                                      onset_tolerance=0.05)
-        eval_result['file'] = str(path)
-        results.append(eval_result)
-    df = pd.DataFrame(results)
-    df.to_pickle(f'{output_label}_eval.pkl')
-    pd.set_option('display.max_colwidth', None)
-    print(df.describe()[['Precision_no_offset', 'Recall_no_offset', 'F-measure_no_offset', 'Average_Overlap_Ratio_no_offset']])
-
-
-# evaluate('Sax.mt3.mid', '.mt3.mid', 'mt3')
-# evaluate('Sax.crepe_notes_amp_trimming.mid', '.crepe_notes_amp_trimming.mid', 'crepe_notes_amp_trimming')
-# evaluate('Sax_vamp_pyin_pyin_notes.mid', '_vamp_pyin_pyin_notes.mid', 'pyin_notes')
-# evaluate('Sax.crepe_notes_with_onsets.mid', '.crepe_notes_with_onsets.mid', 'crepe_notes_with_onsets')
-
-# evaluate('*_basic_pitch.mid', '_basic_pitch.mid', 'basic_pitch')
-# evaluate('*.mt3.mid', '.mt3.mid', 'mt3')
-# evaluate('*.cn_25ms_min.mid', '.cn_25ms_min.mid', 'crepe_notes-min-dur-25ms')
-# evaluate('*.crepe_notes-min-dur-11ms.mid', '.crepe_notes-min-dur-11ms.mid', 'crepe_notes-min-dur-11ms')
-# evaluate('*.crepe_notes-min-dur-11ms-no-tuning.mid',
-# evaluate('*.crepe_notes-min-dur-25ms-no-tuning.mid',
-#          '.crepe_notes-min-dur-25ms-no-tuning.mid',
-#          'crepe_notes-min-dur-25ms-no-tuning')
-# evaluate('*_vamp_pyin_pyin_notes.mid', '_vamp_pyin_pyin_notes.mid', 'pyin_notes')
-# evaluate('*.cn_transition_a.mid', '.cn_transition_a.mid', 'crepe_notes-transitions-a')
-
-# evaluate('bass.transcription.mid',  '.transcription.mid', '-fine-aligned.mid', 'filobass_cn_sens_2_min_50ms')
-evaluate('md-bass.mid',  'md-bass.mid', 'bass-fine-aligned.mid', 'melodyne_melodic')
-# evaluate('bass_basic_pitch.mid',  '_basic_pitch.mid', '-fine-aligned.mid', 'filobass_bp')
-# evaluate('bass_basic_pitch.mid',  '_basic_pitch.mid', 'filobass_cn')
+if __name__ == '__main__':
+    main()
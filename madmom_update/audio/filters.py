@@ -9,6 +9,9 @@ This module contains filter and filterbank related functionality.
 
 from __future__ import absolute_import, division, print_function
 
+import functools
+import threading
+
 import numpy as np
 from ..processors import Processor
 
@@ -583,6 +586,131 @@ NORM_FILTERS = True
 UNIQUE_FILTERS = True
 
 
+# number of adjacent bands filtered together by BandLimitedFilterbank
+FILTER_GROUP_SIZE = 16
+# fraction of the dense filterbank above which it is applied as a whole
+MAX_BAND_LIMITED_DENSITY = 0.5
+# number of filterbanks kept by cached_filterbank()
+FILTERBANK_CACHE_SIZE = 32
+# largest relative difference of BandLimitedFilterbank.filter() to np.dot()
+# for non-negative spectrograms and filterbanks
+BAND_LIMITED_RTOL = 1e-5
+
+
+class BandLimitedFilterbank(object):
+    """
+    Band-limited representation of a filterbank.
+
+    The filters of most filterbanks are non-zero only over a few bins, thus
+    filtering a spectrogram with the dense filterbank mostly multiplies with
+    zeros. This class stores for each band the range of bins it covers and
+    filters spectrograms using only these bins.
+
+    Parameters
+    ----------
+    filterbank : numpy array, shape (num_bins, num_bands)
+        Filterbank (e.g. a :class:`Filterbank` instance).
+    group_size : int, optional
+        Number of adjacent bands applied with one matrix product.
+
+    Attributes
+    ----------
+    starts : numpy array, shape (num_bands, )
+        First non-zero bin of each band.
+    stops : numpy array, shape (num_bands, )
+        Bin after the last non-zero bin of each band (`starts` and `stops` are
+        both 0 for empty bands).
+    weights : list of numpy arrays
+        Weights of each band, i.e. ``filterbank[start:stop, band]``.
+
+    Notes
+    -----
+    Adjacent bands are grouped, each group is applied as a dense matrix
+    product restricted to the bins spanned by its bands. If these products
+    cover more than half of the filterbank (e.g. for filterbanks with wide
+    bands), the filterbank is applied as a whole.
+
+    The results are not bit-identical to ``np.dot(spectrogram, filterbank)``,
+    since the sums are computed in a different order (the same holds for
+    `np.dot` itself with different BLAS libraries or array layouts). For
+    non-negative spectrograms and filterbanks (e.g. magnitude spectrograms
+    and the filterbanks of this module) the relative difference of each value
+    is below `BAND_LIMITED_RTOL` (1e-5, about 100 times the float32
+    resolution); with float32 data it is typically below 1e-6. See
+    benchmarks/bench_filterbank.py.
+
+    The representation is a copy, it does not follow later changes of the
+    `filterbank` values.
+
+    """
+
+    def __init__(self, filterbank, group_size=FILTER_GROUP_SIZE):
+        filterbank = np.asarray(filterbank)
+        if filterbank.ndim != 2:
+            raise ValueError('filterbank must be a 2D numpy array')
+        num_bins, num_bands = filterbank.shape
+        self.num_bins = num_bins
+        self.num_bands = num_bands
+        self.dtype = filterbank.dtype
+        # non-zero range of the bands
+        non_zero = filterbank != 0
+        used = non_zero.any(axis=0)
+        self.starts = np.where(used, np.argmax(non_zero, axis=0), 0)
+        self.stops = np.where(used, num_bins - np.argmax(non_zero[::-1],
+                                                         axis=0), 0)
+        self.weights = [filterbank[start:stop, band].copy() for band, (start,
+                        stop) in enumerate(zip(self.starts, self.stops))]
+        # group adjacent bands, each group covers the range of its bands
+        self.groups = []
+        size = 0
+        for first in range(0, num_bands, group_size):
+            last = min(first + group_size, num_bands)
+            group = used[first:last]
+            if not group.any():
+                continue
+            start = self.starts[first:last][group].min()
+            stop = self.stops[first:last][group].max()
+            self.groups.append((first, last, start, stop, np.ascontiguousarray(
+                filterbank[start:stop, first:last])))
+            size += (stop - start) * (last - first)
+        # apply the dense filterbank if the groups cover most of it
+        self.dense = None
+        if size > MAX_BAND_LIMITED_DENSITY * num_bins * num_bands:
+            self.dense = np.ascontiguousarray(filterbank)
+            self.groups = []
+
+    def filter(self, spectrogram):
+        """
+        Filter the spectrogram.
+
+        Parameters
+        ----------
+        spectrogram : numpy array, shape (num_frames, num_bins)
+            Spectrogram (or a single frame) to be filtered.
+
+        Returns
+        -------
+        filtered : numpy array, shape (num_frames, num_bands)
+            Filtered spectrogram, i.e. ``np.dot(spectrogram, filterbank)``
+            within `BAND_LIMITED_RTOL`.
+
+        """
+        spectrogram = np.asarray(spectrogram)
+        if self.dense is not None:
+            return np.dot(spectrogram, self.dense)
+        if spectrogram.shape[-1] != self.num_bins:
+            raise ValueError('spectrogram has %d bins, filterbank %d' %
+                             (spectrogram.shape[-1], self.num_bins))
+        filtered = np.zeros(spectrogram.shape[:-1] + (self.num_bands, ),
+                            dtype=np.result_type(spectrogram, self.dtype))
+        for first, last, start, stop, weights in self.groups:
+            # Note: np.dot() copies the non-contiguous slice, np.matmul()
+            #       passes its strides to BLAS
+            filtered[..., first:last] = np.matmul(
+                spectrogram[..., start:stop], weights)
+        return filtered
+
+
 class Filterbank(np.ndarray):
     """
     Generic filterbank class.
@@ -714,6 +842,44 @@ class Filterbank(np.ndarray):
         # create Filterbank and cast as class where this method was called from
         return Filterbank.__new__(cls, fb, bin_frequencies)
 
+    def band_limited(self):
+        """
+        Band-limited representation of the filterbank.
+
+        Returns
+        -------
+        band_limited : :class:`BandLimitedFilterbank` instance
+            Band-limited representation, created on first use.
+
+        """
+        band_limited = getattr(self, '_band_limited', None)
+        if band_limited is None:
+            band_limited = BandLimitedFilterbank(self)
+            self._band_limited = band_limited
+        return band_limited
+
+    def filter(self, spectrogram):
+        """
+        Filter a spectrogram with the filterbank.
+
+        Only the non-zero range of each band is used, see
+        :class:`BandLimitedFilterbank`. The result equals
+        ``np.dot(spectrogram, self)`` within a relative difference of
+        `BAND_LIMITED_RTOL` for non-negative spectrograms.
+
+        Parameters
+        ----------
+        spectrogram : numpy array, shape (num_frames, num_bins)
+            Spectrogram to be filtered.
+
+        Returns
+        -------
+        filtered : numpy array, shape (num_frames, num_bands)
+            Filtered spectrogram.
+
+        """
+        return self.band_limited().filter(spectrogram)
+
     @property
     def num_bins(self):
         """Number of bins."""
@@ -801,7 +967,7 @@ class FilterbankProcessor(Processor, Filterbank):
         """
         # Note: we do not inherit from Processor, since instantiation gets
         #       messed up
-        return np.dot(data, self)
+        return self.filter(data)
 
     @staticmethod
     def add_arguments(parser, filterbank=None, num_bands=None,
@@ -1073,6 +1239,59 @@ class LogarithmicFilterbank(Filterbank):
 LogFilterbank = LogarithmicFilterbank
 
 
+_FILTERBANK_CACHE_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=FILTERBANK_CACHE_SIZE)
+def _cached_filterbank(filterbank, num_bins, sample_rate, kwargs):
+    from .stft import fft_frequencies
+    obj = filterbank(fft_frequencies(num_bins, sample_rate), **dict(kwargs))
+    obj.flags.writeable = False
+    return obj
+
+
+def cached_filterbank(filterbank, num_bins, sample_rate, **kwargs):
+    """
+    Filterbank for the bins of a STFT, shared by all callers.
+
+    Parameters
+    ----------
+    filterbank : :class:`Filterbank` class
+        Filterbank type, e.g. :class:`MelFilterbank`.
+    num_bins : int
+        Number of bins of the STFT.
+    sample_rate : float
+        Sample rate of the signal [Hz].
+    kwargs : dict, optional
+        Keyword arguments passed to `filterbank` (e.g. `num_bands`, `fmin`,
+        `fmax`, `norm_filters`, `unique_filters`).
+
+    Returns
+    -------
+    filterbank : :class:`Filterbank` instance
+        Read-only filterbank for the bin frequencies of the STFT.
+
+    Notes
+    -----
+    The filterbanks are built once per type, number of bins, sample rate and
+    arguments and kept in a cache of :data:`FILTERBANK_CACHE_SIZE` entries,
+    so that processors created anew (e.g. for every file) do not build them
+    again; it is safe to use from several threads.
+    ``cached_filterbank.cache_info()`` returns the statistics of the
+    cache, ``cached_filterbank.cache_clear()`` empties it.
+
+    """
+    # Note: the lock makes concurrent callers wait for the same filterbank
+    #       instead of building it several times
+    with _FILTERBANK_CACHE_LOCK:
+        return _cached_filterbank(filterbank, num_bins, sample_rate,
+                                  tuple(sorted(kwargs.items())))
+
+
+cached_filterbank.cache_info = _cached_filterbank.cache_info
+cached_filterbank.cache_clear = _cached_filterbank.cache_clear
+
+
 class RectangularFilterbank(Filterbank):
     """
     Rectangular filterbank class.
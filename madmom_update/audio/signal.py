@@ -502,8 +502,9 @@ class Signal(np.ndarray):
 
     Parameters
     ----------
-    data : numpy array, str or file handle
-        Signal data or file name or file handle.
+    data : numpy array, str, file handle or WaveFile
+        Signal data or file name or file handle or memory-mapped wave file
+        (see :class:`madmom.io.audio.WaveFile`).
     sample_rate : int, optional
         Desired sample rate of the signal [Hz], or 'None' to return the
         signal in its original rate.
@@ -589,7 +590,16 @@ class Signal(np.ndarray):
     def __new__(cls, data, sample_rate=SAMPLE_RATE, num_channels=NUM_CHANNELS,
                 start=START, stop=STOP, norm=NORM, gain=GAIN, dtype=DTYPE,
                 **kwargs):
-        from ..io.audio import load_audio_file
+        from ..io.audio import load_audio_file, WaveFile
+        # memory-mapped wave file, read only the requested part at its own
+        # sample rate (and re-sample it below if needed)
+        if isinstance(data, WaveFile):
+            data = Signal(load_audio_file(data, num_channels=num_channels,
+                                          start=start, stop=stop,
+                                          dtype=dtype)[0],
+                          sample_rate=data.sample_rate)
+            if sample_rate is None:
+                sample_rate = data.sample_rate
         # try to load an audio file if the data is not a numpy array
         if not isinstance(data, np.ndarray):
             data, sample_rate = load_audio_file(data, sample_rate=sample_rate,
@@ -937,7 +947,7 @@ class FramedSignal(object):
 
     Parameters
     ----------
-    signal : :class:`Signal` instance
+    signal : :class:`Signal` or :class:`madmom.io.audio.WaveFile` instance
         Signal to be split into frames.
     frame_size : int, optional
         Size of one frame [samples].
@@ -1063,8 +1073,11 @@ class FramedSignal(object):
                  fps=FPS, origin=ORIGIN, end=END_OF_SIGNAL,
                  num_frames=NUM_FRAMES, **kwargs):
 
+        from ..io.audio import WaveFile
         # signal handling
-        if not isinstance(signal, Signal):
+        # Note: a WaveFile is framed lazily, i.e. the frames are read from
+        #       the memory-mapped file and converted only when accessed
+        if not isinstance(signal, (Signal, WaveFile)):
             # try to instantiate a Signal
             signal = Signal(signal, **kwargs)
 
@@ -1113,6 +1126,8 @@ class FramedSignal(object):
                 raise ValueError("end of signal handling '%s' unknown" %
                                  end)
         self.num_frames = int(num_frames)
+        # signal padded for all frames, see as_strided()
+        self._padded = None
 
     # make the object indexable / iterable
     def __getitem__(self, index):
@@ -1159,6 +1174,119 @@ class FramedSignal(object):
     def __len__(self):
         return self.num_frames
 
+    def _frame_starts(self, start, stop):
+        """First samples of the frames `start` to `stop` (as signal_frame)."""
+        ref_samples = (np.arange(start, stop) * self.hop_size).astype(int)
+        return ref_samples - self.frame_size // 2 - int(self.origin)
+
+    def _samples(self, start, stop):
+        """
+        Samples `start` to `stop` of the signal, zero-padded where they fall
+        outside of it. Returns a view of the signal if no padding is needed.
+
+        """
+        num_samples = len(self.signal)
+        if 0 <= start and stop <= num_samples:
+            return np.asarray(self.signal[start:stop])
+        samples = np.zeros((stop - start, ) + tuple(self.signal.shape[1:]),
+                           dtype=self.signal.dtype)
+        first, last = max(start, 0), min(stop, num_samples)
+        if first < last:
+            samples[first - start:last - start] = self.signal[first:last]
+        return samples
+
+    def _frames(self, start, stop, samples=None):
+        """
+        Frames `start` to `stop` as a read-only strided view of the samples
+        covering them (or a copy of it if the hop size is not an integer).
+
+        """
+        starts = self._frame_starts(start, stop)
+        shape = (len(starts), self.frame_size) + tuple(self.signal.shape[1:])
+        if not len(starts):
+            return np.zeros(shape, dtype=self.signal.dtype)
+        if samples is None:
+            samples = self._samples(starts[0], starts[-1] + self.frame_size)
+            offsets = starts - starts[0]
+        else:
+            offsets = starts - self._frame_starts(0, 1)[0]
+        hops = np.unique(np.diff(offsets))
+        if len(hops) <= 1:
+            hop = int(hops[0]) if len(hops) else 0
+            return np.lib.stride_tricks.as_strided(
+                samples[offsets[0]:], shape=shape,
+                strides=(hop * samples.strides[0], ) + samples.strides,
+                writeable=False)
+        # frames are not equally spaced, view all possible frames and select
+        frames = np.lib.stride_tricks.as_strided(
+            samples, shape=(len(samples) - self.frame_size + 1, ) + shape[1:],
+            strides=(samples.strides[0], ) + samples.strides, writeable=False)
+        frames = frames[offsets]
+        frames.flags.writeable = False
+        return frames
+
+    def as_strided(self):
+        """
+        All frames as a read-only view of the signal.
+
+        The signal is padded once with zeros at its edges (this padded copy is
+        kept), the frames are then a strided view of it, i.e. no frame is
+        copied.
+
+        Returns
+        -------
+        frames : numpy array, shape (num_frames, frame_size[, num_channels])
+            Read-only view of all frames.
+
+        Raises
+        ------
+        ValueError
+            If the hop size is not an integer, since frames which are not
+            equally spaced can not be a strided view.
+
+        """
+        if self.hop_size != int(self.hop_size):
+            raise ValueError('frames can only be a strided view of the signal '
+                             'if the hop size is an integer, use iter_blocks()'
+                             ' instead.')
+        if self.num_frames <= 0:
+            return self._frames(0, 0)
+        padded = self._padded
+        if padded is None:
+            start = self._frame_starts(0, 1)[0]
+            stop = self._frame_starts(self.num_frames - 1,
+                                      self.num_frames)[0] + self.frame_size
+            # always copy, the padded signal must not be a view of the signal
+            padded = np.array(self._samples(start, stop))
+            self._padded = padded
+        return self._frames(0, self.num_frames, padded)
+
+    def iter_blocks(self, block_size):
+        """
+        Iterate over the frames in blocks of (at most) `block_size` frames.
+
+        Only the samples covered by a block are read from the signal (e.g. a
+        memory-mapped :class:`madmom.io.audio.WaveFile`) and padded with
+        zeros if the block reaches outside the signal; the frames of a block
+        are a read-only strided view of these samples, i.e. blocks inside the
+        signal do not copy any data if the hop size is an integer.
+
+        Parameters
+        ----------
+        block_size : int
+            Number of frames per block.
+
+        Yields
+        ------
+        frames : numpy array, shape (block_size, frame_size[, num_channels])
+            Read-only frames; the last block may contain fewer frames.
+
+        """
+        block_size = max(1, int(block_size))
+        for start in range(0, self.num_frames, block_size):
+            yield self._frames(start, min(start + block_size,
+                                          self.num_frames))
+
     @property
     def frame_rate(self):
         """Frame rate (same as fps)."""
@@ -13,8 +13,9 @@ import inspect
 import numpy as np
 
 from ..processors import Processor, SequentialProcessor, BufferProcessor
-from .filters import (Filterbank, LogarithmicFilterbank, NUM_BANDS, FMIN, FMAX,
-                      A4, NORM_FILTERS, UNIQUE_FILTERS)
+from .filters import (BandLimitedFilterbank, Filterbank,
+                      LogarithmicFilterbank, NUM_BANDS, FMIN, FMAX, A4,
+                      NORM_FILTERS, UNIQUE_FILTERS, cached_filterbank)
 
 
 def spec(stft):
@@ -302,15 +303,24 @@ class FilteredSpectrogram(Spectrogram):
         # instantiate a Filterbank if needed
         if inspect.isclass(filterbank) and issubclass(filterbank, Filterbank):
             # a Filterbank class is given, create a filterbank of this type
-            filterbank = filterbank(spectrogram.bin_frequencies,
-                                    num_bands=num_bands, fmin=fmin, fmax=fmax,
-                                    fref=fref, norm_filters=norm_filters,
-                                    unique_filters=unique_filters)
+            args = dict(num_bands=num_bands, fmin=fmin, fmax=fmax, fref=fref,
+                        norm_filters=norm_filters,
+                        unique_filters=unique_filters)
+            try:
+                # share the filterbank with all STFTs with the same bins
+                sample_rate = spectrogram.stft.frames.signal.sample_rate
+            except AttributeError:
+                sample_rate = None
+            if sample_rate is None:
+                filterbank = filterbank(spectrogram.bin_frequencies, **args)
+            else:
+                filterbank = cached_filterbank(
+                    filterbank, spectrogram.num_bins, sample_rate, **args)
         if not isinstance(filterbank, Filterbank):
             raise TypeError('not a Filterbank type or instance: %s' %
                             filterbank)
         # filter the spectrogram
-        data = np.dot(spectrogram, filterbank)
+        data = filterbank.filter(spectrogram)
         # cast as FilteredSpectrogram
         obj = np.asarray(data).view(cls)
         # save additional attributes
@@ -1250,7 +1260,7 @@ class MultiBandSpectrogram(FilteredSpectrogram):
                                            norm_filters=norm_filters,
                                            unique_filters=unique_filters)
         # filter the spectrogram
-        data = np.dot(spectrogram, filterbank)
+        data = filterbank.filter(spectrogram)
         # cast as FilteredSpectrogram
         obj = np.asarray(data).view(cls)
         # save additional attributes
@@ -1330,6 +1340,243 @@ class MultiBandSpectrogramProcessor(Processor):
         return MultiBandSpectrogram(data, **args)
 
 
+def multi_resolution_spectrograms(frames, filterbanks, powers=(1, ),
+                                  window=np.hanning, block_size=None):
+    """
+    Filtered spectrograms of a signal framed with several frame sizes,
+    computed in a single pass over the signal.
+
+    Parameters
+    ----------
+    frames : list of :class:`.audio.signal.FramedSignal` instances
+        The signal, framed with the different frame sizes (all with the same
+        number of frames).
+    filterbanks : list of lists of numpy arrays
+        For each of the `frames`, one filterbank per output, with shape
+        (frame_size / 2, num_bands).
+    powers : list of floats, optional
+        For each output, the exponent applied to the magnitudes before they
+        are filtered (1 for magnitude, 2 for power spectrograms).
+    window : numpy ufunc or list, optional
+        Window function, or one window function per output.
+    block_size : int, optional
+        Number of frames processed at once, see
+        :func:`.audio.stft.stft`.
+
+    Returns
+    -------
+    spectrograms : list of lists of numpy arrays
+        For each output, the filtered spectrograms of all `frames`, with
+        shape (num_frames, num_bands).
+
+    Notes
+    -----
+    The frames of all frame sizes are processed block by block; the STFTs
+    and magnitude spectrograms of a block are discarded once they are
+    filtered, only the filtered spectrograms are kept.
+
+    Outputs with the same window share the STFT, one STFT is computed per
+    frame size and distinct window (and none for windows whose outputs
+    have no bands for this frame size).
+
+    """
+    from .stft import cached_window, stft, STFT_BLOCK_SIZE
+    block_size = block_size or STFT_BLOCK_SIZE
+    num_frames = len(frames[0])
+    if any(len(f) != num_frames for f in frames):
+        raise ValueError('all frames must have the same number of frames.')
+    num_outputs = len(filterbanks[0])
+    if not isinstance(window, (list, tuple)):
+        window = [window] * num_outputs
+    if len(window) != num_outputs:
+        raise ValueError('one window per output needed.')
+    # group the outputs by window, each group shares the STFT
+    unique = []
+    for w in window:
+        if not any(w is u for u in unique):
+            unique.append(w)
+    groups = [[i for i, w in enumerate(window) if w is u] for u in unique]
+    windows = []
+    for f in frames:
+        # scale the window if the signal is not scaled (as the STFT does)
+        try:
+            max_range = float(np.iinfo(f.signal.dtype).max)
+        except ValueError:
+            max_range = None
+        fft_windows = []
+        for w in unique:
+            if hasattr(w, '__call__'):
+                fft_windows.append(cached_window(w, f.frame_size, max_range))
+            else:
+                fft_windows.append(w if max_range is None else w / max_range)
+        windows.append(fft_windows)
+    # only the non-zero range of the filter bands is used
+    filterbanks = [[filterbank.band_limited()
+                    if isinstance(filterbank, Filterbank)
+                    else BandLimitedFilterbank(filterbank)
+                    for filterbank in fbs] for fbs in filterbanks]
+    outputs = [[np.empty((num_frames, filterbank.num_bands), np.float32)
+                for filterbank in fbs] for fbs in filterbanks]
+    start = 0
+    for blocks in zip(*[f.iter_blocks(block_size) for f in frames]):
+        num = len(blocks[0])
+        for block, fft_windows, fbs, specs in zip(blocks, windows,
+                                                  filterbanks, outputs):
+            for fft_window, group in zip(fft_windows, groups):
+                if not any(fbs[i].num_bands for i in group):
+                    continue
+                spec = np.abs(stft(block, fft_window, block_size=block_size))
+                for i in group:
+                    data = spec if powers[i] == 1 else spec ** powers[i]
+                    specs[i][start:start + num] = fbs[i].filter(data)
+        start += num
+    return [list(specs) for specs in zip(*outputs)]
+
+
+class MultiResolutionSpectrogramProcessor(Processor):
+    """
+    Logarithmic filtered spectrograms of a signal for several frame sizes,
+    computed in a single pass over the signal.
+
+    Parameters
+    ----------
+    frame_sizes : list of ints, optional
+        Frame sizes [samples], the spectrograms are returned in this order.
+    fps : float, optional
+        Frames per second.
+    filterbank : :class:`.audio.filters.Filterbank`, optional
+        Filterbank type used to filter the spectrograms.
+    num_bands : int, optional
+        Number of filter bands (per octave, depending on the type of the
+        `filterbank`).
+    fmin : float, optional
+        Minimum frequency of the filterbank [Hz].
+    fmax : float, optional
+        Maximum frequency of the filterbank [Hz].
+    fref : float, optional
+        Tuning frequency of the filterbank [Hz].
+    norm_filters : bool, optional
+        Normalize the filters of the filterbank to area 1.
+    unique_filters : bool, optional
+        Keep only unique filters in the filterbank.
+    log : numpy ufunc, optional
+        Logarithmic scaling function to apply.
+    mul : float, optional
+        Multiply the magnitude spectrogram with this factor before taking the
+        logarithm.
+    add : float, optional
+        Add this value before taking the logarithm of the magnitudes.
+    block_size : int, optional
+        Number of frames processed at once.
+
+    Notes
+    -----
+    This computes the same spectrograms as a :class:`ParallelProcessor` of
+    one (FramedSignalProcessor, ShortTimeFourierTransformProcessor,
+    FilteredSpectrogramProcessor, LogarithmicSpectrogramProcessor) chain per
+    frame size, but frames the signal only once per block of frames and keeps
+    only the filtered spectrograms. The filterbanks are created once per
+    sample rate and frame size.
+
+    """
+
+    def __init__(self, frame_sizes=(1024, 2048, 4096), fps=100,
+                 filterbank=FILTERBANK, num_bands=NUM_BANDS, fmin=FMIN,
+                 fmax=FMAX, fref=A4, norm_filters=NORM_FILTERS,
+                 unique_filters=UNIQUE_FILTERS, log=LOG, mul=MUL, add=ADD,
+                 block_size=None, **kwargs):
+        # pylint: disable=unused-argument
+        self.frame_sizes = list(frame_sizes)
+        self.fps = fps
+        self.filterbank = filterbank
+        self.num_bands = num_bands
+        self.fmin = fmin
+        self.fmax = fmax
+        self.fref = fref
+        self.norm_filters = norm_filters
+        self.unique_filters = unique_filters
+        self.log = log
+        self.mul = mul
+        self.add = add
+        self.block_size = block_size
+
+    def get_filterbank(self, sample_rate, frame_size):
+        """
+        Filterbank for spectrograms of the given frame size.
+
+        Parameters
+        ----------
+        sample_rate : float
+            Sample rate of the signal.
+        frame_size : int
+            Frame size [samples].
+
+        Returns
+        -------
+        filterbank : :class:`.audio.filters.Filterbank` instance
+            Read-only filterbank, see :func:`.audio.filters.cached_filterbank`.
+
+        """
+        return cached_filterbank(
+            self.filterbank, frame_size >> 1, sample_rate,
+            num_bands=self.num_bands, fmin=self.fmin, fmax=self.fmax,
+            fref=self.fref, norm_filters=self.norm_filters,
+            unique_filters=self.unique_filters)
+
+    def scale(self, spectrogram):
+        """
+        Scale a filtered spectrogram logarithmically (in-place).
+
+        Parameters
+        ----------
+        spectrogram : numpy array
+            Filtered spectrogram.
+
+        Returns
+        -------
+        spectrogram : numpy array
+            Logarithmically scaled spectrogram.
+
+        """
+        if self.mul is not None:
+            spectrogram *= self.mul
+        if self.add is not None:
+            spectrogram += self.add
+        if self.log is not None:
+            self.log(spectrogram, spectrogram)
+        return spectrogram
+
+    def process(self, data, **kwargs):
+        """
+        Compute the logarithmic filtered spectrograms of the signal.
+
+        Parameters
+        ----------
+        data : :class:`.audio.signal.Signal` instance
+            Signal (or anything a :class:`.audio.signal.Signal` can be
+            instantiated from).
+        kwargs : dict, optional
+            Keyword arguments passed to :class:`.audio.signal.Signal`.
+
+        Returns
+        -------
+        spectrograms : list of numpy arrays
+            Logarithmic filtered spectrograms, one per frame size, with shape
+            (num_frames, num_bands).
+
+        """
+        from .signal import FramedSignal, Signal
+        if not isinstance(data, Signal):
+            data = Signal(data, **kwargs)
+        frames = [FramedSignal(data, frame_size=frame_size, fps=self.fps)
+                  for frame_size in self.frame_sizes]
+        filterbanks = [[self.get_filterbank(data.sample_rate, f.frame_size)]
+                       for f in frames]
+        spectrograms = multi_resolution_spectrograms(
+            frames, filterbanks, block_size=self.block_size)[0]
+        return [self.scale(spec) for spec in spectrograms]
+
+
 class SemitoneBandpassSpectrogram(FilteredSpectrogram):
     """
     Construct a semitone spectrogram by using a time domain filterbank of
@@ -9,10 +9,13 @@ This module contains Short-Time Fourier Transform (STFT) related functionality.
 
 from __future__ import absolute_import, division, print_function
 
+import functools
+import itertools
+import threading
 import warnings
 
 import numpy as np
-import scipy.fftpack as fftpack
+from scipy.fft import rfft
 
 try:
     from pyfftw.builders import rfft as rfft_builder
@@ -24,6 +27,9 @@ from ..processors import Processor
 from .signal import Signal, FramedSignal
 
 STFT_DTYPE = np.complex64
+STFT_BLOCK_SIZE = 512
+# number of windows kept by cached_window()
+WINDOW_CACHE_SIZE = 32
 
 
 def fft_frequencies(num_fft_bins, sample_rate):
@@ -46,8 +52,92 @@ def fft_frequencies(num_fft_bins, sample_rate):
     return np.fft.fftfreq(num_fft_bins * 2, 1. / sample_rate)[:num_fft_bins]
 
 
+_WINDOW_CACHE_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=WINDOW_CACHE_SIZE)
+def _cached_window(window, frame_size, max_range):
+    data = window(frame_size)
+    if max_range is not None:
+        data = data / max_range
+    data.flags.writeable = False
+    return data
+
+
+def cached_window(window, frame_size, max_range=None):
+    """
+    Window of the given size, shared by all callers.
+
+    Parameters
+    ----------
+    window : numpy ufunc
+        Window function (e.g. `np.hanning`).
+    frame_size : int
+        Size of the window.
+    max_range : float, optional
+        Divide the window by this value (the maximum value of an integer
+        signal, see :class:`ShortTimeFourierTransform`).
+
+    Returns
+    -------
+    window : numpy array
+        Read-only window.
+
+    Notes
+    -----
+    The windows are computed once per window function, size and scaling and
+    kept in a cache of :data:`WINDOW_CACHE_SIZE` entries, statistics are
+    returned by ``cached_window.cache_info()``; it is safe to use from
+    several threads. Window functions which can not be hashed are called
+    each time.
+
+    """
+    try:
+        with _WINDOW_CACHE_LOCK:
+            return _cached_window(window, frame_size, max_range)
+    except TypeError:
+        # unhashable window function
+        data = window(frame_size)
+        return data if max_range is None else data / max_range
+
+
+cached_window.cache_info = _cached_window.cache_info
+cached_window.cache_clear = _cached_window.cache_clear
+
+
+def _frame_blocks(frames, block_size):
+    """
+    Yield consecutive blocks of at most `block_size` frames as 2D arrays.
+
+    """
+    if hasattr(frames, 'iter_blocks'):
+        # e.g. a FramedSignal, its blocks are strided views of the signal
+        for block in frames.iter_blocks(block_size):
+            yield block
+        return
+    if isinstance(frames, np.ndarray):
+        for start in range(0, len(frames), block_size):
+            yield frames[start:start + block_size]
+        return
+    # other iterables (e.g. a FramedSignal) return one frame at a time, copy
+    # these into a buffer which is reused for all blocks
+    buffer = None
+    frames = iter(frames)
+    while True:
+        num = 0
+        for frame in itertools.islice(frames, block_size):
+            if buffer is None:
+                buffer = np.empty((block_size, ) + np.shape(frame),
+                                  np.asarray(frame).dtype)
+            buffer[num] = frame
+            num += 1
+        if num == 0:
+            return
+        yield buffer[:num]
+
+
 def stft(frames, window, fft_size=None, circular_shift=False,
-         include_nyquist=False, fftw=None):
+         include_nyquist=False, fftw=None, block_size=STFT_BLOCK_SIZE):
     """
     Calculates the complex Short-Time Fourier Transform (STFT) of the given
     framed signal.
@@ -69,13 +159,22 @@ def stft(frames, window, fft_size=None, circular_shift=False,
         Include the Nyquist frequency bin (sample rate / 2) in returned STFT.
     fftw : :class:`pyfftw.FFTW` instance, optional
         If a :class:`pyfftw.FFTW` object is given it is used to compute the
-        STFT with the FFTW library. Requires 'pyfftw'.
+        STFT with the FFTW library. Requires 'pyfftw'. It must be planned for
+        real input of shape (block_size, fft_size), see :func:`fftw_plan`.
+    block_size : int, optional
+        Number of frames transformed at once; bounds the memory needed for
+        the windowed frames and their spectra.
 
     Returns
     -------
     stft : numpy array, shape (num_frames, frame_size)
         The complex STFT of the framed signal.
 
+    Notes
+    -----
+    The frames are windowed and transformed in blocks of `block_size` frames
+    with a single real FFT along the last axis.
+
     """
     # check for correct shape of input
     if frames.ndim != 2:
@@ -93,6 +192,7 @@ def stft(frames, window, fft_size=None, circular_shift=False,
     num_fft_bins = fft_size >> 1
     if include_nyquist:
         num_fft_bins += 1
+    block_size = max(1, int(block_size))
 
     # size of the FFT circular shift (needed for correct phase)
     if circular_shift:
@@ -101,38 +201,76 @@ def stft(frames, window, fft_size=None, circular_shift=False,
     # init objects
     data = np.empty((num_frames, num_fft_bins), STFT_DTYPE)
 
-    # iterate over all frames
-    for f, frame in enumerate(frames):
+    # iterate over blocks of frames
+    start = 0
+    for block in _frame_blocks(frames, block_size):
+        num = len(block)
+        # multiply the signal frames with the window (or just use them as
+        # they are if no window function is given)
+        if window is not None:
+            signal = np.multiply(block, window)
+        else:
+            signal = block
         if circular_shift:
-            # if we need to circular shift the signal for correct phase, we
-            # first multiply the signal frame with the window (or just use it
-            # as it is if no window function is given)
-            if window is not None:
-                signal = np.multiply(frame, window)
-            else:
-                signal = frame
-            # then swap the two halves of the windowed signal; if the FFT size
-            # is bigger than the frame size, we need to pad the (windowed)
-            # signal with additional zeros in between the two halves
-            fft_signal = np.zeros(fft_size)
-            fft_signal[:fft_shift] = signal[fft_shift:]
-            fft_signal[-fft_shift:] = signal[:fft_shift]
+            # swap the two halves of the windowed signal; if the FFT size is
+            # bigger than the frame size, we need to pad the (windowed) signal
+            # with additional zeros in between the two halves
+            fft_signal = np.zeros((num, fft_size))
+            fft_signal[:, :fft_shift] = signal[:, fft_shift:]
+            fft_signal[:, -fft_shift:] = signal[:, :fft_shift]
         else:
-            # multiply the signal frame with the window and or save it directly
-            # to fft_signal (i.e. bypass the additional copying step above)
-            if window is not None:
-                fft_signal = np.multiply(frame, window)
-            else:
-                fft_signal = frame
+            # zero-padding or truncation to the FFT size is done by the FFT
+            fft_signal = signal
         # perform DFT
         if fftw:
-            data[f] = fftw(fft_signal)[:num_fft_bins]
+            if fft_signal.shape != (block_size, fft_size):
+                # the plan has a fixed shape, zero-pad (or truncate) the block
+                padded = np.zeros((block_size, fft_size), fft_signal.dtype)
+                size = min(fft_size, fft_signal.shape[1])
+                padded[:num, :size] = fft_signal[:, :size]
+                fft_signal = padded
+            data[start:start + num] = fftw(fft_signal)[:num, :num_fft_bins]
         else:
-            data[f] = fftpack.fft(fft_signal, fft_size, axis=0)[:num_fft_bins]
+            data[start:start + num] = rfft(fft_signal, fft_size,
+                                           axis=-1)[:, :num_fft_bins]
+        start += num
     # return STFT
     return data
 
 
+def fftw_plan(fft_size, dtype=np.float64, block_size=STFT_BLOCK_SIZE,
+              fftw=None):
+    """
+    Plan the real FFTs of blocks of frames with the FFTW library.
+
+    Parameters
+    ----------
+    fft_size : int
+        FFT size.
+    dtype : numpy dtype, optional
+        Data type of the (windowed) frames; FFTW plans single or double
+        precision FFTs, other types are planned as double precision.
+    block_size : int, optional
+        Number of frames transformed at once.
+    fftw : :class:`pyfftw.FFTW` instance, optional
+        Existing plan; it is returned as is if it fits the other parameters.
+
+    Returns
+    -------
+    fftw : :class:`pyfftw.FFTW` instance or None
+        Plan for real input of shape (block_size, fft_size), 'None' if
+        'pyfftw' is not available.
+
+    """
+    if np.dtype(dtype) != np.float32:
+        dtype = np.float64
+    shape = (max(1, int(block_size)), int(fft_size))
+    if fftw is not None and tuple(fftw.input_shape) == shape and \
+            fftw.input_dtype == np.dtype(dtype):
+        return fftw
+    return rfft_builder(np.zeros(shape, dtype), axis=-1)
+
+
 def phase(stft):
     """
     Returns the phase of the complex STFT of a signal.
@@ -221,8 +359,10 @@ class ShortTimeFourierTransform(_PropertyMixin, np.ndarray):
         Include the Nyquist frequency bin (sample rate / 2).
     fftw : :class:`pyfftw.FFTW` instance, optional
         If a :class:`pyfftw.FFTW` object is given it is used to compute the
-        STFT with the FFTW library. If 'None', a new :class:`pyfftw.FFTW`
-        object is built. Requires 'pyfftw'.
+        STFT with the FFTW library. If 'None' or planned for other shapes, a
+        new :class:`pyfftw.FFTW` object is built. Requires 'pyfftw'.
+    block_size : int, optional
+        Number of frames transformed at once.
     kwargs : dict, optional
         If no :class:`.audio.signal.FramedSignal` instance was given, one is
         instantiated with these additional keyword arguments.
@@ -310,13 +450,13 @@ frame_size=2048, fps=100, sample_rate=22050)
 
     def __init__(self, frames, window=np.hanning, fft_size=None,
                  circular_shift=False, include_nyquist=False, fft_window=None,
-                 fftw=None, **kwargs):
+                 fftw=None, block_size=STFT_BLOCK_SIZE, **kwargs):
         # this method is for documentation purposes only
         pass
 
     def __new__(cls, frames, window=np.hanning, fft_size=None,
                 circular_shift=False, include_nyquist=False, fft_window=None,
-                fftw=None, **kwargs):
+                fftw=None, block_size=STFT_BLOCK_SIZE, **kwargs):
         # pylint: disable=unused-argument
         if isinstance(frames, ShortTimeFourierTransform):
             # already a STFT, use the frames thereof
@@ -330,16 +470,22 @@ frame_size=2048, fps=100, sample_rate=22050)
 
         if fft_window is None:
             # if a callable window function is given, use the frame size to
-            # create a window of this size
+            # create a window of this size (shared with other STFTs)
+            window_function = None
             if hasattr(window, '__call__'):
-                window = window(frame_size)
+                window_function = window
+                window = cached_window(window_function, frame_size)
             # window used for FFT
             try:
                 # if the signal is not scaled, scale the window accordingly
                 max_range = float(np.iinfo(frames.signal.dtype).max)
                 try:
                     # scale the window by the max_range
-                    fft_window = window / max_range
+                    if window_function is not None:
+                        fft_window = cached_window(window_function,
+                                                   frame_size, max_range)
+                    else:
+                        fft_window = window / max_range
                 except TypeError:
                     # if the window is None we can't scale it, thus create a
                     # uniform window and scale it accordingly
@@ -348,17 +494,18 @@ frame_size=2048, fps=100, sample_rate=22050)
                 # no scaling needed, use the window as is (can also be None)
                 fft_window = window
 
-        # use FFTW to speed up STFT
-        try:
-            # Note: use fft_window instead of a frame because it has already
-            #       the correct dtype (frames are multiplied with this window)
-            fftw = rfft_builder(fft_window, fft_size, axis=0)
-        except AttributeError:
-            pass
+        # use FFTW to speed up STFT, re-use the given plan if possible
+        # Note: use fft_window instead of a frame because it has already
+        #       the correct dtype (frames are multiplied with this window);
+        #       circular shifted frames are always copied as float64
+        dtype = np.float64 if circular_shift or fft_window is None else \
+            np.result_type(fft_window)
+        fftw = fftw_plan(fft_size or frame_size, dtype, block_size, fftw)
         # calculate the STFT
         data = stft(frames, fft_window, fft_size=fft_size,
                     circular_shift=circular_shift,
-                    include_nyquist=include_nyquist, fftw=fftw)
+                    include_nyquist=include_nyquist, fftw=fftw,
+                    block_size=block_size)
 
         # cast as ShortTimeFourierTransform
         obj = np.asarray(data).view(cls)
@@ -366,6 +513,7 @@ frame_size=2048, fps=100, sample_rate=22050)
         obj.frames = frames
         obj.window = window
         obj.fft_window = fft_window
+        obj.fftw = fftw
         obj.fft_size = fft_size if fft_size else frame_size
         obj.circular_shift = circular_shift
         obj.include_nyquist = include_nyquist
@@ -446,6 +594,9 @@ class ShortTimeFourierTransformProcessor(Processor):
         needed for correct phase.
     include_nyquist : bool, optional
         Include the Nyquist frequency bin (sample rate / 2).
+    block_size : int, optional
+        Number of frames transformed at once; smaller blocks need less
+        memory, bigger ones less overhead.
 
     Examples
     --------
@@ -470,12 +621,13 @@ class ShortTimeFourierTransformProcessor(Processor):
     """
 
     def __init__(self, window=np.hanning, fft_size=None, circular_shift=False,
-                 include_nyquist=False, **kwargs):
+                 include_nyquist=False, block_size=STFT_BLOCK_SIZE, **kwargs):
         # pylint: disable=unused-argument
         self.window = window
         self.fft_size = fft_size
         self.circular_shift = circular_shift
         self.include_nyquist = include_nyquist
+        self.block_size = block_size
         # caching only, not intended for general use
         self.fft_window = None
         self.fftw = None
@@ -503,8 +655,9 @@ class ShortTimeFourierTransformProcessor(Processor):
                                          circular_shift=self.circular_shift,
                                          include_nyquist=self.include_nyquist,
                                          fft_window=self.fft_window,
-                                         fftw=self.fftw, **kwargs)
-        # cache the window used for FFT
+                                         fftw=self.fftw,
+                                         block_size=self.block_size, **kwargs)
+        # cache the window used for FFT and the FFTW plan
         # Note: depending on the signal this may be scaled already
         self.fft_window = data.fft_window
         self.fftw = data.fftw
@@ -14,7 +14,7 @@ import numpy as np
 
 from . import (evaluation_io, MultiClassEvaluation, SumEvaluation,
                MeanEvaluation)
-from .onsets import onset_evaluation, OnsetEvaluation
+from .onsets import greedy_match, OnsetEvaluation
 from ..io import load_notes
 
 
@@ -92,8 +92,8 @@ def note_onset_evaluation(detections, annotations, window=WINDOW):
 
     """
     # make sure the arrays have the correct types and dimensions
-    detections = np.asarray(detections, dtype=np.float)
-    annotations = np.asarray(annotations, dtype=np.float)
+    detections = np.asarray(detections, dtype=float)
+    annotations = np.asarray(annotations, dtype=float)
     # check dimensions
     if detections.ndim != 2 or annotations.ndim != 2:
         raise ValueError('detections and annotations must be 2D arrays')
@@ -122,24 +122,31 @@ def note_onset_evaluation(detections, annotations, window=WINDOW):
     detections = detections[:, :2]
     annotations = annotations[:, :2]
 
-    # get a list of all notes detected / annotated
-    notes = np.unique(np.concatenate((detections[:, 1],
-                                      annotations[:, 1]))).tolist()
-    # iterate over all notes
-    for note in notes:
-        # perform normal onset detection on each note
-        det = detections[detections[:, 1] == note]
-        ann = annotations[annotations[:, 1] == note]
-        tp_, fp_, _, fn_, err_ = onset_evaluation(det[:, 0], ann[:, 0], window)
-        # convert returned arrays to lists and append the detections and
-        # annotations to the correct lists
-        tp = np.vstack((tp, det[np.in1d(det[:, 0], tp_)]))
-        fp = np.vstack((fp, det[np.in1d(det[:, 0], fp_)]))
-        fn = np.vstack((fn, ann[np.in1d(ann[:, 0], fn_)]))
-        # append the note number to the errors
-        err_ = np.vstack((np.array(err_),
-                          np.repeat(np.asarray([note]), len(err_)))).T
-        errors = np.vstack((errors, err_))
+    # window must be greater than 0
+    if float(window) <= 0:
+        raise ValueError('window must be greater than 0')
+    # perform normal onset evaluation on each note, all notes at once: sort
+    # by note and onset time and match only within the same note
+    det_order = np.lexsort((detections[:, 0], detections[:, 1]))
+    ann_order = np.lexsort((annotations[:, 0], annotations[:, 1]))
+    det = detections[det_order]
+    ann = annotations[ann_order]
+    matches, matched = greedy_match(det[:, 0], ann[:, 0], window,
+                                    det[:, 1], ann[:, 1])
+    is_tp = np.zeros(len(detections), dtype=bool)
+    is_tp[det_order[matches[matched]]] = True
+    is_fn = np.zeros(len(annotations), dtype=bool)
+    is_fn[ann_order[~matched]] = True
+    # collect the detections and annotations note by note, in their original
+    # order within each note
+    det_by_note = np.argsort(detections[:, 1], kind='stable')
+    ann_by_note = np.argsort(annotations[:, 1], kind='stable')
+    tp = detections[det_by_note[is_tp[det_by_note]]]
+    fp = detections[det_by_note[~is_tp[det_by_note]]]
+    fn = annotations[ann_by_note[is_fn[ann_by_note]]]
+    # errors with the note number, note by note in order of onset time
+    errors = np.vstack((det[matches[matched], 0] - ann[matched, 0],
+                        ann[matched, 1])).T
     # check calculations
     if len(tp) + len(fp) != len(detections):
         raise AssertionError('bad TP / FP calculation')
@@ -181,8 +188,8 @@ class NoteEvaluation(MultiClassEvaluation):
     def __init__(self, detections, annotations, window=WINDOW, delay=0,
                  **kwargs):
         # convert to numpy array
-        detections = np.array(detections, dtype=np.float, ndmin=2)
-        annotations = np.array(annotations, dtype=np.float, ndmin=2)
+        detections = np.array(detections, dtype=float, ndmin=2)
+        annotations = np.array(annotations, dtype=float, ndmin=2)
         # shift the detections if needed
         if delay != 0:
             detections[:, 0] += delay
@@ -27,6 +27,118 @@ WINDOW = 0.025
 COMBINE = 0.03
 
 
+# greedy matching of detections and annotations
+def _first_index(det, ann, lo, hi, guess, predicate):
+    """
+    For each annotation `ann[j]`, the first index `i` in [`lo[j]`, `hi[j]`)
+    with `predicate(det[i] - ann[j])` True, or `hi[j]` if there is none. The
+    predicate must be monotonic in `i`; the search starts from `guess[j]` and
+    moves one detection at a time, all annotations at once, thus a good guess
+    (e.g. obtained with :func:`numpy.searchsorted`) is needed to be fast.
+
+    """
+    index = np.clip(guess, lo, hi)
+    move = np.flatnonzero(index > lo)
+    while len(move):
+        move = move[predicate(det[index[move] - 1] - ann[move])]
+        index[move] -= 1
+        move = move[index[move] > lo[move]]
+    move = np.flatnonzero(index < hi)
+    while len(move):
+        move = move[~predicate(det[index[move]] - ann[move])]
+        index[move] += 1
+        move = move[index[move] < hi[move]]
+    return index
+
+
+def greedy_match(detections, annotations, window, det_groups=None,
+                 ann_groups=None):
+    """
+    Match detections and annotations as :func:`onset_evaluation` does.
+
+    Detections and annotations are processed in ascending order; a detection
+    within `window` of the current annotation is matched with it, otherwise
+    the earlier of both is counted as a false positive or a false negative.
+    Instead of iterating over all detections and annotations, the first
+    detection each annotation can be matched with is found with a binary
+    search, and only annotations whose windows overlap the one of the
+    previous annotation are processed in dependence of it.
+
+    Parameters
+    ----------
+    detections : numpy array, shape (num_detections,)
+        Detections, sorted (by group and then by time).
+    annotations : numpy array, shape (num_annotations,)
+        Annotations, sorted (by group and then by time).
+    window : float
+        Evaluation window [seconds].
+    det_groups : numpy array, shape (num_detections,), optional
+        Non-decreasing group of each detection (e.g. a MIDI note number or
+        the index of a parameter setting), detections and annotations are
+        only matched within the same group.
+    ann_groups : numpy array, shape (num_annotations,), optional
+        Non-decreasing group of each annotation.
+
+    Returns
+    -------
+    matches : numpy array, shape (num_annotations,)
+        Index of the detection matched with each annotation.
+    matched : numpy array, shape (num_annotations,)
+        True for the annotations that were matched (TP), False for the others
+        (FN); `matches` is meaningless for the latter.
+
+    """
+    det = np.asarray(detections, dtype=float)
+    ann = np.asarray(annotations, dtype=float)
+    if det_groups is None:
+        det_groups = np.zeros(len(det), dtype=int)
+        ann_groups = np.zeros(len(ann), dtype=int)
+    first_of_group = np.ones(len(ann), dtype=bool)
+    first_of_group[1:] = ann_groups[1:] != ann_groups[:-1]
+    group_bounds = np.append(np.flatnonzero(first_of_group), len(ann))
+    # range of the detections of the group of each annotation
+    groups = ann_groups[group_bounds[:-1]]
+    group_sizes = np.diff(group_bounds)
+    lo = np.repeat(np.searchsorted(det_groups, groups, 'left'), group_sizes)
+    hi = np.repeat(np.searchsorted(det_groups, groups, 'right'), group_sizes)
+    # locate the window of each annotation within the detections of its
+    # group approximately, then refine it with the same comparisons as in
+    # the loop formulation, so that equal values and rounding are handled
+    # the same; `start` is the first detection which is not a FP w.r.t. the
+    # annotation and `stop` the first detection after its window
+    start = np.empty(len(ann), dtype=int)
+    stop = np.empty(len(ann), dtype=int)
+    for first, last in zip(group_bounds[:-1], group_bounds[1:]):
+        group_det = det[lo[first]:hi[first]]
+        start[first:last] = lo[first] + np.searchsorted(
+            group_det, ann[first:last] - window, 'left')
+        stop[first:last] = lo[first] + np.searchsorted(
+            group_det, ann[first:last] + window, 'right')
+    start = _first_index(det, ann, lo, hi, start,
+                         lambda diff: diff >= -window)
+    stop = _first_index(det, ann, start, hi, stop,
+                        lambda diff: diff > window)
+    # the detection matched with an annotation is the first one not used by
+    # the previous annotation (which never gets further than the end of its
+    # window), thus an annotation depends on the previous one only if their
+    # windows overlap; these chains are resolved step by step, all chains
+    # at once
+    head = first_of_group.copy()
+    head[1:] |= start[1:] >= stop[:-1]
+    position = np.arange(len(ann)) - np.maximum.accumulate(
+        np.where(head, np.arange(len(ann)), 0))
+    matches = start.copy()
+    matched = matches < stop
+    order = np.argsort(position, kind='stable')
+    bounds = np.cumsum(np.bincount(position))
+    for step in range(1, len(bounds)):
+        idx = order[bounds[step - 1]:bounds[step]]
+        matches[idx] = np.maximum(start[idx],
+                                  matches[idx - 1] + matched[idx - 1])
+        matched[idx] = matches[idx] < stop[idx]
+    return matches, matched
+
+
 # onset evaluation function
 def onset_evaluation(detections, annotations, window=WINDOW):
     """
@@ -59,10 +171,12 @@ def onset_evaluation(detections, annotations, window=WINDOW):
     The returned true negative array is empty, because we are not interested
     in this class, since it is magnitudes bigger than true positives array.
 
+    See :func:`greedy_match` for the matching of detections and annotations.
+
     """
     # make sure the arrays have the correct types and dimensions
-    detections = np.asarray(detections, dtype=np.float)
-    annotations = np.asarray(annotations, dtype=np.float)
+    detections = np.asarray(detections, dtype=float)
+    annotations = np.asarray(annotations, dtype=float)
     # TODO: right now, it only works with 1D arrays
     if detections.ndim > 1 or annotations.ndim > 1:
         raise NotImplementedError('please implement multi-dim support')
@@ -94,54 +208,85 @@ def onset_evaluation(detections, annotations, window=WINDOW):
     # sort the detections and annotations
     det = np.sort(detections)
     ann = np.sort(annotations)
-    # cache variables
-    det_length = len(detections)
-    ann_length = len(annotations)
-    det_index = 0
-    ann_index = 0
-    # iterate over all detections and annotations
-    while det_index < det_length and ann_index < ann_length:
-        # fetch the first detection
-        d = det[det_index]
-        # fetch the first annotation
-        a = ann[ann_index]
-        # compare them
-        if abs(d - a) <= window:
-            # TP detection
-            tp = np.append(tp, d)
-            # append the error to the array
-            errors = np.append(errors, d - a)
-            # increase the detection and annotation index
-            det_index += 1
-            ann_index += 1
-        elif d < a:
-            # FP detection
-            fp = np.append(fp, d)
-            # increase the detection index
-            det_index += 1
-            # do not increase the annotation index
-        elif d > a:
-            # we missed a annotation: FN
-            fn = np.append(fn, a)
-            # do not increase the detection index
-            # increase the annotation index
-            ann_index += 1
-        else:
-            # can't match detected with annotated onset
-            raise AssertionError('can not match % with %', d, a)
-    # the remaining detections are FP
-    fp = np.append(fp, det[det_index:])
-    # the remaining annotations are FN
-    fn = np.append(fn, ann[ann_index:])
-    # check calculations
-    if len(tp) + len(fp) != len(detections):
-        raise AssertionError('bad TP / FP calculation')
-    if len(tp) + len(fn) != len(annotations):
-        raise AssertionError('bad FN calculation')
-    if len(tp) != len(errors):
-        raise AssertionError('bad errors calculation')
-    # convert to numpy arrays and return them
-    return np.array(tp), np.array(fp), tn, np.array(fn), np.array(errors)
+    # match them
+    matches, matched = greedy_match(det, ann, window)
+    tp = det[matches[matched]]
+    errors = tp - ann[matched]
+    is_fp = np.ones(len(det), dtype=bool)
+    is_fp[matches[matched]] = False
+    fp = det[is_fp]
+    fn = ann[~matched]
+    return tp, fp, tn, fn, errors
+
+
+def onset_evaluation_batch(detections, annotations, window=WINDOW):
+    """
+    Determine the true/false positive/negative detections of several sets of
+    detections (e.g. obtained with different thresholds) at once.
+
+    Parameters
+    ----------
+    detections : list of numpy arrays
+        Detected notes, one array per set of detections.
+    annotations : numpy array
+        Annotated ground truth notes, shared by all sets.
+    window : float, optional
+        Evaluation window [seconds].
+
+    Returns
+    -------
+    list of tuples
+        (tp, fp, tn, fn, errors) of each set of detections, the same as
+        returned by :func:`onset_evaluation`.
+
+    Notes
+    -----
+    All sets of detections are matched in a single :func:`greedy_match`
+    call, with the index of the set as group.
+
+    Examples
+    --------
+    Evaluate the onsets picked with a range of thresholds:
+
+    >>> detections = [np.array([0.1, 0.5, 1.0])[:3 - i // 4]
+    ...               for i in range(9)]
+    >>> results = onset_evaluation_batch(detections, [0.1, 1.01])
+    >>> [len(tp) for tp, fp, tn, fn, errors in results]
+    [2, 2, 2, 2, 1, 1, 1, 1, 1]
+
+    See :meth:`OnsetEvaluation.batch` to get evaluation objects.
+
+    """
+    detections = [np.sort(np.asarray(d, dtype=float)) for d in detections]
+    annotations = np.sort(np.asarray(annotations, dtype=float))
+    if detections and np.ndim(detections[0]) > 1 or annotations.ndim > 1:
+        raise NotImplementedError('please implement multi-dim support')
+    if len(annotations) == 0 or not any(len(d) for d in detections):
+        return [onset_evaluation(d, annotations, window) for d in detections]
+    if float(window) <= 0:
+        raise ValueError('window must be greater than 0')
+    num_sets = len(detections)
+    det = np.concatenate(detections)
+    det_groups = np.repeat(np.arange(num_sets), [len(d) for d in detections])
+    ann = np.tile(annotations, num_sets)
+    ann_groups = np.repeat(np.arange(num_sets), len(annotations))
+    matches, matched = greedy_match(det, ann, window, det_groups, ann_groups)
+    is_fp = np.ones(len(det), dtype=bool)
+    is_fp[matches[matched]] = False
+    det_bounds = np.cumsum([0] + [len(d) for d in detections])
+    results = []
+    for i, d in enumerate(detections):
+        if len(d) == 0:
+            results.append(onset_evaluation(d, annotations, window))
+            continue
+        det_slice = slice(det_bounds[i], det_bounds[i + 1])
+        ann_slice = slice(i * len(annotations), (i + 1) * len(annotations))
+        set_matched = matched[ann_slice]
+        tp = det[matches[ann_slice][set_matched]]
+        results.append((tp, det[det_slice][is_fp[det_slice]], np.zeros(0),
+                        annotations[~set_matched],
+                        tp - annotations[set_matched]))
+    return results
 
 
 # for onset evaluation with Precision, Recall, F-measure use the Evaluation
@@ -168,8 +313,8 @@ class OnsetEvaluation(Evaluation):
     def __init__(self, detections, annotations, window=WINDOW, combine=0,
                  delay=0, **kwargs):
         # convert to numpy array
-        detections = np.array(detections, dtype=np.float, ndmin=1)
-        annotations = np.array(annotations, dtype=np.float, ndmin=1)
+        detections = np.array(detections, dtype=float, ndmin=1)
+        annotations = np.array(annotations, dtype=float, ndmin=1)
         # combine the annotations if needed
         if combine > 0:
             annotations = combine_events(annotations, combine)
@@ -184,6 +329,48 @@ class OnsetEvaluation(Evaluation):
         # add the errors
         self.errors = errors
 
+    @classmethod
+    def batch(cls, detections, annotations, window=WINDOW, combine=0,
+              delay=0, **kwargs):
+        """
+        Evaluate several sets of detections against the same annotations.
+
+        Parameters
+        ----------
+        detections : list
+            Sets of detected notes (e.g. obtained with different peak-picking
+            thresholds).
+        annotations : str, list or numpy array
+            Annotated ground truth notes.
+        window : float, optional
+            F-measure evaluation window [seconds]
+        combine : float, optional
+            Combine all annotated onsets within `combine` seconds.
+        delay : float, optional
+            Delay the detections `delay` seconds for evaluation.
+
+        Returns
+        -------
+        list
+            :class:`OnsetEvaluation` of each set of detections, the same as
+            instantiating them one by one.
+
+        """
+        annotations = np.array(annotations, dtype=float, ndmin=1)
+        if combine > 0:
+            annotations = combine_events(annotations, combine)
+        detections = [np.array(d, dtype=float, ndmin=1) + delay
+                      for d in detections]
+        evaluations = []
+        for tp, fp, tn, fn, errors in onset_evaluation_batch(
+                detections, annotations, window):
+            evaluation = cls.__new__(cls)
+            super(OnsetEvaluation, evaluation).__init__(tp, fp, tn, fn,
+                                                        **kwargs)
+            evaluation.errors = errors
+            evaluations.append(evaluation)
+        return evaluations
+
     @property
     def mean_error(self):
         """Mean of the errors."""
@@ -838,27 +838,19 @@ class CNNOnsetProcessor(SequentialProcessor):
 
     def __init__(self, **kwargs):
         # pylint: disable=unused-argument
-        from ..audio.signal import SignalProcessor, FramedSignalProcessor
-        from ..audio.stft import ShortTimeFourierTransformProcessor
+        from ..audio.signal import SignalProcessor
         from ..audio.filters import MelFilterbank
-        from ..audio.spectrogram import (FilteredSpectrogramProcessor,
-                                         LogarithmicSpectrogramProcessor)
+        from ..audio.spectrogram import MultiResolutionSpectrogramProcessor
         from ..models import ONSETS_CNN
         from ..ml.nn import NeuralNetwork
 
         # define pre-processing chain
         sig = SignalProcessor(num_channels=1, sample_rate=44100)
-        # process the multi-resolution spec in parallel
-        multi = ParallelProcessor([])
-        for frame_size in [2048, 1024, 4096]:
-            frames = FramedSignalProcessor(frame_size=frame_size, fps=100)
-            stft = ShortTimeFourierTransformProcessor()  # caching FFT window
-            filt = FilteredSpectrogramProcessor(
-                filterbank=MelFilterbank, num_bands=80, fmin=27.5, fmax=16000,
-                norm_filters=True, unique_filters=False)
-            spec = LogarithmicSpectrogramProcessor(log=np.log, add=EPSILON)
-            # process each frame size with spec and diff sequentially
-            multi.append(SequentialProcessor((frames, stft, filt, spec)))
+        # process the multi-resolution spec in a single pass
+        multi = MultiResolutionSpectrogramProcessor(
+            frame_sizes=[2048, 1024, 4096], fps=100, filterbank=MelFilterbank,
+            num_bands=80, fmin=27.5, fmax=16000, norm_filters=True,
+            unique_filters=False, log=np.log, add=EPSILON)
         # stack the features (in depth) and pad at beginning and end
         stack = np.dstack
         pad = _cnn_onset_processor_pad
@@ -870,6 +862,28 @@ class CNNOnsetProcessor(SequentialProcessor):
 
         # instantiate a SequentialProcessor
         super(CNNOnsetProcessor, self).__init__((pre_processor, nn))
+        # kept to compute the spectrograms along with other features
+        self.spectrogram_processor = multi
+
+    def process_spectrograms(self, spectrograms):
+        """
+        Compute the onset activation function from spectrograms computed
+        beforehand by `spectrogram_processor`.
+
+        Parameters
+        ----------
+        spectrograms : list of numpy arrays
+            Logarithmic filtered spectrograms, one per frame size of
+            `spectrogram_processor` (in this order).
+
+        Returns
+        -------
+        activations : numpy array
+            Onset activation function.
+
+        """
+        return self.processors[-1](
+            _cnn_onset_processor_pad(np.dstack(spectrograms)))
 
 
 # universal peak-picking method
@@ -445,6 +445,362 @@ def load_ffmpeg_file(filename, sample_rate=None, num_channels=None,
 
 
 # functions for loading/saving wave files
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WaveFile(object):
+    """
+    Memory-mapped wave file with lazy windowing and channel conversion.
+
+    Only the header of the file is read when the object is created. Indexing
+    returns the requested samples, decoded from the memory-mapped data, so
+    that only the accessed part of the file is read from disk and held in
+    memory. Integer PCM with 8, 16, 24 or 32 bits and 32 or 64 bit float
+    data are supported.
+
+    Parameters
+    ----------
+    filename : str or file handle
+        Name of the file or file handle (opened in binary mode).
+    num_channels : int, optional
+        Reduce or expand the signal to `num_channels` channels, or 'None'
+        to return the signal with its original channels.
+    start : float, optional
+        Start position [seconds].
+    stop : float, optional
+        Stop position [seconds].
+    block_size : int, optional
+        Number of samples converted at once when a conversion (24 bit data or
+        channel down-mixing) is needed. The last two converted blocks are
+        kept, this bounds the memory used for conversions.
+
+    Notes
+    -----
+    Samples are returned with the dtype of the data in the file, except 24 bit
+    PCM, which is returned as int32 with the 24 bits in the most significant
+    bytes (as :func:`scipy.io.wavfile.read` does), so that the full int32
+    range is used. Mono signals are 1D, multi-channel signals 2D with the
+    channels as columns.
+
+    If neither a 24 bit conversion nor a channel conversion is needed, the
+    returned samples are a (copy-on-write) view of the memory-mapped file,
+    i.e. no data is copied at all. File handles without a file descriptor
+    (e.g. :class:`io.BytesIO`) cannot be memory-mapped, their data is read
+    when the object is created.
+
+    The `start` and `stop` positions are rounded as in :func:`load_wave_file`.
+
+    Examples
+    --------
+    Only the header is read when opening the file:
+
+    >>> wav = WaveFile('tests/data/audio/sample.wav')
+    >>> wav.sample_rate, wav.num_samples
+    (44100, 123481)
+    >>> wav[:2]
+    array([-2494, -2510], dtype=int16)
+
+    A :class:`WaveFile` can be framed directly, the frames are then read from
+    the file when they are accessed:
+
+    >>> from madmom.audio.signal import FramedSignal
+    >>> frames = FramedSignal(wav, frame_size=2048, hop_size=441)
+    >>> frames.num_frames
+    281
+
+    """
+
+    def __init__(self, filename, num_channels=None, start=None, stop=None,
+                 block_size=2 ** 18):
+        import io
+        import struct
+        self.filename = filename
+        self.block_size = int(block_size)
+        # file handles are read from their current position and rewound
+        # afterwards (as scipy.io.wavfile.read does)
+        f = filename if hasattr(filename, 'read') else open(filename, 'rb')
+        try:
+            header = f.read(12)
+            if len(header) < 12:
+                raise ValueError('%r is not a RIFF/WAVE file' % filename)
+            riff, _, wave = struct.unpack('<4sI4s', header)
+            if riff != b'RIFF' or wave != b'WAVE':
+                raise ValueError('%r is not a RIFF/WAVE file' % filename)
+            fmt = data_offset = data_size = None
+            while data_offset is None:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                chunk_id, chunk_size = struct.unpack('<4sI', header)
+                if chunk_id == b'fmt ':
+                    fmt = f.read(chunk_size)
+                elif chunk_id == b'data':
+                    data_offset, data_size = f.tell(), chunk_size
+                else:
+                    f.seek(chunk_size, 1)
+                # chunks are aligned to 2 bytes
+                if chunk_size % 2:
+                    f.seek(1, 1)
+            if fmt is None or data_offset is None:
+                raise ValueError('%r has no fmt or data chunk' % filename)
+            if len(fmt) < 16:
+                raise ValueError('%r has a truncated fmt chunk' % filename)
+            (audio_format, channels, self.sample_rate, _, block_align,
+             bits) = struct.unpack('<HHIIHH', fmt[:16])
+            if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                # the format is given by the first bytes of the sub-format
+                audio_format = struct.unpack('<H', fmt[24:26])[0]
+            if audio_format == WAVE_FORMAT_PCM and bits in (8, 16, 24, 32):
+                file_dtype = {8: 'u1', 16: '<i2', 24: 'u1', 32: '<i4'}[bits]
+            elif audio_format == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+                file_dtype = {32: '<f4', 64: '<f8'}[bits]
+            else:
+                raise ValueError('unsupported wave format %#x with %d bits' %
+                                 (audio_format, bits))
+            if not channels or block_align != channels * bits // 8:
+                raise ValueError('%r has an invalid fmt chunk (%d channels, '
+                                 'block align %d)' % (filename, channels,
+                                                      block_align))
+            self.dtype = np.dtype(np.int32 if bits == 24 else file_dtype)
+            # writers of very large files may not know (or overflow) the size
+            f.seek(0, 2)
+            file_size = f.tell()
+            data_size = min(data_size, file_size - data_offset)
+            file_frames = data_size // block_align
+            shape = (file_frames, channels, 3) if bits == 24 else \
+                (file_frames, channels)
+            try:
+                f.fileno()
+                mappable = True
+            except (AttributeError, io.UnsupportedOperation):
+                mappable = False
+            if not file_frames:
+                self._data = np.zeros(shape, dtype=file_dtype)
+            elif mappable:
+                self._data = np.memmap(f, dtype=file_dtype, mode='c',
+                                       offset=data_offset, shape=shape)
+            else:
+                # in-memory file objects, read the data
+                f.seek(data_offset)
+                self._data = np.frombuffer(
+                    bytearray(f.read(file_frames * block_align)),
+                    dtype=file_dtype).reshape(shape)
+        finally:
+            if f is filename:
+                f.seek(0)
+            else:
+                f.close()
+        self._file_channels = channels
+        self._set_num_channels(num_channels)
+        self._blocks = {}
+        # window of the file in samples
+        self._start = 0 if start is None else int(start * self.sample_rate)
+        self._stop = file_frames if stop is None else \
+            min(file_frames, int(stop * self.sample_rate))
+        self._start = min(self._start, self._stop)
+
+    def _set_num_channels(self, num_channels):
+        channels = self._file_channels
+        if num_channels and num_channels != channels and \
+                1 not in (num_channels, channels):
+            raise NotImplementedError(
+                "Requested %d channels, but got %d channels and channel "
+                "conversion is not implemented." % (num_channels, channels))
+        self.num_channels = num_channels or channels
+
+    @property
+    def num_samples(self):
+        """Number of samples (of the window)."""
+        return self._stop - self._start
+
+    def __len__(self):
+        return self.num_samples
+
+    @property
+    def shape(self):
+        """Shape of the decoded signal."""
+        if self.num_channels == 1:
+            return (self.num_samples, )
+        return self.num_samples, self.num_channels
+
+    @property
+    def ndim(self):
+        """Dimensionality of the decoded signal."""
+        return len(self.shape)
+
+    @property
+    def length(self):
+        """Length of the signal in seconds."""
+        return float(self.num_samples) / self.sample_rate
+
+    def window(self, start=None, stop=None, num_channels=None):
+        """
+        Return a new :class:`WaveFile` restricted to a window of this one.
+
+        Parameters
+        ----------
+        start : float, optional
+            Start position relative to this window [seconds].
+        stop : float, optional
+            Stop position relative to this window [seconds].
+        num_channels : int, optional
+            Reduce or expand the signal to `num_channels` channels, or 'None'
+            to keep the channels of this one.
+
+        Returns
+        -------
+        :class:`WaveFile` instance
+            The window, sharing the memory map of this file.
+
+        """
+        import copy
+        wav = copy.copy(self)
+        if start is not None:
+            wav._start = min(self._stop,
+                             self._start + int(start * self.sample_rate))
+        if stop is not None:
+            wav._stop = min(self._stop,
+                            self._start + int(stop * self.sample_rate))
+        wav._start = min(wav._start, wav._stop)
+        if num_channels is not None:
+            wav._set_num_channels(num_channels)
+        return wav
+
+    def _convert(self, data):
+        """Decode 24 bit samples and convert the channels of `data`."""
+        if data.ndim == 3:
+            # 24 bit little endian PCM -> int32 (24 bits in the high bytes)
+            data = (data[..., 0].astype(np.uint32) << 8 |
+                    data[..., 1].astype(np.uint32) << 16 |
+                    data[..., 2].astype(np.uint32) << 24).view(np.int32)
+        if self.num_channels == self._file_channels:
+            return data[:, 0] if self.num_channels == 1 else data
+        from ..audio.signal import remix
+        if self._file_channels == 1:
+            return remix(data[:, 0], self.num_channels)
+        return remix(data, self.num_channels)
+
+    def read(self, start=None, stop=None):
+        """
+        Read the samples `start` to `stop` (relative to the window).
+
+        Parameters
+        ----------
+        start : int, optional
+            First sample to read.
+        stop : int, optional
+            Sample to stop reading at (not included).
+
+        Returns
+        -------
+        numpy array
+            Decoded samples, a view of the memory-mapped file if no
+            conversion is needed.
+
+        """
+        start, stop, _ = slice(start, stop).indices(self.num_samples)
+        stop = max(start, stop)
+        if self._data.ndim == 2 and self.num_channels == self._file_channels:
+            # no conversion, return a view of the memory-map
+            data = np.asarray(self._data[self._start + start:
+                                         self._start + stop])
+            return data[:, 0] if self.num_channels == 1 else data
+        # convert block by block, the blocks being aligned in the file and
+        # the last ones kept, so that overlapping reads (e.g. of consecutive
+        # frames) convert each sample only once
+        out = np.empty((stop - start, ) + self.shape[1:], dtype=self.dtype)
+        pos, stop = self._start + start, self._start + stop
+        while pos < stop:
+            block = pos // self.block_size
+            offset = block * self.block_size
+            num = min(stop, offset + self.block_size) - pos
+            out[pos - self._start - start:][:num] = \
+                self._block(block)[pos - offset:pos - offset + num]
+            pos += num
+        return out
+
+    def _block(self, block):
+        """Converted samples of the `block`-th block of the file."""
+        key = block, self.num_channels
+        if key not in self._blocks:
+            while len(self._blocks) >= 2:
+                del self._blocks[next(iter(self._blocks))]
+            self._blocks[key] = self._convert(
+                self._data[block * self.block_size:
+                           (block + 1) * self.block_size])
+        return self._blocks[key]
+
+    def __getitem__(self, index):
+        # signal_frame() indexes with a trailing comma, i.e. a tuple
+        if isinstance(index, tuple):
+            index, rest = index[0], index[1:]
+        else:
+            rest = ()
+        if isinstance(index, slice) and index.step in (None, 1):
+            data = self.read(index.start, index.stop)
+        elif isinstance(index, slice):
+            start, stop, step = index.indices(self.num_samples)
+            data = self.read()[start:stop:step] if step > 0 else \
+                self.read()[index]
+        else:
+            # integers and index arrays, only read the samples needed
+            index = np.arange(self.num_samples)[index]
+            if np.ndim(index) == 0:
+                data = self.read(int(index), int(index) + 1)[0]
+            elif len(index):
+                first = int(index.min())
+                data = self.read(first, int(index.max()) + 1)[index - first]
+            else:
+                data = self.read(0, 0)
+        return data[rest] if rest else data
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.read()
+        return data if dtype is None else data.astype(dtype)
+
+    def __iter__(self):
+        for start in range(0, self.num_samples, self.block_size):
+            for sample in self.read(start, start + self.block_size):
+                yield sample
+
+
+def _rescale_samples(signal, dtype):
+    """
+    Convert samples to the given dtype, as ffmpeg does.
+
+    Parameters
+    ----------
+    signal : numpy array
+        Integer or float samples.
+    dtype : numpy data type
+        Data type to convert to. Integer dtypes use the complete value range,
+        float dtypes the range [-1, +1].
+
+    Returns
+    -------
+    numpy array
+        Converted samples.
+
+    """
+    dtype = np.dtype(dtype)
+    # float samples in the range [-1, +1]
+    if signal.dtype.kind in 'iu':
+        scale = 2. ** (8 * signal.dtype.itemsize - 1)
+        offset = scale if signal.dtype.kind == 'u' else 0
+        signal = (signal.astype(np.float64) - offset) / scale
+    if dtype.kind == 'f':
+        return signal.astype(dtype)
+    if dtype.kind not in 'iu':
+        raise ValueError('unsupported dtype: %s.' % dtype)
+    scale = 2. ** (8 * dtype.itemsize - 1)
+    signal = np.clip(np.round(signal * scale), -scale, scale - 1)
+    if dtype.kind == 'u':
+        signal += scale
+    return signal.astype(dtype)
+
+
 def load_wave_file(filename, sample_rate=None, num_channels=None, start=None,
                    stop=None, dtype=None):
     """
@@ -456,8 +812,8 @@ def load_wave_file(filename, sample_rate=None, num_channels=None, start=None,
 
     Parameters
     ----------
-    filename : str
-        Name of the file.
+    filename : str, file handle or :class:`WaveFile` instance
+        Name of the file, file handle or memory-mapped wave file.
     sample_rate : int, optional
         Desired sample rate of the signal [Hz], or 'None' to return the
         signal in its original rate.
@@ -488,31 +844,28 @@ def load_wave_file(filename, sample_rate=None, num_channels=None, start=None,
     segment starting with the previous `stop` can be concatenated to obtain
     the original signal without gaps or overlaps.
 
+    Only the requested part of the file is read. If the number of channels
+    has to be changed or the file contains 24 bit PCM, the samples are
+    converted block-wise (see :class:`WaveFile`), otherwise the returned
+    signal is a view of the memory-mapped file.
+
     """
-    from scipy.io import wavfile
-    file_sample_rate, signal = wavfile.read(filename, mmap=True)
+    if isinstance(filename, WaveFile):
+        wav = filename.window(start, stop, num_channels)
+    else:
+        wav = WaveFile(filename, num_channels=num_channels, start=start,
+                       stop=stop)
     # if the sample rate is not the desired one, raise exception
-    if sample_rate is not None and sample_rate != file_sample_rate:
+    if sample_rate is not None and sample_rate != wav.sample_rate:
         raise ValueError('Requested sample rate of %f Hz, but got %f Hz and '
                          're-sampling is not implemented.' %
-                         (sample_rate, file_sample_rate))
+                         (sample_rate, wav.sample_rate))
     # same for the data type
-    if dtype is not None and signal.dtype != dtype:
+    if dtype is not None and wav.dtype != dtype:
         raise ValueError('Requested dtype %s, but got %s and re-scaling is '
-                         'not implemented.' % (dtype, signal.dtype))
-    # only request the desired part of the signal
-    if start is not None:
-        start = int(start * file_sample_rate)
-    if stop is not None:
-        stop = min(len(signal), int(stop * file_sample_rate))
-    if start is not None or stop is not None:
-        signal = signal[start: stop]
-    # up-/down-mix if needed
-    if num_channels is not None:
-        from ..audio.signal import remix
-        signal = remix(signal, num_channels)
+                         'not implemented.' % (dtype, wav.dtype))
     # return the signal
-    return signal, file_sample_rate
+    return wav.read(), wav.sample_rate
 
 
 def write_wave_file(signal, filename, sample_rate=None):
@@ -556,8 +909,9 @@ def load_audio_file(filename, sample_rate=None, num_channels=None, start=None,
 
     Parameters
     ----------
-    filename : str or file handle
-        Name of the file or file handle.
+    filename : str, file handle or :class:`WaveFile` instance
+        Name of the file, file handle or memory-mapped wave file (which is
+        not re-sampled).
     sample_rate : int, optional
         Desired sample rate of the signal [Hz], or 'None' to return the
         signal in its original rate.
@@ -589,6 +943,15 @@ def load_audio_file(filename, sample_rate=None, num_channels=None, start=None,
     For all other audio files, this can not be guaranteed.
 
     """
+    # memory-mapped wave files are read directly (no re-sampling); there is
+    # no ffmpeg fallback for them, thus convert the data type here
+    if isinstance(filename, WaveFile):
+        signal, sample_rate = load_wave_file(
+            filename, sample_rate=sample_rate, num_channels=num_channels,
+            start=start, stop=stop)
+        if dtype is not None and signal.dtype != dtype:
+            signal = _rescale_samples(signal, dtype)
+        return signal, sample_rate
     # determine the name of the file if it is a file handle
     try:
         # close the file handle if it is open
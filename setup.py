@@ -9,7 +9,7 @@ with open('README.md') as readme_file:
 with open('HISTORY.md') as history_file:
     history = history_file.read()
 
-requirements = ['Click>=7.0', 'librosa>=0.7.2', 'numpy>=1.20.3', 'madmom', 'pretty_midi', 'crepe']
+requirements = ['Click>=7.0', 'librosa>=0.7.2', 'numpy>=1.20.3', 'madmom', 'pretty_midi', 'crepe', 'mir_eval']
 
 test_requirements = []
 
@@ -32,6 +32,8 @@ setup(
     entry_points={
         'console_scripts': [
             'crepe_notes=crepe_notes.cli:main',
+            'crepe_notes_eval=crepe_notes.evaluation:main',
+            'crepe_notes_sweep=crepe_notes.sweep:main',
         ],
     },
     install_requires=requirements,